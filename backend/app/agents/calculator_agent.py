@@ -1,39 +1,182 @@
+import asyncio
 import google.generativeai as genai
+import logging
 from app.core.config import get_settings
+from app.core.governor import llm_governor
+from app.core.singleflight import SingleFlight
+from app.core.tracing import trace_attributes, traced, tracer
 from app.agents.tools import google_search_tool
-import json
+from app.agents.emission_cache import get_cached_factor, store_factor, make_cache_key
+from app.agents.reference_factors import reference_factors
+from app.agents.llm import parse_json_response, chunked, numbered_items, index_batch_results
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
+async def _lookup_cached(item_name: str, quantity: float, unit: str, category: str):
+    try:
+        cached = await get_cached_factor(item_name, category, unit)
+    except Exception as e:
+        logger.warning("Emission cache error: %s", e)
+        return None
+
+    if cached is None:
+        return None
+    return {
+        "co2e_kg": round(cached["factor"] * quantity, 4),
+        "factor_used": cached["factor"],
+        "source": cached["source"],
+    }
+
+async def _remember_factor(item_name: str, quantity: float, unit: str, category: str, result: dict):
+    # Cache the per-unit factor, not the total, so any quantity can reuse it
+    try:
+        co2e_kg = float(result.get("co2e_kg", 0) or 0)
+        factor = co2e_kg / quantity if quantity else float(result.get("factor_used", 0) or 0)
+        if factor > 0:
+            await store_factor(item_name, category, unit, factor, result.get("source"))
+    except Exception as e:
+        logger.warning("Emission cache error: %s", e)
+
+def _search_query(item_name: str, unit: str, category: str) -> str:
+    return f"CO2 emission factor for {item_name} ({category}) per {unit}"
+
 async def calculator_agent(item_name: str, quantity: float, unit: str, category: str):
     """
     CalculatorAgent finds CO2 info about products using category context.
+    Items in the reference tables are answered from memory. Other emission
+    factors are cached per (item, category, unit), so repeat items are scaled
+    locally without a search or LLM call.
     """
-    search_query = f"CO2 emission factor for {item_name} ({category}) per {unit}"
-    search_results = google_search_tool(search_query)
-    
+    with tracer.span("calculator", item=item_name, category=category) as span:
+        reference = reference_factors.lookup(item_name, quantity, unit, category)
+        span.set(reference_hit=reference is not None)
+        if reference is not None:
+            return reference
+        cached = await _lookup_cached(item_name, quantity, unit, category)
+        span.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+        return await _coalesced_calculate(item_name, quantity, unit, category)
+
+# Concurrent misses for the same (item, category, unit) share one search + Gemini call,
+# whatever the quantity: the first caller's answer is rescaled for the others.
+calculator_flights = SingleFlight("calculator")
+
+async def _coalesced_calculate(item_name: str, quantity: float, unit: str, category: str):
+    async def priced():
+        return await _gemini_calculate(item_name, quantity, unit, category), quantity
+
+    result, priced_quantity = await calculator_flights.do(make_cache_key(item_name, category, unit), priced)
+    if priced_quantity == quantity:
+        return result
+    try:
+        # A total for 0 units says nothing about the factor: use the one Gemini reported
+        if priced_quantity:
+            factor = float(result.get("co2e_kg", 0) or 0) / priced_quantity
+        else:
+            factor = float(result.get("factor_used", 0) or 0)
+    except (TypeError, ValueError):
+        return result
+    return {**result, "co2e_kg": round(factor * quantity, 4)}
+
+async def _gemini_calculate(item_name: str, quantity: float, unit: str, category: str):
+    search_results = await google_search_tool(_search_query(item_name, unit, category))
+
     model = genai.GenerativeModel('gemini-flash-latest')
-    
+
     prompt = f"""
     Research real-world CO₂ emission factors for the product: {item_name} (Category: {category}).
     Quantity: {quantity} {unit}
     Search results: {search_results}
-    
+
     Calculate the total CO2e in kg.
     Return ONLY JSON:
     {{ "co2e_kg": number, "factor_used": number, "source": "string" }}
     """
-    
+
     try:
-        response = await model.generate_content_async(prompt)
-        content = response.text.strip()
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
-            
-        return json.loads(content)
+        response = await llm_governor.generate(model, prompt)
+        result = parse_json_response(response.text)
     except Exception as e:
-        print(f"Calculator Error: {e}")
+        logger.error("Calculator error for %s: %s", item_name, e)
         return {"co2e_kg": 0.0, "factor_used": 0.0, "source": "Error"}
+
+    await _remember_factor(item_name, quantity, unit, category, result)
+    return result
+
+@traced("calculator.batch")
+async def batch_calculator_agent(items: list[dict]) -> list[dict]:
+    """
+    Calculates CO2e for many items (dicts with item_name, quantity, unit, category)
+    with one Gemini call per LLM_BATCH_MAX_SIZE items missing from the reference
+    tables and the cache. Items the batch answer drops or garbles are retried
+    one by one.
+    """
+    results = [reference_factors.lookup(i["item_name"], i["quantity"], i["unit"], i["category"]) for i in items]
+    unknown = [i for i, result in enumerate(results) if result is None]
+    cached = await asyncio.gather(*[
+        _lookup_cached(items[i]["item_name"], items[i]["quantity"], items[i]["unit"], items[i]["category"])
+        for i in unknown
+    ])
+    for i, result in zip(unknown, cached):
+        results[i] = result
+    pending = [i for i, result in enumerate(results) if result is None]
+    trace_attributes(items=len(items), reference_hits=len(items) - len(unknown), cache_hits=len(unknown) - len(pending))
+
+    model = genai.GenerativeModel('gemini-flash-latest')
+
+    async def calculate_chunk(chunk):
+        search_results = await asyncio.gather(*[
+            google_search_tool(_search_query(items[i]["item_name"], items[i]["unit"], items[i]["category"]))
+            for i in chunk
+        ])
+        lines = [
+            f"{items[i]['item_name']} (Category: {items[i]['category']}), Quantity: {items[i]['quantity']} {items[i]['unit']}\n"
+            f"   Search results: {' '.join(snippets.split())[:600]}"
+            for i, snippets in zip(chunk, search_results)
+        ]
+        prompt = f"""
+        Research real-world CO₂ emission factors for each of the following products
+        and calculate the total CO2e in kg for the given quantity.
+
+        Products:
+        {numbered_items(lines)}
+
+        Return ONLY a JSON array with one object per product, using the product number as "index":
+        [{{ "index": 0, "co2e_kg": number, "factor_used": number, "source": "string" }}]
+        """
+
+        try:
+            response = await llm_governor.generate(model, prompt)
+            answers = index_batch_results(parse_json_response(response.text), len(chunk))
+        except Exception as e:
+            logger.error("Batch calculator error: %s", e)
+            return
+
+        for i, answer in zip(chunk, answers):
+            if answer is None:
+                continue
+            try:
+                result = {
+                    "co2e_kg": float(answer["co2e_kg"]),
+                    "factor_used": float(answer.get("factor_used") or 0.0),
+                    "source": answer.get("source"),
+                }
+            except (KeyError, TypeError, ValueError):
+                continue
+            results[i] = result
+            item = items[i]
+            await _remember_factor(item["item_name"], item["quantity"], item["unit"], item["category"], result)
+
+    await asyncio.gather(*[calculate_chunk(chunk) for chunk in chunked(pending, settings.LLM_BATCH_MAX_SIZE)])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    retried = await asyncio.gather(*[
+        _coalesced_calculate(items[i]["item_name"], items[i]["quantity"], items[i]["unit"], items[i]["category"])
+        for i in missing
+    ])
+    for i, result in zip(missing, retried):
+        results[i] = result
+    return results
@@ -1,37 +1,116 @@
+import asyncio
 import google.generativeai as genai
+import logging
 from app.core.config import get_settings
-import json
-import os
+from app.core.governor import llm_governor
+from app.core.tracing import trace_attributes, traced, tracer
+from app.core.singleflight import SingleFlight, coalesce
+from app.agents.local_classifier import local_classifier, CATEGORIES
+from app.agents.llm import parse_json_response, chunked, numbered_items, index_batch_results
+from app.agents.normalize import normalize_item_name
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
+def _classify_locally(item_name: str):
+    local = local_classifier.classify(item_name)
+    if local["confidence"] >= settings.LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+        local_classifier.stats["answered"] += 1
+        return local
+    local_classifier.stats["fallbacks"] += 1
+    return None
+
+def _learn(item_name: str, result: dict):
+    # Feed confident answers back so the next lookup stays local
+    if result.get("category") in CATEGORIES and result.get("confidence", 0.0) >= settings.LOCAL_CLASSIFIER_LEARN_CONFIDENCE:
+        local_classifier.learn(item_name, result["category"], result["confidence"])
+
 async def classifier_agent(item_name: str):
     """
     Classifies the item into a standardized category.
     Categories: Food, Transport, Energy, Clothing, Electronics, Household, Other.
+    The local classifier answers first; Gemini is only asked when it is unsure.
     """
+    with tracer.span("classifier", item=item_name) as span:
+        local = _classify_locally(item_name)
+        span.set(source="local" if local is not None else "gemini")
+        if local is not None:
+            return local
+        return await _gemini_classify(item_name)
+
+# Concurrent lookups of the same item share one Gemini call
+classifier_flights = SingleFlight("classifier")
+
+@coalesce(classifier_flights, lambda item_name: normalize_item_name(item_name))
+async def _gemini_classify(item_name: str):
     model = genai.GenerativeModel('gemini-flash-latest')
-    
+
     prompt = f"""
-    Classify the following item into one of these categories: 
+    Classify the following item into one of these categories:
     [Food, Transport, Energy, Clothing, Electronics, Household, Other].
-    
+
     Item: {item_name}
-    
+
     Return ONLY JSON:
     {{ "category": "CategoryName", "confidence": 0.95 }}
     """
-    
+
     try:
-        response = await model.generate_content_async(prompt)
-        content = response.text.strip()
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
-            
-        return json.loads(content)
+        response = await llm_governor.generate(model, prompt)
+        result = parse_json_response(response.text)
     except Exception as e:
-        print(f"Classifier Error: {e}")
+        logger.error("Classifier error for %s: %s", item_name, e)
         return {"category": "Other", "confidence": 0.0}
+
+    _learn(item_name, result)
+    return result
+
+@traced("classifier.batch")
+async def batch_classifier_agent(item_names: list[str]) -> list[dict]:
+    """
+    Classifies many items with one Gemini call per LLM_BATCH_MAX_SIZE items.
+    Items the batch answer drops or garbles are retried one by one.
+    """
+    results = [_classify_locally(name) for name in item_names]
+    pending = [i for i, result in enumerate(results) if result is None]
+    trace_attributes(items=len(item_names), local=len(item_names) - len(pending))
+
+    model = genai.GenerativeModel('gemini-flash-latest')
+
+    async def classify_chunk(chunk):
+        prompt = f"""
+        Classify each of the following items into one of these categories:
+        [Food, Transport, Energy, Clothing, Electronics, Household, Other].
+
+        Items:
+        {numbered_items([item_names[i] for i in chunk])}
+
+        Return ONLY a JSON array with one object per item, using the item number as "index":
+        [{{ "index": 0, "category": "CategoryName", "confidence": 0.95 }}]
+        """
+
+        try:
+            response = await llm_governor.generate(model, prompt)
+            answers = index_batch_results(parse_json_response(response.text), len(chunk))
+        except Exception as e:
+            logger.error("Batch classifier error: %s", e)
+            return
+
+        for i, answer in zip(chunk, answers):
+            if answer is None or answer.get("category") not in CATEGORIES:
+                continue
+            try:
+                confidence = float(answer.get("confidence", 0.0))
+            except (TypeError, ValueError):
+                continue
+            results[i] = {"category": answer["category"], "confidence": confidence}
+            _learn(item_names[i], results[i])
+
+    await asyncio.gather(*[classify_chunk(chunk) for chunk in chunked(pending, settings.LLM_BATCH_MAX_SIZE)])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    retried = await asyncio.gather(*[_gemini_classify(item_names[i]) for i in missing])
+    for i, result in zip(missing, retried):
+        results[i] = result
+    return results
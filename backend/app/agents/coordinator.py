@@ -1,76 +1,247 @@
 import asyncio
-from app.agents.classifier import classifier_agent
-from app.agents.calculator_agent import calculator_agent
-from app.agents.suggestion_agent import suggestion_agent
-from app.agents.memory_agent import get_user_context, save_memory_log
-from app.agents.tools import db_writer_tool
+import logging
+from datetime import datetime
+from app.agents.classifier import classifier_agent, batch_classifier_agent
+from app.agents.calculator_agent import calculator_agent, batch_calculator_agent
+from app.agents.suggestion_agent import suggestion_agent, batch_suggestion_agent
+from app.agents.memory_agent import get_user_context
+from app.agents.tools import bulk_writer_tool
+from app.core.config import get_settings
+from app.core.dag import AgentDAG, run_in_background
+from app.core.governor import llm_governor
 from app.core.memory import InMemorySessionService
 from app.core.observability import log_agent_action
+from app.core.tracing import tracer
 
-async def process_single_item(user_id: str, item: dict, user_context: str):
-    """Process a single item through the agent pipeline"""
-    item_name = item["item_name"]
-    quantity = item["quantity"]
-    unit = item["unit"]
-    
-    # 1. Classify
-    classification = await classifier_agent(item_name)
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# --- Stages -----------------------------------------------------------------
+# Suggestions need neither the category nor the CO2 result, so they run
+# alongside classify -> calculate. Session history updates run after the response.
+
+async def _await_context(context_task):
+    # Shielded: one failing item must not cancel the context shared by the others
+    return await asyncio.shield(context_task)
+
+async def _classify(item: dict):
+    classification = await classifier_agent(item["item_name"])
+    log_agent_action("Classifier", "Classified Item", {"item": item["item_name"], "category": classification.get("category", "Other")})
+    return classification
+
+async def _calculate(item: dict, classification: dict):
+    return await calculator_agent(item["item_name"], item["quantity"], item["unit"], classification.get("category", "Other"))
+
+async def _suggest(item: dict, user_context: dict):
+    return await suggestion_agent(item["item_name"], user_context)
+
+async def _build_entry(user_id: str, item: dict, classification: dict, calculation: dict, suggestions: list):
     category = classification.get("category", "Other")
-    confidence = classification.get("confidence", 0.0)
-    log_agent_action("Classifier", "Classified Item", {"item": item_name, "category": category})
-    
-    # 2. Calculate CO2e
-    calc_result = await calculator_agent(item_name, quantity, unit, category)
-    total_co2e = calc_result.get("co2e_kg", 0)
-    
-    # 3. Get Suggestions (with personalization)
-    suggestions = await suggestion_agent(item_name, user_context)
-    
-    # 4. Write to DB
-    await db_writer_tool(
-        user_id=user_id,
-        item_name=item_name,
-        quantity=quantity,
-        unit=unit,
-        co2e_kg=total_co2e,
-        suggestions=suggestions,
-        category=category,
-        classification_confidence=confidence
-    )
-    
-    # 5. Update Memory
-    InMemorySessionService.add_history(user_id, f"User added {quantity} {unit} of {item_name}", "user")
-    InMemorySessionService.add_history(user_id, f"Calculated {total_co2e} kg CO2e", "assistant")
-    await save_memory_log(user_id, "system", f"Processed {item_name}: {total_co2e}kg CO2e")
-    
+    total_co2e = calculation.get("co2e_kg", 0)
+
     return {
-        "item": item_name,
-        "category": category,
-        "co2e_kg": total_co2e,
-        "suggestions": suggestions
+        "result": {
+            "item": item["item_name"],
+            "category": category,
+            "co2e_kg": total_co2e,
+            "suggestions": suggestions
+        },
+        "record": {
+            "user_id": user_id,
+            "item_name": item["item_name"],
+            "quantity": item["quantity"],
+            "unit": item["unit"],
+            "co2e_kg": total_co2e,
+            "suggestions": suggestions,
+            "category": category,
+            "classification_confidence": classification.get("confidence", 0.0),
+            "created_at": datetime.utcnow(),
+        },
+        "memory_log": {
+            "user_id": user_id,
+            "role": "system",
+            "content": f"Processed {item['item_name']}: {total_co2e}kg CO2e",
+            "timestamp": datetime.utcnow(),
+        },
     }
 
+async def _process_items(user_id: str, items: list):
+    # 1. Get User Context (Long-term + Session), shared by every item
+    context_task = asyncio.ensure_future(get_user_context(user_id))
+    # 2. Process all items in PARALLEL for better performance
+    try:
+        return await asyncio.gather(
+            *[process_single_item(user_id, item, context_task) for item in items],
+            return_exceptions=True  # Continue even if one item fails
+        )
+    finally:
+        context_task.cancel()  # no-op once it has finished
+
+async def _persist(entries: list):
+    """Write every processed item in one transaction; failed items stay exceptions"""
+    saved = [entry for entry in entries if not isinstance(entry, Exception)]
+    if not saved:
+        return entries
+
+    try:
+        ids = await bulk_writer_tool(
+            [entry["record"] for entry in saved],
+            [entry["memory_log"] for entry in saved],
+        )
+    except Exception as e:
+        ids = [None] * len(saved)
+        error = e
+    else:
+        error = RuntimeError("Failed to save footprint record")
+
+    written = iter(ids)
+    return [
+        entry if isinstance(entry, Exception) or next(written) is not None else error
+        for entry in entries
+    ]
+
+async def remember_history(user_id: str, items: list, persisted: list):
+    """Add the saved items of a request to the user's session history"""
+    for item, entry in zip(items, persisted):
+        if isinstance(entry, Exception):
+            continue
+        await InMemorySessionService.add_history(user_id, f"User added {item['quantity']} {item['unit']} of {item['item_name']}", "user")
+        await InMemorySessionService.add_history(user_id, f"Calculated {entry['result']['co2e_kg']} kg CO2e", "assistant")
+
+async def _classify_batch(items: list):
+    classifications = await batch_classifier_agent([item["item_name"] for item in items])
+    log_agent_action("Classifier", "Classified Batch", {"items": len(items)})
+    return classifications
+
+async def _calculate_batch(items: list, classifications: list):
+    return await batch_calculator_agent([
+        {**item, "category": classification.get("category", "Other")}
+        for item, classification in zip(items, classifications)
+    ])
+
+async def _suggest_batch(items: list, user_context: dict):
+    return await batch_suggestion_agent([item["item_name"] for item in items], user_context)
+
+async def _build_batch_entries(user_id: str, items: list, classifications: list, calculations: list, suggestions: list):
+    return [
+        await _build_entry(user_id, *row)
+        for row in zip(items, classifications, calculations, suggestions)
+    ]
+
+item_pipeline = (
+    AgentDAG("item_pipeline")
+    .stage("user_context", _await_context, deps=["context_task"])
+    .stage("classification", _classify, deps=["item"])
+    .stage("calculation", _calculate, deps=["item", "classification"])
+    .stage("suggestions", _suggest, deps=["item", "user_context"])
+    .stage("entry", _build_entry, deps=["user_id", "item", "classification", "calculation", "suggestions"])
+)
+
+
+batch_pipeline = (
+    AgentDAG("batch_pipeline")
+    .stage("user_context", get_user_context, deps=["user_id"])
+    .stage("classifications", _classify_batch, deps=["items"])
+    .stage("calculations", _calculate_batch, deps=["items", "classifications"])
+    .stage("suggestions", _suggest_batch, deps=["items", "user_context"])
+    .stage("entries", _build_batch_entries, deps=["user_id", "items", "classifications", "calculations", "suggestions"])
+)
+
+# --- Coordinator --------------------------------------------------------------
+
+async def process_single_item(user_id: str, item: dict, context_task):
+    """Run a single item through the agent pipeline (persisted later with the rest of the request)"""
+    with tracer.span("item", item=item["item_name"]):
+        run = await item_pipeline.run(user_id=user_id, item=item, context_task=context_task)
+    log_agent_action("Coordinator", "Stage Timings", {"item": item["item_name"], "timings": run.timings})
+    return run["entry"]
+
+async def analyze_items(user_id: str, items: list) -> list:
+    """
+    Runs items through the agents without saving them. Returns one entry per item
+    ({"result", "record", "memory_log"}) or the exception that item failed with.
+    Multi-item requests use one batched LLM call per stage when LLM_BATCH_MODE is on.
+    """
+    if settings.LLM_BATCH_MODE and len(items) > 1:
+        with tracer.span("batch", items=len(items)):
+            run = await batch_pipeline.run(user_id=user_id, items=items)
+        log_agent_action("Coordinator", "Request Timings", {"items": len(items), "timings": run.timings})
+        return run["entries"]
+    return await _process_items(user_id, items)
+
 async def coordinator_agent(user_id: str, items: list):
     """
     CoordinatorAgent orchestrates the flow with PARALLEL processing:
-    Input -> Memory Check -> [Classify -> Calculate -> Suggest -> Update Memory] (in parallel for each item)
+    Input -> [Memory Check | Classify -> Calculate | Suggest] (in parallel for each item) -> Write -> Update Memory
+    All records and memory logs of a request are written in a single transaction.
     """
-    # 1. Get User Context (Long-term + Session)
-    user_context = await get_user_context(user_id)
-    
-    # 2. Process all items in PARALLEL for better performance
-    results = await asyncio.gather(
-        *[process_single_item(user_id, item, user_context) for item in items],
-        return_exceptions=True  # Continue even if one item fails
-    )
-    
+    with tracer.span("coordinator", items=len(items)):
+        results = await _persist(await analyze_items(user_id, items))
+    run_in_background(remember_history(user_id, items, results), "memory")
+
     # 3. Filter out any exceptions and log them
     successful_results = []
     for i, result in enumerate(results):
         if isinstance(result, Exception):
-            print(f"Error processing item {items[i]}: {result}")
+            logger.warning("Error processing item %s: %s", items[i], result)
             continue
-        successful_results.append(result)
-    
+        successful_results.append(result["result"])
+
     total_session_co2e = sum(r["co2e_kg"] for r in successful_results)
-    return {"status": "success", "results": successful_results, "total_co2e_kg": total_session_co2e}
+    return {
+        "status": "success",
+        "results": successful_results,
+        "total_co2e_kg": total_session_co2e,
+        "degraded": llm_governor.degraded,  # Gemini unhealthy: some results may be fallbacks
+    }
+
+async def coordinator_agent_stream(user_id: str, items: list):
+    """
+    Streaming variant of coordinator_agent: yields {"event": "item" | "error", ...}
+    for each item as soon as its pipeline finishes, then a "summary" once every
+    completed item has been written in one transaction.
+    If the consumer stops early (client disconnect), unfinished items are cancelled
+    and the finished ones are saved in the background.
+    """
+    context_task = asyncio.ensure_future(get_user_context(user_id))
+    pending = {
+        asyncio.ensure_future(process_single_item(user_id, item, context_task)): index
+        for index, item in enumerate(items)
+    }
+    entries: list = [RuntimeError("Cancelled")] * len(items)
+    persist_task = None
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = pending.pop(task)
+                if task.exception() is not None:
+                    entries[index] = task.exception()
+                    logger.warning("Error processing item %s: %s", items[index], task.exception())
+                    yield {"event": "error", "index": index, "item": items[index]["item_name"], "detail": str(task.exception())}
+                    continue
+                entries[index] = task.result()
+                yield {"event": "item", "index": index, **task.result()["result"]}
+
+        # Shielded: a disconnect during the write must not cancel it half-way
+        persist_task = run_in_background(_persist(entries), "persist")
+        persisted = await asyncio.shield(persist_task)
+        run_in_background(remember_history(user_id, items, persisted), "memory")
+
+        saved = [entry["result"] for entry in persisted if not isinstance(entry, Exception)]
+        yield {
+            "event": "summary",
+            "saved": len(saved),
+            "failed": [i for i, entry in enumerate(persisted) if isinstance(entry, Exception)],
+            "total_co2e_kg": sum(r["co2e_kg"] for r in saved),
+            "degraded": llm_governor.degraded,
+        }
+    finally:
+        for task, index in pending.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                entries[index] = task.result()  # finished but not yet sent: still worth saving
+            task.cancel()
+        context_task.cancel()  # no-op once it has finished
+        if persist_task is None and any(not isinstance(entry, Exception) for entry in entries):
+            run_in_background(_persist(entries), "persist")
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Optional
+from sqlalchemy import delete, exists, func, select
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.core.leases import LeaseLost, LeaseTable, LeasedWorkerPool
+from app.core.response_cache import response_cache
+from app.core.user_versions import bump_user_versions
+from app.agents.memory_agent import user_context_cache
+from app.models import (
+    AccountDeletion, AssessmentJob, DailyFootprintRollup, FootprintRecord, MemoryLog, UserGoal, UserPreference,
+)
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+deletion_leases = LeaseTable(AccountDeletion, settings.JOB_LEASE_SECONDS)
+
+# Large tables purged in batches: model -> (cutoff column, progress counter)
+PURGED_TABLES = {
+    FootprintRecord: ("footprint_cutoff_id", "footprints_deleted"),
+    MemoryLog: ("memory_log_cutoff_id", "memory_logs_deleted"),
+}
+
+# Small per-user tables, deleted in the request transaction
+DELETED_AT_ONCE = (DailyFootprintRollup, UserGoal, UserPreference, AssessmentJob)
+
+def visible(model):
+    """
+    Filter for reads of a purged table: hides the rows of a pending deletion
+    (those that existed when it was requested) until the workers remove them.
+    """
+    cutoff = getattr(AccountDeletion, PURGED_TABLES[model][0])
+    return ~exists().where(
+        AccountDeletion.user_id == model.user_id,
+        AccountDeletion.status != "completed",
+        model.id <= cutoff,
+    )
+
+def deletion_status(deletion: AccountDeletion) -> dict:
+    return {
+        "deletion_id": deletion.id,
+        "status": deletion.status,
+        "footprints_deleted": deletion.footprints_deleted,
+        "memory_logs_deleted": deletion.memory_logs_deleted,
+        "error": deletion.error,
+        "created_at": deletion.created_at,
+        "updated_at": deletion.updated_at,
+        "finished_at": deletion.finished_at,
+    }
+
+async def request_deletion(user_id: str) -> AccountDeletion:
+    """
+    Deletes the small tables, and hides and queues the large ones, in one short
+    transaction; the deletion workers purge the rest in batches.
+    """
+    async with open_session() as session:
+        # Everything up to the current max id belongs to the account as of now;
+        # rows the user creates afterwards are kept
+        cutoffs = {
+            column: await session.scalar(select(func.max(model.id))) or 0
+            for model, (column, _) in PURGED_TABLES.items()
+        }
+        for model in DELETED_AT_ONCE:
+            await session.execute(delete(model).where(model.user_id == user_id))
+        deletion = AccountDeletion(user_id=user_id, **cutoffs)
+        session.add(deletion)
+        await bump_user_versions(session, [user_id], [response_cache.scope, user_context_cache.scope])
+        await session.commit()
+    deletion_workers.notify()
+    return deletion
+
+async def get_deletion(deletion_id: str, user_id: str) -> Optional[AccountDeletion]:
+    async with open_session() as session:
+        statement = select(AccountDeletion).where(AccountDeletion.id == deletion_id, AccountDeletion.user_id == user_id)
+        return (await session.scalars(statement)).first()
+
+async def claim_deletion(worker_id: str) -> Optional[AccountDeletion]:
+    return await deletion_leases.claim(worker_id)
+
+async def _purge_batch(session, model, user_id: str, cutoff_id: int) -> int:
+    # DELETE ... WHERE id IN (SELECT ... LIMIT n): bounded locks and WAL per transaction
+    batch = (
+        select(model.id)
+        .where(model.user_id == user_id, model.id <= cutoff_id)
+        .limit(settings.ACCOUNT_DELETE_BATCH_SIZE)
+        .scalar_subquery()
+    )
+    result = await session.execute(delete(model).where(model.id.in_(batch)).execution_options(synchronize_session=False))
+    return result.rowcount
+
+async def run_deletion(deletion: AccountDeletion, worker_id: str) -> str:
+    """
+    Purges the account's rows ACCOUNT_DELETE_BATCH_SIZE at a time, one short
+    transaction per batch, pausing ACCOUNT_DELETE_PAUSE_SECONDS in between.
+    Progress is committed with each batch; a crashed purge is simply resumed
+    by the next worker once the lease expires.
+    """
+    progress = {"footprints_deleted": deletion.footprints_deleted, "memory_logs_deleted": deletion.memory_logs_deleted}
+    heartbeat = asyncio.ensure_future(deletion_leases.heartbeat(deletion.id, worker_id))
+    try:
+        for model, (column, counter) in PURGED_TABLES.items():
+            while True:
+                async with open_session() as session:
+                    deleted = await _purge_batch(session, model, deletion.user_id, getattr(deletion, column))
+                    progress[counter] += deleted
+                    if deleted:
+                        await bump_user_versions(session, [deletion.user_id], [response_cache.scope])
+                    await deletion_leases.update(session, deletion.id, worker_id,
+                                                 lease_expires_at=deletion_leases.expiry(), **progress)
+                    await session.commit()
+                if deleted < settings.ACCOUNT_DELETE_BATCH_SIZE:
+                    break
+                await asyncio.sleep(settings.ACCOUNT_DELETE_PAUSE_SECONDS)
+        heartbeat.cancel()
+        await deletion_leases.finish(deletion.id, worker_id, "completed", error=None)
+        return "completed"
+    except LeaseLost:
+        logger.warning("Account deletion %s: lease lost to another worker", deletion.id)
+        return "lost"
+    except asyncio.CancelledError:
+        try:
+            await asyncio.shield(deletion_leases.release(deletion.id, worker_id))
+        except Exception:
+            pass  # the lease simply expires
+        raise
+    except Exception as e:
+        # Never given up on: the lease expires and another attempt resumes the purge
+        logger.error("Account deletion %s error (attempt %s): %s", deletion.id, deletion.attempts, e)
+        try:
+            async with open_session() as session:
+                await deletion_leases.update(session, deletion.id, worker_id, error=str(e))
+                await session.commit()
+        except Exception:
+            pass
+        return "error"
+    finally:
+        heartbeat.cancel()
+
+# Runs inside the API process (ACCOUNT_DELETE_WORKERS) or standalone via `python -m app.cli worker`
+deletion_workers = LeasedWorkerPool("deletions", settings.ACCOUNT_DELETE_WORKERS, settings.JOB_POLL_SECONDS,
+                                    claim_deletion, run_deletion, outcomes=("completed", "lost", "error"))
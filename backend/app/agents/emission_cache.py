@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.models import EmissionFactor
+from app.agents.normalize import normalize_item_name, normalize_category, normalize_unit
+
+settings = get_settings()
+
+# Tier 1: per-process LRU/TTL cache. Tier 2: the emission_factor table.
+_memory_cache = TTLCache(
+    max_entries=settings.EMISSION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.EMISSION_CACHE_TTL_SECONDS,
+)
+_db_stats = {"hits": 0, "misses": 0, "writes": 0}
+
+def make_cache_key(item_name: str, category: str, unit: str) -> str:
+    return "|".join([
+        normalize_item_name(item_name),
+        normalize_category(category).lower(),
+        normalize_unit(unit),
+    ])
+
+def _max_age() -> timedelta:
+    return timedelta(days=settings.EMISSION_FACTOR_MAX_AGE_DAYS)
+
+async def get_cached_factor(item_name: str, category: str, unit: str) -> Optional[dict]:
+    """
+    Looks up the emission factor (kg CO2e per unit) for an item.
+    Returns {"factor": float, "source": str} or None on a miss.
+    """
+    key = make_cache_key(item_name, category, unit)
+    entry = _memory_cache.get(key)
+    if entry is not None:
+        return entry
+
+    async with open_session() as session:
+        stmt = select(EmissionFactor).where(EmissionFactor.cache_key == key)
+        result = await session.execute(stmt)
+        row = result.scalar_one_or_none()
+
+    if row is None or row.updated_at < datetime.utcnow() - _max_age():
+        _db_stats["misses"] += 1
+        return None
+
+    _db_stats["hits"] += 1
+    entry = {"factor": row.factor, "source": row.source}
+    _memory_cache.set(key, entry)
+    return entry
+
+async def store_factor(item_name: str, category: str, unit: str, factor: float, source: Optional[str]):
+    """
+    Upserts an emission factor into both cache tiers.
+    """
+    key = make_cache_key(item_name, category, unit)
+    now = datetime.utcnow()
+    stmt = insert(EmissionFactor).values(
+        cache_key=key,
+        item_name=normalize_item_name(item_name),
+        category=normalize_category(category),
+        unit=normalize_unit(unit),
+        factor=factor,
+        source=source,
+        created_at=now,
+        updated_at=now,
+    ).on_conflict_do_update(
+        index_elements=["cache_key"],
+        set_={"factor": factor, "source": source, "updated_at": now},
+    )
+
+    async with open_session() as session:
+        await session.execute(stmt)
+        await session.commit()
+
+    _db_stats["writes"] += 1
+    _memory_cache.set(key, {"factor": factor, "source": source})
+
+async def invalidate_factors(item_name: Optional[str] = None, category: Optional[str] = None, unit: Optional[str] = None) -> int:
+    """
+    Deletes cached factors matching the given fields (all of them when none are given).
+    Other workers drop their in-process copies within EMISSION_CACHE_TTL_SECONDS.
+    """
+    stmt = delete(EmissionFactor)
+    if item_name is not None:
+        stmt = stmt.where(EmissionFactor.item_name == normalize_item_name(item_name))
+    if category is not None:
+        stmt = stmt.where(EmissionFactor.category == normalize_category(category))
+    if unit is not None:
+        stmt = stmt.where(EmissionFactor.unit == normalize_unit(unit))
+
+    async with open_session() as session:
+        result = await session.execute(stmt)
+        await session.commit()
+
+    _memory_cache.clear()
+    return result.rowcount
+
+async def purge_expired_factors() -> int:
+    """
+    Eviction for the database tier: removes factors older than EMISSION_FACTOR_MAX_AGE_DAYS.
+    """
+    cutoff = datetime.utcnow() - _max_age()
+    async with open_session() as session:
+        result = await session.execute(delete(EmissionFactor).where(EmissionFactor.updated_at < cutoff))
+        await session.commit()
+    return result.rowcount
+
+def emission_cache_stats() -> dict:
+    return {"memory": _memory_cache.stats(), "database": dict(_db_stats)}
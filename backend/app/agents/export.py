@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Optional
+from sqlalchemy import delete, select
+from app.agents.deletion import PURGED_TABLES, visible
+from app.core.config import get_settings
+from app.core.dag import run_in_background
+from app.core.db import open_session
+from app.models import DataExport, FootprintRecord, MemoryLog, UserGoal, UserPreference
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# (section, model, exported columns, order) - same sections and fields as the
+# original export; ordered along the (user_id, ...) indexes so no sort is needed
+EXPORT_SECTIONS = [
+    ("footprints", FootprintRecord,
+     ["id", "item_name", "category", "quantity", "unit", "co2e_kg", "suggestions", "created_at"], "created_at"),
+    ("goals", UserGoal, ["id", "target_co2e", "period", "start_date", "end_date"], "id"),
+    ("preferences", UserPreference, ["id", "key", "value"], "id"),
+    ("memory_logs", MemoryLog, ["id", "role", "content", "timestamp"], "timestamp"),
+]
+
+FORMATS = ("json", "ndjson")
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+async def _section_rows(session, user_id: str, model, columns: list[str], order: str) -> AsyncIterator[list[dict]]:
+    # Server-side cursor: EXPORT_CHUNK_SIZE rows per round trip, never the whole table
+    statement = (
+        select(*[getattr(model, column) for column in columns])
+        .where(model.user_id == user_id)
+        .order_by(getattr(model, order))
+        .execution_options(yield_per=settings.EXPORT_CHUNK_SIZE)
+    )
+    if model in PURGED_TABLES:
+        statement = statement.where(visible(model))  # deleted, not yet purged
+    result = await session.stream(statement)
+    async for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+async def stream_export(user_id: str, format: str = "json") -> AsyncIterator[str]:
+    """
+    Yields the user's data in chunks, so memory stays flat however much history
+    the user has. json: the same document as the original export
+    ({"footprints": [...], "goals": [...], ...}); ndjson: one
+    {"table": section, "row": {...}} object per line.
+    Opens its own session: the generator outlives the request handler.
+    """
+    as_json = format == "json"
+    async with open_session() as session:
+        if as_json:
+            yield "{"
+        for i, (section, model, columns, order) in enumerate(EXPORT_SECTIONS):
+            if as_json:
+                yield ("," if i else "") + f'"{section}":['
+            separator = ""
+            async for rows in _section_rows(session, user_id, model, columns, order):
+                if as_json:
+                    yield separator + ",".join(_dumps(row) for row in rows)
+                    separator = ","
+                else:
+                    yield "".join(_dumps({"table": section, "row": row}) + "\n" for row in rows)
+            if as_json:
+                yield "]"
+        if as_json:
+            yield "}"
+
+# --- Prepared exports -------------------------------------------------------
+
+def _export_path(export_id: str, format: str) -> str:
+    return os.path.join(settings.EXPORT_DIR, f"{export_id}.{format}")
+
+async def prepare_export(user_id: str, format: str) -> DataExport:
+    """Records a pending export and writes it to EXPORT_DIR in the background."""
+    await purge_exports(user_id, expired_only=True)
+    async with open_session() as session:
+        export = DataExport(user_id=user_id, format=format)
+        session.add(export)
+        await session.commit()
+    run_in_background(_write_export(export.id, user_id, format), "export")
+    return export
+
+async def _write_export(export_id: str, user_id: str, format: str):
+    path = _export_path(export_id, format)
+    values = {}
+    try:
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            async for chunk in stream_export(user_id, format):
+                await asyncio.to_thread(f.write, chunk)
+        os.replace(path + ".part", path)  # downloads never see a half-written file
+        now = datetime.utcnow()
+        values = dict(status="ready", path=path, size_bytes=os.path.getsize(path),
+                      finished_at=now, expires_at=now + timedelta(hours=settings.EXPORT_TTL_HOURS))
+    except Exception as e:
+        logger.error("Export error for %s: %s", export_id, e)
+        values = dict(status="failed", error=str(e), finished_at=datetime.utcnow())
+    finally:
+        async with open_session() as session:
+            export = await session.get(DataExport, export_id)
+            if export is not None:
+                for key, value in values.items():
+                    setattr(export, key, value)
+                await session.commit()
+
+async def get_export(export_id: str, user_id: str) -> Optional[DataExport]:
+    async with open_session() as session:
+        statement = select(DataExport).where(DataExport.id == export_id, DataExport.user_id == user_id)
+        return (await session.scalars(statement)).first()
+
+async def purge_exports(user_id: str, expired_only: bool = False) -> int:
+    """Deletes the user's prepared export files and rows (only expired ones if asked)."""
+    async with open_session() as session:
+        statement = select(DataExport).where(DataExport.user_id == user_id)
+        if expired_only:
+            statement = statement.where(DataExport.expires_at < datetime.utcnow())
+        exports = (await session.scalars(statement)).all()
+        for export in exports:
+            for path in (export.path, _export_path(export.id, export.format) + ".part"):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        if exports:
+            await session.execute(delete(DataExport).where(DataExport.id.in_([e.id for e in exports])))
+            await session.commit()
+        return len(exports)
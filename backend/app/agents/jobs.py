@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Optional
+from sqlalchemy import select
+from app.agents.coordinator import analyze_items, remember_history
+from app.agents.tools import bulk_writer_tool
+from app.core.config import get_settings
+from app.core.dag import run_in_background
+from app.core.db import open_session
+from app.core.governor import batch_priority
+from app.core.leases import LeaseLost, LeaseTable, LeasedWorkerPool
+from app.core.tracing import tracer
+from app.models import AssessmentJob
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+job_leases = LeaseTable(AssessmentJob, settings.JOB_LEASE_SECONDS)
+
+def job_status(job: AssessmentJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total_items": len(job.items),
+        "processed_items": job.processed,
+        "total_co2e_kg": job.total_co2e_kg,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+async def enqueue_job(user_id: str, items: list[dict]) -> AssessmentJob:
+    """Stores the items as a queued job; a worker picks it up."""
+    async with open_session() as session:
+        job = AssessmentJob(user_id=user_id, items=items)
+        session.add(job)
+        await session.commit()
+        job_workers.notify()
+        return job
+
+async def get_job(job_id: str, user_id: str) -> Optional[AssessmentJob]:
+    async with open_session() as session:
+        statement = select(AssessmentJob).where(AssessmentJob.id == job_id, AssessmentJob.user_id == user_id)
+        return (await session.scalars(statement)).first()
+
+async def claim_job(worker_id: str) -> Optional[AssessmentJob]:
+    """Leases the oldest queued job, or a running one whose worker stopped renewing its lease."""
+    return await job_leases.claim(worker_id)
+
+async def _update_leased(session, job_id: str, worker_id: str, **values):
+    await job_leases.update(session, job_id, worker_id, **values)
+
+async def _finish(job_id: str, worker_id: str, status: str, error: Optional[str] = None):
+    await job_leases.finish(job_id, worker_id, status, error=error)
+
+async def _process_chunk(job: AssessmentJob, worker_id: str, progress: dict):
+    start = progress["processed"]
+    items = job.items[start:start + settings.JOB_CHUNK_SIZE]
+    entries = await analyze_items(job.user_id, items)
+    saved = [entry for entry in entries if not isinstance(entry, Exception)]
+
+    async def record_progress(session, ids):
+        # Same transaction as the footprint rows: a crash never double-counts a chunk
+        written = iter(ids)
+        results, total = [], 0.0
+        for offset, (item, entry) in enumerate(zip(items, entries)):
+            result = {"index": start + offset, "item": item["item_name"]}
+            if isinstance(entry, Exception):
+                result["error"] = str(entry)
+            elif next(written) is None:
+                result["error"] = "Failed to save footprint record"
+            else:
+                result.update(entry["result"])
+                total += entry["result"]["co2e_kg"] or 0
+            results.append(result)
+
+        progress.update(
+            results=progress["results"] + results,
+            processed=start + len(items),
+            total_co2e_kg=progress["total_co2e_kg"] + total,
+        )
+        await _update_leased(session, job.id, worker_id, lease_expires_at=job_leases.expiry(), **progress)
+
+    ids = await bulk_writer_tool(
+        [entry["record"] for entry in saved],
+        [entry["memory_log"] for entry in saved],
+        before_commit=record_progress,
+    )
+    written = iter(ids)
+    persisted = [
+        entry if isinstance(entry, Exception) or next(written) is not None else RuntimeError("Failed to save footprint record")
+        for entry in entries
+    ]
+    run_in_background(remember_history(job.user_id, items, persisted), "memory")
+
+async def run_job(job: AssessmentJob, worker_id: str):
+    """
+    Processes a leased job JOB_CHUNK_SIZE items at a time, resuming after the
+    last committed chunk. LLM calls run at batch priority so interactive
+    /api/assess requests are served first.
+    """
+    if job.attempts > settings.JOB_MAX_ATTEMPTS:
+        await _finish(job.id, worker_id, "failed", f"Gave up after {job.attempts - 1} attempts")
+        return "failed"
+
+    progress = {"results": list(job.results), "processed": job.processed, "total_co2e_kg": job.total_co2e_kg}
+    heartbeat = asyncio.ensure_future(job_leases.heartbeat(job.id, worker_id))
+    try:
+        with batch_priority():
+            while progress["processed"] < len(job.items):
+                # One trace per chunk: a long job would otherwise be a single huge trace
+                with tracer.trace("job.chunk", job_id=job.id, offset=progress["processed"]):
+                    await _process_chunk(job, worker_id, progress)
+        heartbeat.cancel()
+        await _finish(job.id, worker_id, "succeeded")
+        return "succeeded"
+    except LeaseLost:
+        logger.warning("Job %s: lease lost to another worker", job.id)
+        return "lost"
+    except asyncio.CancelledError:
+        try:
+            await asyncio.shield(job_leases.release(job.id, worker_id))
+        except Exception:
+            pass  # the lease simply expires
+        raise
+    except Exception as e:
+        # The lease is left to expire, which backs off before the next attempt
+        logger.error("Job %s error (attempt %s): %s", job.id, job.attempts, e)
+        return "error"
+    finally:
+        heartbeat.cancel()
+
+# Runs inside the API process (JOB_WORKERS) or standalone via `python -m app.cli worker`
+job_workers = LeasedWorkerPool("jobs", settings.JOB_WORKERS, settings.JOB_POLL_SECONDS, claim_job, run_job,
+                               outcomes=("succeeded", "failed", "lost", "error"))
@@ -0,0 +1,81 @@
+import json
+from typing import Any, Iterator, Optional, Sequence
+from app.agents.normalize import normalize_item_name
+
+def parse_json_response(text: str) -> Any:
+    """
+    Parses a Gemini JSON answer, tolerating ```json fences around it.
+    """
+    content = text.strip()
+    if content.startswith("```json"):
+        content = content[7:-3]
+    elif content.startswith("```"):
+        content = content[3:-3]
+    return json.loads(content)
+
+def chunked(seq: Sequence, size: int) -> Iterator[Sequence]:
+    size = max(1, size)
+    for start in range(0, len(seq), size):
+        yield seq[start:start + size]
+
+def numbered_items(lines: Sequence[str]) -> str:
+    return "\n".join(f"{i}. {line}" for i, line in enumerate(lines))
+
+def index_batch_results(parsed: Any, size: int) -> list[Optional[dict]]:
+    """
+    Maps a batch answer (a JSON array of objects carrying an "index") back to
+    input positions. Missing, duplicate or malformed entries stay None so the
+    caller can retry just those items one by one.
+    """
+    results: list[Optional[dict]] = [None] * size
+    if isinstance(parsed, dict):
+        parsed = parsed.get("results", [])
+    if not isinstance(parsed, list):
+        return results
+
+    for position, entry in enumerate(parsed):
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("index", position)
+        if isinstance(index, int) and 0 <= index < size and results[index] is None:
+            results[index] = entry
+    return results
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text, close enough for budgeting
+    return (len(text) + 3) // 4
+
+def _clip(value: Any, limit: int = 60) -> str:
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def prompt_context(user_context: dict, item_names: Sequence[str], budget_tokens: int) -> str:
+    """
+    Renders the user context for a prompt within budget_tokens: the active
+    goal first, then the preferences sharing the most words with the items
+    (ties by key, so equal inputs give the same text). Preferences that do not
+    fit are left out rather than cut mid-way.
+    """
+    lines = []
+    goals = [f"reduce to {g['target']:g} kg CO2e {g['period']}" for g in user_context.get("goals", [])
+             if g.get("target") is not None]
+    if goals:
+        goal_line = "User goal: " + "; ".join(goals)
+        if estimate_tokens(goal_line) <= budget_tokens:
+            lines.append(goal_line)
+
+    item_words = {word for name in item_names for word in normalize_item_name(name).split()}
+
+    def relevance(pref):
+        key, value = pref
+        return (-len(set(normalize_item_name(f"{key} {value}").split()) & item_words), key)
+
+    kept = []
+    for key, value in sorted(user_context.get("preferences", {}).items(), key=relevance):
+        candidate = "User preferences: " + "; ".join(kept + [f"{_clip(key, 30)}: {_clip(value)}"])
+        if estimate_tokens("\n".join(lines + [candidate])) > budget_tokens:
+            break
+        kept.append(f"{_clip(key, 30)}: {_clip(value)}")
+    if kept:
+        lines.append("User preferences: " + "; ".join(kept))
+    return "\n".join(lines) or "No known preferences or goals."
@@ -0,0 +1,217 @@
+import json
+import os
+from collections import OrderedDict, defaultdict
+from typing import Iterable, Optional
+from sqlalchemy import select, func
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.models import FootprintRecord
+from app.agents.normalize import normalize_item_name
+
+settings = get_settings()
+
+CATEGORIES = ["Food", "Transport", "Energy", "Clothing", "Electronics", "Household", "Other"]
+
+# Hand-curated seed vocabulary. Bigrams outweigh single words, so "electric car"
+# beats the "electric" hint towards Energy.
+SEED_KEYWORDS = {
+    "Food": [
+        "apple", "banana", "orange", "berry", "grape", "fruit", "vegetable", "salad", "lettuce", "tomato",
+        "potato", "carrot", "onion", "rice", "pasta", "bread", "cereal", "oat", "flour", "bean", "lentil",
+        "tofu", "beef", "pork", "lamb", "chicken", "turkey", "fish", "salmon", "tuna", "shrimp", "prawn",
+        "egg", "milk", "cheese", "butter", "yogurt", "yoghurt", "cream", "coffee", "tea", "juice", "soda",
+        "beer", "wine", "water bottle", "chocolate", "sugar", "snack", "chip", "burger", "pizza", "sandwich",
+        "steak", "sausage", "bacon", "meal", "lunch", "dinner", "breakfast", "avocado", "nut", "almond",
+        "meat", "dairy", "grocery", "takeaway", "latte", "cappuccino", "espresso", "noodle", "soup",
+    ],
+    "Transport": [
+        "car", "drive", "driving", "taxi", "uber", "lyft", "bus", "train", "tram", "metro", "subway",
+        "flight", "plane", "airplane", "fly", "ferry", "boat", "cruise", "bike", "bicycle", "scooter",
+        "motorbike", "motorcycle", "commute", "trip", "ride", "journey", "petrol", "diesel", "gasoline", "fuel",
+        "mileage",
+        "electric car", "electric vehicle", "ev charging", "road trip", "car rental", "ride share",
+    ],
+    "Energy": [
+        "electricity", "power", "kwh", "heating", "heater", "boiler", "natural gas", "gas bill",
+        "electric bill", "energy", "solar", "propane", "coal", "firewood", "air conditioning",
+        "air conditioner", "ac", "thermostat", "utility bill", "hot water", "generator",
+    ],
+    "Clothing": [
+        "shirt", "t shirt", "tshirt", "jean", "trouser", "pant", "dress", "skirt", "jacket", "coat",
+        "sweater", "hoodie", "shoe", "sneaker", "boot", "sock", "underwear", "hat", "scarf", "glove",
+        "clothing", "clothes", "apparel", "garment", "cotton", "polyester", "wool", "leather jacket",
+    ],
+    "Electronics": [
+        "phone", "smartphone", "iphone", "laptop", "computer", "pc", "tablet", "ipad", "tv", "television",
+        "monitor", "headphone", "earbud", "camera", "console", "playstation", "xbox", "charger", "cable",
+        "printer", "router", "smartwatch", "speaker", "keyboard", "mouse", "battery", "gpu", "electronic",
+    ],
+    "Household": [
+        "detergent", "soap", "shampoo", "toothpaste", "toilet paper", "paper towel", "tissue", "cleaner",
+        "bleach", "sponge", "furniture", "chair", "table", "sofa", "couch", "bed", "mattress", "pillow",
+        "blanket", "towel", "candle", "lamp", "light bulb", "plastic bag", "trash bag", "bin bag", "plate",
+        "cup", "mug", "pan", "pot", "kitchen", "appliance", "washing machine", "dishwasher", "fridge",
+        "refrigerator", "microwave", "vacuum", "paint", "garden", "plant", "diaper", "nappy",
+    ],
+}
+
+# Filler words that carry no category signal and need not be matched
+_STOPWORDS = {"a", "an", "the", "of", "for", "with", "and", "in", "on", "my", "some"}
+
+def _ngrams(normalized: str) -> list[str]:
+    words = normalized.split()
+    return words + [" ".join(pair) for pair in zip(words, words[1:])]
+
+class LocalClassifier:
+    """
+    Microsecond classifier that answers before the Gemini classifier_agent.
+    Combines the seed keyword index, a table learned from past classifications
+    and a memo of recent answers. Low-confidence answers fall back to Gemini.
+    Confidence from keywords is scaled by the share of the item's words that
+    support the winning category, so "apple watch" (only "apple" is known)
+    goes to Gemini instead of being filed as Food. The learned tables keep the
+    max_learned most recently learned items and words.
+    """
+
+    def __init__(self, memo_size: int = 10000, max_learned: int = 50000):
+        self.max_learned = max_learned
+        self._keywords: dict[str, str] = {}
+        # item -> category -> [count, confidence sum]; oldest learned first
+        self._learned: "OrderedDict[str, dict[str, list[float]]]" = OrderedDict()
+        self._token_weights: "OrderedDict[str, dict[str, float]]" = OrderedDict()
+        self._memo = TTLCache(max_entries=memo_size)
+        self.stats = {"answered": 0, "fallbacks": 0, "learned": 0, "evicted": 0}
+        for category, keywords in SEED_KEYWORDS.items():
+            for keyword in keywords:
+                self._keywords[normalize_item_name(keyword)] = category
+
+    def classify(self, item_name: str) -> dict:
+        """
+        Returns {"category", "confidence"} in the same shape as classifier_agent.
+        """
+        key = normalize_item_name(item_name)
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+
+        result = self._classify_learned(key) or self._classify_ngrams(key)
+        self._memo.set(key, result)
+        return result
+
+    def _classify_learned(self, key: str) -> Optional[dict]:
+        counts = self._learned.get(key)
+        if not counts:
+            return None
+        total = sum(count for count, _ in counts.values())
+        category, (count, confidence_sum) = max(counts.items(), key=lambda kv: kv[1][0])
+        return {"category": category, "confidence": round(confidence_sum / total, 4)}
+
+    def _classify_ngrams(self, key: str) -> dict:
+        scores: dict[str, float] = defaultdict(float)
+        supported: dict[str, set[str]] = defaultdict(set)  # category -> words of the grams voting for it
+        for gram in _ngrams(key):
+            weight = 2.0 if " " in gram else 1.0
+            category = self._keywords.get(gram)
+            if category:
+                scores[category] += weight
+                supported[category].update(gram.split())
+            learned = self._token_weights.get(gram)
+            if learned:
+                total = sum(learned.values())
+                for learned_category, count in learned.items():
+                    scores[learned_category] += 0.5 * weight * count / total
+                    supported[learned_category].update(gram.split())
+
+        if not scores:
+            return {"category": "Other", "confidence": 0.0}
+
+        category, best = max(scores.items(), key=lambda kv: kv[1])
+        share = best / sum(scores.values())
+        words = [word for word in key.split() if word not in _STOPWORDS] or key.split()
+        coverage = sum(word in supported[category] for word in words) / len(words)
+        return {"category": category, "confidence": round(0.55 + 0.35 * share * coverage, 4)}
+
+    def _trim(self, table: OrderedDict):
+        while len(table) > self.max_learned:
+            table.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def learn(self, item_name: str, category: str, confidence: float, count: int = 1):
+        if category not in CATEGORIES:
+            return
+        key = normalize_item_name(item_name)
+        if not key:
+            return
+        entry = self._learned.setdefault(key, {}).setdefault(category, [0, 0.0])
+        entry[0] += count
+        entry[1] += confidence * count
+        self._learned.move_to_end(key)
+        for gram in _ngrams(key):
+            weights = self._token_weights.setdefault(gram, {})
+            weights[category] = weights.get(category, 0.0) + count
+            self._token_weights.move_to_end(gram)
+        self._trim(self._learned)
+        self._trim(self._token_weights)
+        self._memo.pop(key)
+        self.stats["learned"] += 1
+
+    def load_rows(self, rows: Iterable[tuple]):
+        """
+        Loads (item_name, category, avg_confidence, count) rows into the learned table.
+        """
+        for item_name, category, confidence, count in rows:
+            self.learn(item_name, category, confidence or 0.0, count=count)
+
+    def to_dict(self) -> dict:
+        return {
+            "learned": {
+                key: {category: list(entry) for category, entry in counts.items()}
+                for key, counts in self._learned.items()
+            }
+        }
+
+    def load_dict(self, data: dict):
+        for key, counts in data.get("learned", {}).items():
+            for category, (count, confidence_sum) in counts.items():
+                self.learn(key, category, confidence_sum / count if count else 0.0, count=int(count))
+
+    def load_snapshot(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            self.load_dict(json.load(f))
+        return True
+
+    def save_snapshot(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+local_classifier = LocalClassifier(max_learned=settings.LOCAL_CLASSIFIER_MAX_LEARNED)
+
+async def rebuild_local_classifier(min_confidence: float = 0.7) -> LocalClassifier:
+    """
+    Retrains the learned table from past FootprintRecord classifications
+    and writes a snapshot that workers load at startup.
+    """
+    stmt = select(
+        FootprintRecord.item_name,
+        FootprintRecord.category,
+        func.avg(FootprintRecord.classification_confidence),
+        func.count(),
+    ).where(
+        FootprintRecord.category != None,
+        FootprintRecord.classification_confidence >= min_confidence,
+    ).group_by(
+        FootprintRecord.item_name, FootprintRecord.category,
+    ).order_by(func.count())  # loaded last, the most frequent items survive the max_learned cap
+
+    classifier = LocalClassifier(max_learned=settings.LOCAL_CLASSIFIER_MAX_LEARNED)
+    async with open_session() as session:
+        result = await session.execute(stmt)
+        classifier.load_rows(result.all())
+
+    classifier.save_snapshot(settings.LOCAL_CLASSIFIER_SNAPSHOT)
+    return classifier
@@ -1,38 +1,52 @@
-from sqlalchemy import select
-from app.core.db import get_session
-from app.models import UserPreference, UserGoal, MemoryLog
+from sqlalchemy import Float, String, cast, literal, null, select, union_all
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.core.singleflight import SingleFlight
+from app.core.tracing import trace_attributes, traced
+from app.core.user_versions import UserVersionedCache, bump_user_versions
+from app.models import UserPreference, UserGoal
 
-async def get_user_context(user_id: str):
-    """
-    Retrieves user preferences and active goals.
-    """
+settings = get_settings()
+
+# Preferences and active goals per (user, version)
+user_context_cache = UserVersionedCache("user_context", settings.USER_CONTEXT_CACHE_MAX_ENTRIES,
+                                        settings.USER_CONTEXT_CACHE_TTL_SECONDS)
+user_context_flights = SingleFlight("user_context")
+
+async def invalidate_user_context(session, user_id: str):
+    """Call in the transaction that changes the user's goals or preferences."""
+    await bump_user_versions(session, [user_id], [user_context_cache.scope])
+
+async def _load_user_context(user_id: str) -> dict:
+    # One round trip: preferences and the active goal(s) in a single UNION ALL
+    statement = union_all(
+        select(
+            literal("preference").label("kind"), UserPreference.key, UserPreference.value,
+            cast(null(), Float).label("target"), cast(null(), String).label("period"),
+        ).where(UserPreference.user_id == user_id),
+        select(
+            literal("goal"), cast(null(), String), cast(null(), String), UserGoal.target_co2e, UserGoal.period,
+        ).where(UserGoal.user_id == user_id, UserGoal.end_date == None),
+    )
     context = {"preferences": {}, "goals": []}
-    
-    async for session in get_session():
-        # Get Preferences
-        stmt = select(UserPreference).where(UserPreference.user_id == user_id)
-        result = await session.execute(stmt)
-        prefs = result.scalars().all()
-        for p in prefs:
-            context["preferences"][p.key] = p.value
-            
-        # Get Active Goals
-        stmt = select(UserGoal).where(UserGoal.user_id == user_id)
-        result = await session.execute(stmt)
-        goals = result.scalars().all()
-        for g in goals:
-            context["goals"].append({
-                "target": g.target_co2e,
-                "period": g.period
-            })
-            
+    async with open_session() as session:
+        for kind, key, value, target, period in (await session.execute(statement)).all():
+            if kind == "preference":
+                context["preferences"][key] = value
+            else:
+                context["goals"].append({"target": target, "period": period})
     return context
 
-async def save_memory_log(user_id: str, role: str, content: str):
+@traced("user_context")
+async def get_user_context(user_id: str):
     """
-    Saves a conversation turn to the long-term memory log.
+    Retrieves user preferences and active goals, from the context cache when
+    possible. The dict is shared between callers: do not modify it.
     """
-    async for session in get_session():
-        log = MemoryLog(user_id=user_id, role=role, content=content)
-        session.add(log)
-        await session.commit()
+    version = await user_context_cache.version(user_id)
+    context = user_context_cache.get(user_id, version)
+    trace_attributes(cache_hit=context is not None)
+    if context is None:
+        context = await user_context_flights.do((user_id, version), lambda: _load_user_context(user_id))
+        user_context_cache.set(user_id, version, None, context)
+    return context
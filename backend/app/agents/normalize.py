@@ -0,0 +1,53 @@
+import re
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+# Words ending in "s" that are not plurals
+_SINGULAR_S = {"bus", "gas", "glass", "grass", "class", "dress", "lens", "news", "hummus", "asparagus", "couscous", "citrus"}
+
+UNIT_ALIASES = {
+    "kg": "kg", "kgs": "kg", "kilo": "kg", "kilos": "kg", "kilogram": "kg", "kilograms": "kg",
+    "g": "g", "gs": "g", "gram": "g", "grams": "g", "gr": "g",
+    "lb": "lb", "lbs": "lb", "pound": "lb", "pounds": "lb",
+    "l": "l", "liter": "l", "liters": "l", "litre": "l", "litres": "l", "ltr": "l",
+    "ml": "ml", "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml",
+    "km": "km", "kms": "km", "kilometer": "km", "kilometers": "km", "kilometre": "km", "kilometres": "km",
+    "mi": "mile", "mile": "mile", "miles": "mile",
+    "kwh": "kwh", "kilowatt hour": "kwh", "kilowatt hours": "kwh",
+    "piece": "item", "pieces": "item", "pc": "item", "pcs": "item", "item": "item", "items": "item",
+    "unit": "item", "units": "item",
+    "serving": "serving", "servings": "serving", "portion": "serving", "portions": "serving",
+}
+
+def singularize(word: str) -> str:
+    """
+    Cheap English singularization, good enough for cache keys.
+    """
+    if len(word) <= 3 or word in _SINGULAR_S or word.endswith("ss"):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes", "zes")):
+        return word[:-2]
+    if word.endswith("oes") and not word.endswith("shoes"):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("us", "is")):
+        return word[:-1]
+    return word
+
+def normalize_item_name(item_name: str) -> str:
+    """
+    Lower-case, strip punctuation, collapse whitespace and singularize each word,
+    so "Beef  Burgers!" and "beef burger" map to the same key.
+    """
+    text = _NON_WORD.sub(" ", (item_name or "").lower())
+    words = _WHITESPACE.sub(" ", text).strip().split(" ")
+    return " ".join(singularize(w) for w in words if w)
+
+def normalize_unit(unit: str) -> str:
+    text = _WHITESPACE.sub(" ", _NON_WORD.sub(" ", (unit or "").lower())).strip()
+    return UNIT_ALIASES.get(text, singularize(text))
+
+def normalize_category(category: str) -> str:
+    return (category or "Other").strip().title()
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.dialects.postgresql import insert
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.core.singleflight import SingleFlight
+from app.models import User
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# clerk_id -> profile without last_login. Per process: PROFILE_CACHE_TTL_SECONDS
+# bounds how long another worker serves a name or email edited elsewhere.
+# Only onboarded users are cached (see _cache_profile)
+profile_cache = TTLCache(max_entries=settings.PROFILE_CACHE_MAX_ENTRIES, ttl_seconds=settings.PROFILE_CACHE_TTL_SECONDS)
+profile_flights = SingleFlight("profiles")
+
+class LastLoginBuffer:
+    """
+    Coalesces last_login updates in memory and writes them in one batched
+    UPDATE every flush_seconds (the most a stored last_login lags behind).
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._pending: dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"touched": 0, "flushes": 0, "flushed": 0}
+
+    def touch(self, clerk_id: str, at: datetime):
+        self._pending[clerk_id] = at
+        self.counters["touched"] += 1
+
+    def discard(self, clerk_id: str):
+        self._pending.pop(clerk_id, None)
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        # GREATEST: a late flush never moves last_login backwards
+        statement = (
+            update(User.__table__)
+            .where(User.__table__.c.clerk_id == bindparam("b_clerk_id"))
+            .values(last_login=func.greatest(User.__table__.c.last_login, bindparam("b_last_login")))
+        )
+        try:
+            async with open_session() as session:
+                await session.execute(statement, [
+                    {"b_clerk_id": clerk_id, "b_last_login": at} for clerk_id, at in pending.items()
+                ])
+                await session.commit()
+        except Exception as e:
+            logger.error("Last login flush error: %s", e)
+            for clerk_id, at in pending.items():  # retried with the next flush
+                self._pending.setdefault(clerk_id, at)
+            return 0
+        self.counters["flushes"] += 1
+        self.counters["flushed"] += len(pending)
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), **self.counters}
+
+last_logins = LastLoginBuffer(settings.LAST_LOGIN_FLUSH_SECONDS)
+
+def _profile(user: User) -> dict:
+    return {
+        "id": user.id,
+        "clerk_id": user.clerk_id,
+        "email": user.email,
+        "name": user.name,
+        "onboarding_completed": user.onboarding_completed,
+        "created_at": user.created_at.isoformat(),
+    }
+
+async def _upsert_profile(clerk_id: str) -> dict:
+    # One statement creates the user or stamps last_login on the existing row,
+    # so concurrent first requests cannot race into a duplicate insert
+    now = datetime.utcnow()
+    statement = (
+        insert(User)
+        .values(clerk_id=clerk_id, created_at=now, last_login=now)
+        .on_conflict_do_update(index_elements=[User.clerk_id], set_={"last_login": now})
+        .returning(User)
+    )
+    async with open_session() as session:
+        user = (await session.scalars(statement)).one()
+        await session.commit()
+        last_logins.discard(clerk_id)
+        profile = _profile(user)
+        _cache_profile(profile)
+        return profile
+
+def _cache_profile(profile: dict):
+    # onboarding_completed only ever goes from false to true, and the frontend
+    # sends users back to onboarding on false: a worker must never serve a
+    # stale false after another worker completed it, so those are not cached
+    if profile["onboarding_completed"]:
+        profile_cache.set(profile["clerk_id"], profile)
+    else:
+        profile_cache.pop(profile["clerk_id"])
+
+async def load_profile(clerk_id: str) -> dict:
+    """
+    The user's profile, created on first use. Cache hits do not touch the
+    database: last_login is buffered and written behind. Users who have not
+    completed onboarding are read from the database every time.
+    """
+    now = datetime.utcnow()
+    profile = profile_cache.get(clerk_id)
+    if profile is None:
+        profile = await profile_flights.do(clerk_id, lambda: _upsert_profile(clerk_id))
+    else:
+        last_logins.touch(clerk_id, now)
+    return {**profile, "last_login": now.isoformat()}
+
+def cache_profile(user: User):
+    """Refreshes the cached profile after a write through the ORM."""
+    _cache_profile(_profile(user))
@@ -1,37 +1,160 @@
+import hashlib
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
 import google.generativeai as genai
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
 from app.core.config import get_settings
-import json
+from app.core.dag import run_in_background
+from app.core.db import open_session
+from app.core.governor import batch_priority, llm_governor
+from app.agents.llm import parse_json_response
+from app.models import DailyQuote
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
-async def quote_agent() -> dict:
+# Served for days the pool does not cover yet (e.g. Gemini down on a fresh database)
+FALLBACK_QUOTES = [
+    {"quote": "The greatest threat to our planet is the belief that someone else will save it.",
+     "author": "Robert Swan", "tip": "Reduce, Reuse, Recycle."},
+    {"quote": "The Earth is what we all have in common.",
+     "author": "Wendell Berry", "tip": "Turn off lights when leaving a room."},
+    {"quote": "We do not inherit the earth from our ancestors; we borrow it from our children.",
+     "author": "Native American proverb", "tip": "Carry a reusable water bottle."},
+    {"quote": "What you do makes a difference, and you have to decide what kind of difference you want to make.",
+     "author": "Jane Goodall", "tip": "Swap one car trip this week for walking or cycling."},
+    {"quote": "Nature is not a place to visit. It is home.",
+     "author": "Gary Snyder", "tip": "Wash clothes at 30 degrees and air-dry them."},
+]
+
+async def generate_quotes(count: int) -> list[dict]:
     """
-    QuoteAgent generates an inspiring sustainability quote and a tip.
+    QuoteAgent generates inspiring sustainability quotes, each with a tip.
+    Entries that are not complete quote/author/tip strings are dropped.
     """
     model = genai.GenerativeModel('gemini-flash-latest')
-    
-    prompt = """
-    Generate an inspiring quote about nature, sustainability, or climate change from a famous person.
-    Also provide one short, actionable sustainability tip.
-    
-    Return ONLY JSON.
-    Example: { "quote": "The Earth is what we all have in common.", "author": "Wendell Berry", "tip": "Turn off lights when leaving a room." }
+
+    prompt = f"""
+    Generate {count} different inspiring quotes about nature, sustainability, or climate change from famous people.
+    For each, also provide one short, actionable sustainability tip.
+
+    Return ONLY a JSON array.
+    Example: [{{ "quote": "The Earth is what we all have in common.", "author": "Wendell Berry", "tip": "Turn off lights when leaving a room." }}]
     """
-    
-    try:
-        response = await model.generate_content_async(prompt)
-        content = response.text.strip()
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
-            
-        return json.loads(content)
-    except Exception as e:
-        print(f"Quote Error: {e}")
-        return {
-            "quote": "The greatest threat to our planet is the belief that someone else will save it.",
-            "author": "Robert Swan",
-            "tip": "Reduce, Reuse, Recycle."
-        }
+
+    response = await llm_governor.generate(model, prompt)
+    parsed = parse_json_response(response.text)
+    if isinstance(parsed, dict):
+        parsed = parsed.get("quotes", [parsed])
+    return [
+        {key: entry[key] for key in ("quote", "author", "tip")}
+        for entry in parsed
+        if isinstance(entry, dict) and all(isinstance(entry.get(key), str) and entry[key] for key in ("quote", "author", "tip"))
+    ][:count]
+
+def pick_quote(quotes: list[dict], user_id: str, day: date) -> dict:
+    # Stable for a user all day, different between users and days
+    digest = hashlib.sha256(f"{user_id}:{day.isoformat()}".encode()).digest()
+    return quotes[int.from_bytes(digest[:8], "big") % len(quotes)]
+
+class QuotePool:
+    """
+    Quotes generated QUOTE_POOL_DAYS ahead into the daily_quote table and
+    served from memory. Requests never wait for Gemini: when fewer than
+    QUOTE_POOL_MIN_DAYS days with QUOTE_POOL_PER_DAY quotes are left, a
+    background refill tops the pool up.
+    """
+
+    def __init__(self):
+        self._by_day: dict[date, list[dict]] = {}
+        self._refill_task = None
+        self._retry_at = 0.0
+        self.counters = {"served": 0, "fallbacks": 0, "refills": 0, "generated": 0, "refill_errors": 0}
+
+    def _days_ahead(self, today: date) -> int:
+        return sum(1 for day, quotes in self._by_day.items()
+                   if day >= today and len(quotes) >= settings.QUOTE_POOL_PER_DAY)
+
+    async def load(self):
+        today = datetime.utcnow().date()
+        async with open_session() as session:
+            statement = select(DailyQuote).where(DailyQuote.day >= today).order_by(DailyQuote.day, DailyQuote.slot)
+            by_day: dict[date, list[dict]] = {}
+            for row in (await session.scalars(statement)).all():
+                by_day.setdefault(row.day, []).append({"quote": row.quote, "author": row.author, "tip": row.tip})
+            self._by_day = by_day
+
+    async def refill(self):
+        """
+        Loads what other workers stored, then generates the missing days and
+        tops up the days Gemini answered with fewer than QUOTE_POOL_PER_DAY.
+        """
+        self.counters["refills"] += 1
+        try:
+            await self.load()
+            today = datetime.utcnow().date()
+            short = False
+            with batch_priority():  # interactive requests go to Gemini first
+                for day in [today + timedelta(days=n) for n in range(settings.QUOTE_POOL_DAYS)]:
+                    stored = self._by_day.get(day, [])
+                    # Today's quotes are being served: adding some would change users' quote mid-day
+                    if len(stored) >= settings.QUOTE_POOL_PER_DAY or (day == today and stored):
+                        continue
+                    known = {quote["quote"] for quote in stored}
+                    quotes = [quote for quote in await generate_quotes(settings.QUOTE_POOL_PER_DAY - len(stored))
+                              if quote["quote"] not in known]
+                    if not quotes and not stored:
+                        raise ValueError("Gemini returned no usable quotes")
+                    await self._store(day, quotes, first_slot=len(stored))
+                    self.counters["generated"] += len(quotes)
+                    short = short or len(stored) + len(quotes) < settings.QUOTE_POOL_PER_DAY
+            await self.load()
+            if short:  # topped up by a later refill, but not retried on every request
+                logger.warning("Gemini returned fewer than %d quotes for a day", settings.QUOTE_POOL_PER_DAY)
+                self._retry_at = time.monotonic() + settings.QUOTE_REFILL_RETRY_SECONDS
+            async with open_session() as session:
+                await session.execute(delete(DailyQuote).where(DailyQuote.day < today - timedelta(days=1)))
+                await session.commit()
+        except Exception as e:
+            logger.error("Quote refill error: %s", e)
+            self.counters["refill_errors"] += 1
+            self._retry_at = time.monotonic() + settings.QUOTE_REFILL_RETRY_SECONDS
+        finally:
+            self._refill_task = None
+
+    async def _store(self, day: date, quotes: list[dict], first_slot: int = 0):
+        if not quotes:
+            return
+        async with open_session() as session:
+            await session.execute(
+                insert(DailyQuote)
+                .values([{"day": day, "slot": slot, "created_at": datetime.utcnow(), **quote}
+                         for slot, quote in enumerate(quotes, start=first_slot)])
+                .on_conflict_do_nothing(index_elements=["day", "slot"])  # another worker filled it first
+            )
+            await session.commit()
+
+    def ensure_refill(self, today: Optional[date] = None):
+        today = today or datetime.utcnow().date()
+        if (self._refill_task is None and self._days_ahead(today) < settings.QUOTE_POOL_MIN_DAYS
+                and time.monotonic() >= self._retry_at):
+            self._refill_task = run_in_background(self.refill(), "quote refill")
+
+    def daily(self, user_id: str) -> dict:
+        today = datetime.utcnow().date()
+        self.ensure_refill(today)
+        quotes = self._by_day.get(today)
+        self.counters["served"] += 1
+        if not quotes:
+            self.counters["fallbacks"] += 1
+            quotes = FALLBACK_QUOTES
+        return pick_quote(quotes, user_id, today)
+
+    def stats(self) -> dict:
+        return {"days_ahead": self._days_ahead(datetime.utcnow().date()), **self.counters}
+
+quote_pool = QuotePool()
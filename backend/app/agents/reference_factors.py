@@ -0,0 +1,224 @@
+import csv
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.db import open_session
+from app.models import ReferenceFactor
+from app.agents.llm import chunked
+from app.agents.normalize import normalize_item_name, normalize_category, normalize_unit
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+BUNDLED_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "emission_factors.csv")
+
+# (unit given by the user, unit of the reference factor) -> multiplier
+UNIT_CONVERSIONS = {
+    ("g", "kg"): 0.001,
+    ("lb", "kg"): 0.45359237,
+    ("ml", "l"): 0.001,
+    ("mile", "km"): 1.609344,
+}
+
+def _trigrams(word: str) -> frozenset:
+    padded = f"  {word} "  # padded like pg_trgm, so word starts weigh more than endings
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b)
+
+def read_csv(path: str, dataset: Optional[str] = None) -> list[dict]:
+    """
+    Reads a factor table with the columns item, category, unit, factor and
+    optionally dataset, aliases (";"-separated) and basis. `dataset` fills or
+    overrides the dataset column. Raises ValueError naming the offending line.
+    """
+    rows, seen = [], {}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"item", "category", "unit", "factor"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+        for line, record in enumerate(reader, start=2):
+            row = {
+                "dataset": (dataset or record.get("dataset") or "").strip(),
+                "item_name": normalize_item_name(record["item"]),
+                "aliases": sorted({normalize_item_name(a) for a in (record.get("aliases") or "").split(";")} - {""}),
+                "category": normalize_category(record["category"]),
+                "unit": normalize_unit(record["unit"]),
+                "basis": (record.get("basis") or "").strip() or None,
+            }
+            try:
+                row["factor"] = float(record["factor"])
+            except (TypeError, ValueError):
+                raise ValueError(f"{path}:{line}: factor {record['factor']!r} is not a number")
+            if not row["dataset"] or not row["item_name"] or not row["unit"] or row["factor"] < 0:
+                raise ValueError(f"{path}:{line}: dataset, item and unit are required and factor must be >= 0")
+            key = (row["dataset"], row["item_name"], row["unit"])
+            if key in seen:
+                raise ValueError(f"{path}:{line}: duplicate of line {seen[key]} ({row['item_name']} per {row['unit']})")
+            seen[key] = line
+            rows.append(row)
+    return rows
+
+class ReferenceFactors:
+    """
+    In-memory reference emission factors, answered before the emission cache
+    and the search + Gemini calculator. Item names are matched exactly (after
+    normalization, aliases included) or through a character trigram index.
+    A fuzzy match needs the same number of words and every word at least
+    min_similarity alike, so "bananna" finds banana but "apple juice" does
+    not become apple; anything else falls through to the calculator. Fuzzy
+    results (misses included) are memoized per normalized name.
+    """
+
+    def __init__(self, min_similarity: float = 0.6, memo_size: int = 10000):
+        self.min_similarity = min_similarity
+        self._memo = TTLCache(max_entries=memo_size)
+        self._entries: dict[str, dict[str, dict]] = {}  # item -> unit -> entry
+        self._names: dict[str, str] = {}  # item or alias -> item
+        self._name_words: dict[str, list[frozenset]] = {}  # item or alias -> trigrams of each word
+        self._postings: dict[str, set[str]] = {}  # trigram -> items and aliases containing it
+        self.counters = {"exact": 0, "fuzzy": 0, "misses": 0}
+
+    def load(self, rows: Iterable[dict]):
+        """
+        Replaces the index with these rows (dicts shaped like read_csv's).
+        A later row for the same item and unit overrides an earlier one.
+        """
+        entries: dict[str, dict[str, dict]] = defaultdict(dict)
+        names: dict[str, str] = {}
+        for row in rows:
+            entries[row["item_name"]][row["unit"]] = row
+            for name in [row["item_name"], *row["aliases"]]:
+                names[name] = row["item_name"]
+
+        postings: dict[str, set[str]] = defaultdict(set)
+        name_words = {}
+        for name in names:
+            name_words[name] = [_trigrams(word) for word in name.split()]
+            for grams in name_words[name]:
+                for gram in grams:
+                    postings[gram].add(name)
+
+        self._entries, self._names = dict(entries), names
+        self._name_words, self._postings = name_words, dict(postings)
+        self._memo.clear()
+
+    def _fuzzy(self, key: str) -> tuple[Optional[str], float]:
+        words = [_trigrams(word) for word in key.split()]
+        candidates = {name for grams in words for gram in grams for name in self._postings.get(gram, ())}
+        best, best_score = None, 0.0
+        for name in candidates:
+            name_words = self._name_words[name]
+            if len(name_words) != len(words):
+                continue
+            scores = [max(_similarity(word, other) for other in name_words) for word in words]
+            if min(scores) < self.min_similarity:
+                continue
+            score = sum(scores) / len(scores)
+            if best is None or score > best_score or (score == best_score and name < best):
+                best, best_score = name, score
+        return best, best_score
+
+    def match(self, item_name: str, unit: str, category: str) -> Optional[tuple[dict, float, float]]:
+        """
+        (entry, unit conversion, similarity) for the item, or None when no
+        entry matches with enough confidence in a compatible category and unit.
+        """
+        key = normalize_item_name(item_name)
+        if not key or not self._names:
+            return None
+        if key in self._names:
+            name, score = key, 1.0
+        else:
+            found = self._memo.get(key)
+            if found is None:
+                found = self._fuzzy(key)
+                self._memo.set(key, found)
+            name, score = found
+        if name is None:
+            return None
+
+        category = normalize_category(category)
+        unit = normalize_unit(unit)
+        for entry_unit, entry in self._entries[self._names[name]].items():
+            if category != "Other" and entry["category"] != category:
+                continue
+            conversion = 1.0 if unit == entry_unit else UNIT_CONVERSIONS.get((unit, entry_unit))
+            if conversion is not None:
+                return entry, conversion, score
+        return None
+
+    def lookup(self, item_name: str, quantity: float, unit: str, category: str) -> Optional[dict]:
+        """
+        Returns {"co2e_kg", "factor_used", "source"} like calculator_agent,
+        with factor_used per the given unit, or None when not covered.
+        """
+        found = self.match(item_name, unit, category)
+        if found is None:
+            self.counters["misses"] += 1
+            return None
+        entry, conversion, score = found
+        self.counters["exact" if score == 1.0 else "fuzzy"] += 1
+        factor = entry["factor"] * conversion
+        source = f"{entry['dataset']}: {entry['item_name']} per {entry['unit']}"
+        return {
+            "co2e_kg": round(factor * quantity, 4),
+            "factor_used": round(factor, 6),
+            "source": f"{source} ({entry['basis']})" if entry["basis"] else source,
+        }
+
+    def stats(self) -> dict:
+        datasets: dict[str, int] = defaultdict(int)
+        for units in self._entries.values():
+            for entry in units.values():
+                datasets[entry["dataset"]] += 1
+        return {"datasets": dict(datasets), "names": len(self._names), **self.counters}
+
+reference_factors = ReferenceFactors(settings.REFERENCE_MIN_SIMILARITY)
+
+async def load_reference_factors() -> ReferenceFactors:
+    """
+    Loads the bundled table (unless REFERENCE_FACTORS_BUNDLED is off), then the
+    imported ones from the reference_factor table, which override it.
+    """
+    rows = read_csv(BUNDLED_CSV) if settings.REFERENCE_FACTORS_BUNDLED else []
+    async with open_session() as session:
+        statement = select(ReferenceFactor).order_by(ReferenceFactor.created_at, ReferenceFactor.id)
+        for row in (await session.scalars(statement)).all():
+            rows.append({
+                "dataset": row.dataset, "item_name": row.item_name, "aliases": row.aliases or [],
+                "category": row.category, "unit": row.unit, "factor": row.factor, "basis": row.basis,
+            })
+    reference_factors.load(rows)
+    logger.info("Loaded %d reference emission factor(s)", len(rows))
+    return reference_factors
+
+async def import_reference_factors(path: str, dataset: Optional[str] = None, replace: bool = False) -> int:
+    """
+    Upserts a CSV factor table into reference_factor; with replace, rows of
+    its dataset(s) missing from the file are deleted. Running workers pick
+    the table up when they next start.
+    """
+    rows = read_csv(path, dataset)
+    now = datetime.utcnow()
+    async with open_session() as session:
+        if replace:
+            await session.execute(delete(ReferenceFactor).where(
+                ReferenceFactor.dataset.in_({row["dataset"] for row in rows})))
+        for chunk in chunked(rows, 1000):
+            statement = insert(ReferenceFactor).values([{**row, "created_at": now} for row in chunk])
+            statement = statement.on_conflict_do_update(
+                index_elements=["dataset", "item_name", "unit"],
+                set_={column: statement.excluded[column] for column in ("aliases", "category", "factor", "basis")},
+            )
+            await session.execute(statement)
+        await session.commit()
+    return len(rows)
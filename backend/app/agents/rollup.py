@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import cast, delete, func, select, text, Date
+from sqlalchemy.dialects.postgresql import insert
+from app.agents.deletion import visible
+from app.core.db import open_session
+from app.models import DailyFootprintRollup, FootprintRecord
+
+DEFAULT_CATEGORY = "Other"
+ROLLUP_LOCK_NAMESPACE = 7001  # first key of the per-user pg_advisory_xact_lock
+
+def rollup_rows(records: list[dict]) -> list[dict]:
+    """
+    Aggregates footprint record dicts into (user_id, day, category) rollup rows,
+    sorted by key so concurrent writers lock rollup rows in the same order.
+    """
+    totals: dict[tuple, dict] = {}
+    for record in records:
+        created_at = record.get("created_at") or datetime.utcnow()
+        key = (record["user_id"], created_at.date(), record.get("category") or DEFAULT_CATEGORY)
+        row = totals.setdefault(key, {
+            "user_id": key[0], "day": key[1], "category": key[2], "co2e_kg": 0.0, "record_count": 0,
+        })
+        row["co2e_kg"] += record.get("co2e_kg") or 0.0
+        row["record_count"] += 1
+    return [totals[key] for key in sorted(totals)]
+
+async def lock_rollup_users(session, user_ids):
+    """
+    Takes a transaction-level advisory lock per user (in a fixed order), which
+    serializes a user's rollup rebuild with that user's footprint writes only.
+    Other users' writes go on; a hash collision merely serializes two users.
+    """
+    for user_id in sorted(set(user_ids)):
+        await session.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:user_id))"),
+            {"namespace": ROLLUP_LOCK_NAMESPACE, "user_id": user_id},
+        )
+
+async def apply_rollup(session, records: list[dict]):
+    """Adds the records to the rollup inside the caller's transaction."""
+    rows = rollup_rows(records)
+    if not rows:
+        return
+    await lock_rollup_users(session, [row["user_id"] for row in rows])
+    stmt = insert(DailyFootprintRollup).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "day", "category"],
+        set_={
+            "co2e_kg": DailyFootprintRollup.co2e_kg + stmt.excluded.co2e_kg,
+            "record_count": DailyFootprintRollup.record_count + stmt.excluded.record_count,
+        },
+    )
+    await session.execute(stmt)
+
+async def _rebuild_user(session, user_id: str) -> int:
+    # The user's advisory lock makes that user's footprint writes wait for the
+    # rebuild (and the rebuild for writes in progress), so no insert is counted
+    # twice or missed. A writer whose rows the aggregate does not see yet adds
+    # them through apply_rollup once the rebuild commits.
+    day = cast(func.date_trunc("day", FootprintRecord.created_at), Date)
+    category = func.coalesce(FootprintRecord.category, DEFAULT_CATEGORY)
+    source = select(
+        FootprintRecord.user_id,
+        day,
+        category,
+        func.sum(FootprintRecord.co2e_kg),
+        func.count(),
+    ).where(visible(FootprintRecord), FootprintRecord.user_id == user_id)
+    source = source.group_by(FootprintRecord.user_id, day, category)
+
+    await lock_rollup_users(session, [user_id])
+    await session.execute(delete(DailyFootprintRollup).where(DailyFootprintRollup.user_id == user_id))
+    result = await session.execute(
+        insert(DailyFootprintRollup).from_select(
+            ["user_id", "day", "category", "co2e_kg", "record_count"], source
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+async def backfill_rollup(user_id: Optional[str] = None) -> int:
+    """
+    Rebuilds the rollup from footprint_record (for one user, or everyone).
+    Each user is rebuilt in its own short transaction under a per-user lock,
+    so only that user's footprint writes wait for it. Rows of a pending account
+    deletion are left out.
+    Returns the number of rollup rows written.
+    """
+    async with open_session() as session:
+        if user_id is not None:
+            return await _rebuild_user(session, user_id)
+        # Users with rollup rows but no records left are rebuilt too, which clears them
+        users = select(FootprintRecord.user_id).union(select(DailyFootprintRollup.user_id))
+        user_ids = (await session.scalars(users)).all()
+        await session.commit()
+        count = 0
+        for user in sorted(user_ids):
+            count += await _rebuild_user(session, user)
+        return count
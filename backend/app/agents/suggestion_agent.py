@@ -1,37 +1,89 @@
+import asyncio
 import google.generativeai as genai
+import logging
 from app.core.config import get_settings
-import json
+from app.core.governor import llm_governor
+from app.core.singleflight import SingleFlight, coalesce, make_key
+from app.core.tracing import trace_attributes, traced
+from app.agents.llm import parse_json_response, chunked, numbered_items, index_batch_results, prompt_context
+from app.agents.normalize import normalize_item_name
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 genai.configure(api_key=settings.GOOGLE_API_KEY)
 
+# Concurrent requests for the same item and context share one Gemini call
+suggestion_flights = SingleFlight("suggestion")
+
+def _user_context_text(item_names: list[str], user_context: dict) -> str:
+    return prompt_context(user_context, item_names, settings.SUGGESTION_CONTEXT_TOKENS)
+
+def _suggestion_key(item_name: str, user_context: dict):
+    # Keyed by what the prompt actually contains
+    return make_key(normalize_item_name(item_name), _user_context_text([item_name], user_context))
+
+@traced("suggestion")
+@coalesce(suggestion_flights, _suggestion_key)
 async def suggestion_agent(item_name: str, user_context: dict):
     """
     SuggestionAgent provides eco-friendly alternatives considering user preferences.
     """
-    prefs = user_context.get("preferences", {})
-    goals = user_context.get("goals", [])
-    
     model = genai.GenerativeModel('gemini-flash-latest')
-    
+
     prompt = f"""
     Give 3 short eco-friendly alternatives for the product: {item_name}.
-    User Preferences: {prefs}
-    User Goals: {goals}
-    
+    {_user_context_text([item_name], user_context)}
+
     Return ONLY JSON list of strings.
     Example: {{ "suggestions": ["alt1", "alt2", "alt3"] }}
     """
-    
+
     try:
-        response = await model.generate_content_async(prompt)
-        content = response.text.strip()
-        if content.startswith("```json"):
-            content = content[7:-3]
-        elif content.startswith("```"):
-            content = content[3:-3]
-            
-        return json.loads(content).get("suggestions", [])
+        response = await llm_governor.generate(model, prompt)
+        return parse_json_response(response.text).get("suggestions", [])
     except Exception as e:
-        print(f"Suggestion Error: {e}")
+        logger.error("Suggestion error for %s: %s", item_name, e)
         return []
+
+@traced("suggestion.batch")
+async def batch_suggestion_agent(item_names: list[str], user_context: dict) -> list[list[str]]:
+    """
+    Suggests alternatives for many items with one Gemini call per LLM_BATCH_MAX_SIZE items.
+    Items the batch answer drops or garbles are retried one by one.
+    """
+    results = [None] * len(item_names)
+    trace_attributes(items=len(item_names))
+
+    model = genai.GenerativeModel('gemini-flash-latest')
+
+    async def suggest_chunk(chunk):
+        prompt = f"""
+        Give 3 short eco-friendly alternatives for each of the following products.
+        {_user_context_text([item_names[i] for i in chunk], user_context)}
+
+        Products:
+        {numbered_items([item_names[i] for i in chunk])}
+
+        Return ONLY a JSON array with one object per product, using the product number as "index":
+        [{{ "index": 0, "suggestions": ["alt1", "alt2", "alt3"] }}]
+        """
+
+        try:
+            response = await llm_governor.generate(model, prompt)
+            answers = index_batch_results(parse_json_response(response.text), len(chunk))
+        except Exception as e:
+            logger.error("Batch suggestion error: %s", e)
+            return
+
+        for i, answer in zip(chunk, answers):
+            suggestions = answer.get("suggestions") if answer else None
+            if isinstance(suggestions, list) and all(isinstance(s, str) for s in suggestions):
+                results[i] = suggestions
+
+    await asyncio.gather(*[suggest_chunk(chunk) for chunk in chunked(range(len(item_names)), settings.LLM_BATCH_MAX_SIZE)])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    retried = await asyncio.gather(*[suggestion_agent(item_names[i], user_context) for i in missing])
+    for i, result in zip(missing, retried):
+        results[i] = result
+    return results
@@ -1,54 +1,186 @@
-import requests
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+import httpx
+from sqlalchemy import insert
+from app.core.cache import TTLCache
 from app.core.config import get_settings
-from app.core.db import get_session
-from app.models import FootprintRecord
+from app.core.db import open_session
+from app.core.metrics import search_latency
+from app.core.response_cache import response_cache
+from app.core.singleflight import SingleFlight
+from app.core.user_versions import bump_user_versions
+from app.core.tracing import trace_attributes, traced
+from app.agents.rollup import apply_rollup
+from app.models import FootprintRecord, MemoryLog
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-def google_search_tool(query: str):
+class GoogleCustomSearchBackend:
+    """
+    Google Custom Search JSON API client on a shared keep-alive connection pool.
+    Point SEARCH_API_URL at a local server speaking the same JSON shape to fake it.
+    """
+
+    def __init__(self, base_url: str, api_key: str, cse_id: str, timeout: float = 5.0, max_connections: int = 20):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def search(self, query: str) -> list[str]:
+        params = {"q": query, "key": self.api_key, "cx": self.cse_id}
+        response = await self.client.get(self.base_url, params=params)
+        response.raise_for_status()
+        results = response.json()
+        return [item.get("snippet", "") for item in results.get("items", [])[:5]]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_search_backend = GoogleCustomSearchBackend(
+    base_url=settings.SEARCH_API_URL,
+    api_key=settings.GOOGLE_API_KEY,
+    cse_id=settings.GOOGLE_CSE_ID,
+    timeout=settings.SEARCH_TIMEOUT_SECONDS,
+    max_connections=settings.SEARCH_MAX_CONNECTIONS,
+)
+_search_cache = TTLCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+)
+search_flights = SingleFlight("search")
+
+def set_search_backend(backend):
+    """
+    Swaps the search backend (any object with an async search(query) -> list[str]).
+    Returns the previous backend so tests and benchmarks can restore it.
+    """
+    global _search_backend
+    previous, _search_backend = _search_backend, backend
+    _search_cache.clear()
+    return previous
+
+async def close_search_backend():
+    aclose = getattr(_search_backend, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+def search_cache_stats() -> dict:
+    return _search_cache.stats()
+
+@traced("search")
+async def google_search_tool(query: str):
     """
     Searches Google for the given query and returns the results.
     Useful for finding CO2 emission factors.
-    Uses Google Custom Search JSON API.
-    """
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "q": query,
-        "key": settings.GOOGLE_API_KEY,
-        "cx": settings.GOOGLE_CSE_ID,
-    }
-    
+    Uses Google Custom Search JSON API without blocking the event loop;
+    snippets are cached per query and concurrent identical queries share one call.
+    """
+    key = " ".join(query.lower().split())
+    cached = _search_cache.get(key)
+    trace_attributes(query=key, cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        results = response.json()
-        
-        snippets = []
-        if "items" in results:
-            for item in results["items"][:5]:
-                snippets.append(item.get("snippet", ""))
-                
-        return "\n".join(snippets)
+        return await search_flights.do(key, lambda: _search(key, query))
     except Exception as e:
-        print(f"Search Error: {e}")
+        logger.warning("Search error: %r", e)
         return ""
 
-async def db_writer_tool(user_id: str, item_name: str, quantity: float, unit: str, co2e_kg: float, suggestions: list[str], category: str = "Other", classification_confidence: float = 0.0):
+async def _search(key: str, query: str) -> str:
+    started, outcome = time.perf_counter(), "error"
+    try:
+        snippets = await asyncio.wait_for(_search_backend.search(query), timeout=settings.SEARCH_TIMEOUT_SECONDS)
+        outcome = "ok"
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        search_latency.observe(time.perf_counter() - started, outcome=outcome)
+        trace_attributes(outcome=outcome)
+    result = "\n".join(snippets)
+    _search_cache.set(key, result)
+    return result
+
+async def _insert_rows(session, records: list[dict], memory_logs: list[dict]) -> list[int]:
+    # Multi-row INSERT ... RETURNING id, with ids returned in parameter order
+    ids = []
+    if records:
+        now = datetime.utcnow()
+        records = [{"created_at": now, **record} for record in records]  # rollup and row agree on the day
+        result = await session.scalars(
+            insert(FootprintRecord).returning(FootprintRecord.id, sort_by_parameter_order=True),
+            records,
+        )
+        ids = list(result)
+        await apply_rollup(session, records)
+    if memory_logs:
+        await session.execute(insert(MemoryLog), memory_logs)
+    return ids
+
+async def _invalidate_responses(session, records: list[dict]):
+    # Cached dashboards of these users are out of date once this transaction commits
+    await bump_user_versions(session, [record["user_id"] for record in records], [response_cache.scope])
+
+@traced("db.bulk_write")
+async def bulk_writer_tool(records: list[dict], memory_logs: list[Optional[dict]], before_commit=None) -> list[Optional[int]]:
     """
-    Saves the footprint record to the database.
+    Saves footprint records, their memory logs (aligned by index, None for no log)
+    and the dashboard rollup in a single transaction. If the bulk insert fails,
+    rows are retried one by one inside savepoints so a bad row only drops its own item.
+    before_commit(session, ids) runs inside the same transaction, e.g. to record job
+    progress atomically with the rows; if it raises, nothing is written.
+    Returns record ids aligned with records; None marks a row that was not saved.
     """
-    async for session in get_session():
-        record = FootprintRecord(
-            user_id=user_id,
-            item_name=item_name,
-            quantity=quantity,
-            unit=unit,
-            co2e_kg=co2e_kg,
-            suggestions=suggestions,
-            category=category,
-            classification_confidence=classification_confidence
-        )
-        session.add(record)
+    logs = [log for log in memory_logs if log is not None]
+    trace_attributes(records=len(records), memory_logs=len(logs))
+
+    async with open_session() as session:
+        try:
+            ids = await _insert_rows(session, records, logs)
+        except Exception as e:
+            await session.rollback()
+            trace_attributes(row_by_row=True)
+            logger.warning("Bulk write error, retrying row by row: %s", e)
+        else:
+            await _invalidate_responses(session, records)
+            if before_commit is not None:
+                await before_commit(session, ids)
+            await session.commit()
+            return ids
+
+        ids = []
+        for record, log in zip(records, memory_logs):
+            try:
+                async with session.begin_nested():
+                    row_ids = await _insert_rows(session, [record], [log] if log is not None else [])
+                ids.append(row_ids[0])
+            except Exception as e:
+                logger.error("DB write error for %s: %s", record.get("item_name"), e)
+                ids.append(None)
+        await _invalidate_responses(session, records)
+        if before_commit is not None:
+            await before_commit(session, ids)
         await session.commit()
-        await session.refresh(record)
-        return {"status": "success", "record_id": record.id}
+        return ids
@@ -0,0 +1,139 @@
+"""
+Maintenance commands for the backend.
+
+Usage:
+    python -m app.cli emission-cache invalidate [--item NAME] [--category CAT] [--unit UNIT]
+    python -m app.cli emission-cache purge-expired
+    python -m app.cli classifier rebuild [--min-confidence 0.7]
+    python -m app.cli reference-factors import FILE [--dataset NAME] [--replace]
+    python -m app.cli worker [--workers N]
+    python -m app.cli rollup backfill [--user USER_ID]
+    python -m app.cli db ensure-indexes [--drop-stale]
+"""
+import argparse
+import asyncio
+
+async def _emission_cache(args):
+    from app.agents.emission_cache import invalidate_factors, purge_expired_factors
+
+    if args.action == "invalidate":
+        count = await invalidate_factors(args.item, args.category, args.unit)
+        print(f"Invalidated {count} emission factor(s)")
+    elif args.action == "purge-expired":
+        count = await purge_expired_factors()
+        print(f"Purged {count} expired emission factor(s)")
+
+async def _classifier(args):
+    from app.agents.local_classifier import rebuild_local_classifier
+    from app.core.config import get_settings
+
+    classifier = await rebuild_local_classifier(args.min_confidence)
+    print(f"Learned {classifier.stats['learned']} item classification(s), "
+          f"snapshot written to {get_settings().LOCAL_CLASSIFIER_SNAPSHOT}")
+
+async def _reference_factors(args):
+    from app.agents.reference_factors import import_reference_factors
+    from app.core.db import init_db
+
+    await init_db()  # creates the reference_factor table on first use
+    count = await import_reference_factors(args.file, args.dataset, args.replace)
+    print(f"Imported {count} reference emission factor(s) from {args.file}; restart the workers to use them")
+
+async def _rollup(args):
+    from app.agents.rollup import backfill_rollup
+    from app.core.db import init_db
+
+    await init_db()  # creates the rollup table on first use
+    count = await backfill_rollup(args.user)
+    print(f"Rebuilt {count} daily rollup row(s)")
+
+async def _db(args):
+    from app.core.db import ensure_indexes, init_db
+    import app.models  # noqa: F401 - registers the tables
+
+    await init_db()
+    result = await ensure_indexes(args.drop_stale)
+    created, rebuilt, dropped, unknown = result["created"], result["rebuilt"], result["dropped"], result["unknown"]
+    print(f"Created {len(created)} index(es){': ' + ', '.join(created) if created else ''}")
+    if rebuilt:
+        print(f"Rebuilt {len(rebuilt)} invalid index(es): {', '.join(rebuilt)}")
+    if args.drop_stale:
+        print(f"Dropped {len(dropped)} superseded index(es){': ' + ', '.join(dropped) if dropped else ''}")
+    if unknown:
+        print(f"Left {len(unknown)} index(es) the models do not declare: {', '.join(unknown)}")
+
+async def _worker(args):
+    from app.agents.deletion import deletion_workers
+    from app.agents.jobs import job_workers
+    from app.agents.reference_factors import load_reference_factors
+    from app.core.dag import drain_background_tasks
+    from app.core.db import init_db
+    from app.core.tracing import tracer
+
+    await init_db()
+    await load_reference_factors()
+    tracer.start()
+    job_workers.start(args.workers or job_workers.workers or 1)
+    deletion_workers.start(deletion_workers.workers or 1)
+    print(f"Worker {job_workers.name} processing assessment jobs with {job_workers.stats()['workers']} worker(s), "
+          f"account deletions with {deletion_workers.stats()['workers']}")
+    try:
+        await asyncio.gather(job_workers.wait(), deletion_workers.wait())
+    finally:
+        await job_workers.stop()
+        await deletion_workers.stop()
+        await drain_background_tasks()
+        await tracer.stop()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cache = commands.add_parser("emission-cache", help="Manage the cached emission factors")
+    cache.add_argument("action", choices=["invalidate", "purge-expired"])
+    cache.add_argument("--item", help="Only invalidate this item name")
+    cache.add_argument("--category", help="Only invalidate this category")
+    cache.add_argument("--unit", help="Only invalidate this unit")
+    cache.set_defaults(handler=_emission_cache)
+
+    classifier = commands.add_parser("classifier", help="Manage the local item classifier")
+    classifier.add_argument("action", choices=["rebuild"])
+    classifier.add_argument("--min-confidence", type=float, default=0.7,
+                            help="Ignore past classifications below this confidence")
+    classifier.set_defaults(handler=_classifier)
+
+    reference = commands.add_parser("reference-factors", help="Manage the reference emission factor tables")
+    reference.add_argument("action", choices=["import"])
+    reference.add_argument("file", help="CSV with item, category, unit, factor and optional dataset, aliases, basis")
+    reference.add_argument("--dataset", help="Dataset name for every row (default: the CSV's dataset column)")
+    reference.add_argument("--replace", action="store_true",
+                           help="Delete rows of the dataset that are not in the file")
+    reference.set_defaults(handler=_reference_factors)
+
+    rollup = commands.add_parser("rollup", help="Manage the dashboard's daily rollup table")
+    rollup.add_argument("action", choices=["backfill"])
+    rollup.add_argument("--user", help="Only rebuild this user's rows")
+    rollup.set_defaults(handler=_rollup)
+
+    db = commands.add_parser("db", help="Database schema maintenance")
+    db.add_argument("action", choices=["ensure-indexes"])
+    db.add_argument("--drop-stale", action="store_true",
+                    help="Also drop the single-column indexes the composite ones replaced")
+    db.set_defaults(handler=_db)
+
+    worker = commands.add_parser("worker", help="Process queued assessment jobs and account deletions")
+    worker.add_argument("--workers", type=int, default=None,
+                        help="Concurrent jobs (default: JOB_WORKERS)")
+    worker.set_defaults(handler=_worker)
+
+    return parser
+
+def main(argv=None):
+    from app.core.logs import setup_logging
+
+    args = build_parser().parse_args(argv)
+    setup_logging()
+    asyncio.run(args.handler(args))
+
+if __name__ == "__main__":
+    main()
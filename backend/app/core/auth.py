@@ -1,31 +1,132 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Optional
+import httpx
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from app.core.cache import TTLCache
 from app.core.config import get_settings
 
 security = HTTPBearer()
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+class ClerkKeys:
+    """
+    Clerk's public keys, parsed once into key objects.
+
+    Tokens whose header names a `kid` are checked against the JWKS document
+    (CLERK_JWKS_URL: an https URL or a local file), refreshed every
+    refresh_seconds and whenever an unknown kid shows up, so rotated keys are
+    picked up without a restart. Other tokens use CLERK_PEM_PUBLIC_KEY.
+    `version` changes whenever the keys do.
+    """
+
+    MIN_REFRESH_SECONDS = 30  # unknown kids cannot make us hammer the JWKS endpoint
+
+    def __init__(self, jwks_url: Optional[str], refresh_seconds: float):
+        self.jwks_url = jwks_url
+        self.refresh_seconds = refresh_seconds
+        self.version = 0
+        self._pem: Optional[str] = None
+        self._pem_key: Any = None
+        self._jwks: dict[str, Any] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def use_pem(self, pem: str):
+        if pem != self._pem:
+            self._pem, self._pem_key = pem, None
+            self.version += 1
+
+    def pem_key(self):
+        if self._pem_key is None:
+            if not self._pem:
+                raise jwt.InvalidKeyError("No public key configured")
+            # Env vars often carry the PEM on one line with escaped newlines
+            pem = self._pem.replace("\\n", "\n")
+            self._pem_key = jwt.algorithms.RSAAlgorithm(jwt.algorithms.RSAAlgorithm.SHA256).prepare_key(pem)
+        return self._pem_key
+
+    async def _fetch_jwks(self) -> dict:
+        if self.jwks_url.startswith(("http://", "https://")):
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+                return response.json()
+        path = self.jwks_url.removeprefix("file://")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            now = time.monotonic()
+            if self._fetched_at is not None:
+                age = now - self._fetched_at
+                if age < self.MIN_REFRESH_SECONDS or (not force and age < self.refresh_seconds):
+                    return
+            self._fetched_at = now
+            try:
+                keys = {
+                    key.key_id: key.key
+                    for key in jwt.PyJWKSet.from_dict(await self._fetch_jwks()).keys
+                    if key.key_id
+                }
+            except Exception as e:
+                logger.warning("JWKS refresh error: %s", e)  # keep serving the keys we have
+                return
+            if keys.keys() != self._jwks.keys():
+                self.version += 1
+            self._jwks = keys
+
+    async def key_for(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid")
+        if self.jwks_url and kid is not None:
+            stale = self._fetched_at is None or time.monotonic() - self._fetched_at >= self.refresh_seconds
+            if stale or kid not in self._jwks:
+                await self.refresh(force=kid not in self._jwks)
+            if kid in self._jwks:
+                return self._jwks[kid]
+            if not self._pem:
+                raise jwt.InvalidKeyError(f"Unknown signing key {kid}")
+        return self.pem_key()
+
+    def stats(self) -> dict:
+        return {"jwks_keys": len(self._jwks), "pem": bool(self._pem), "version": self.version}
+
+clerk_keys = ClerkKeys(settings.CLERK_JWKS_URL, settings.CLERK_JWKS_REFRESH_SECONDS)
+
+# sha256(token) -> user_id, expiring with the token: repeat calls skip the RSA verification
+verified_tokens = TTLCache(max_entries=settings.AUTH_TOKEN_CACHE_MAX_ENTRIES,
+                           ttl_seconds=settings.AUTH_TOKEN_CACHE_MAX_SECONDS)
+
+def _cache_ttl(payload: dict) -> float:
+    ttl = verified_tokens.ttl_seconds
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    return ttl
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Verifies the Clerk JWT token and returns the user_id (sub).
     """
     token = credentials.credentials
-    
+
+    clerk_keys.use_pem(settings.CLERK_PEM_PUBLIC_KEY)
+    # Keyed by the key version too: rotated keys never accept a token verified by old ones
+    cache_key = (clerk_keys.version, hashlib.sha256(token.encode()).digest())
+    user_id = verified_tokens.get(cache_key)
+    if user_id is not None:
+        return user_id
+
     try:
-        # Verify the token using Clerk's public key
-        # The key should be formatted as a proper PEM string in the environment variable
-        # e.g., "-----BEGIN PUBLIC KEY-----\n...\n-----END PUBLIC KEY-----"
-        
-        public_key = settings.CLERK_PEM_PUBLIC_KEY
-        
-        # If the key comes in as a single line (common in some env vars), fix the formatting
-        if "-----BEGIN PUBLIC KEY-----" not in public_key:
-             # Basic heuristic to fix formatting if needed, though best to store it correctly
-             pass 
-        
-        payload = jwt.decode(token, key=public_key, algorithms=["RS256"])
-        
+        key = await clerk_keys.key_for(token)
+        payload = jwt.decode(token, key=key, algorithms=["RS256"])
+
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(
@@ -33,8 +134,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        ttl = _cache_ttl(payload)
+        if ttl > 0:
+            verified_tokens.set(cache_key, user_id, ttl)
         return user_id
-        
+
     except jwt.PyJWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,4 +1,5 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 from functools import lru_cache
 
 class Settings(BaseSettings):
@@ -7,7 +8,107 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str
     GOOGLE_CSE_ID: str
 
-    CLERK_PEM_PUBLIC_KEY: str
+    CLERK_PEM_PUBLIC_KEY: str = ""  # tokens without a kid (or when no JWKS is configured)
+    CLERK_JWKS_URL: Optional[str] = None  # https URL or local file of the JWKS document, for rotated keys
+    CLERK_JWKS_REFRESH_SECONDS: float = 3600
+    AUTH_TOKEN_CACHE_MAX_ENTRIES: int = 10000  # verified tokens, by hash; entries expire with the token
+    AUTH_TOKEN_CACHE_MAX_SECONDS: float = 300
+
+    # Emission factor cache (in-process LRU + database table)
+    EMISSION_CACHE_MAX_ENTRIES: int = 5000
+    EMISSION_CACHE_TTL_SECONDS: int = 3600
+    EMISSION_FACTOR_MAX_AGE_DAYS: int = 90
+
+    # Local classifier in front of the Gemini classifier_agent
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE: float = 0.8
+    LOCAL_CLASSIFIER_LEARN_CONFIDENCE: float = 0.7
+    LOCAL_CLASSIFIER_SNAPSHOT: str = "local_classifier.json"
+    LOCAL_CLASSIFIER_MAX_LEARNED: int = 50000  # learned items (and words) kept; least recently learned go first
+
+    # Reference emission factors answered before the cache and Gemini (app/agents/reference_factors.py)
+    REFERENCE_FACTORS_BUNDLED: bool = True  # load app/data/emission_factors.csv besides the imported tables
+    REFERENCE_MIN_SIMILARITY: float = 0.6  # trigram similarity each word of a fuzzy match needs
+
+    # Web search used by calculator_agent
+    SEARCH_API_URL: str = "https://www.googleapis.com/customsearch/v1"
+    SEARCH_TIMEOUT_SECONDS: float = 5.0
+    SEARCH_MAX_CONNECTIONS: int = 20
+    SEARCH_CACHE_MAX_ENTRIES: int = 2000
+    SEARCH_CACHE_TTL_SECONDS: int = 86400
+
+    # Batched Gemini calls for multi-item /api/assess requests
+    LLM_BATCH_MODE: bool = True
+    LLM_BATCH_MAX_SIZE: int = 20
+
+    # Process-wide governor for outbound Gemini calls
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_RATE_LIMIT_PER_MINUTE: float = 600
+    LLM_RATE_LIMIT_BURST: int = 20
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30
+    LLM_CALL_TIMEOUT_SECONDS: float = 30
+
+    # Background assessment jobs (database job table + worker pool)
+    JOB_WORKERS: int = 2  # in-process workers started with the API (0 = use `python -m app.cli worker`)
+    JOB_CHUNK_SIZE: int = 20
+    JOB_LEASE_SECONDS: int = 60
+    JOB_POLL_SECONDS: float = 2.0
+    JOB_MAX_ATTEMPTS: int = 3
+
+    # Per-user cache of dashboard and goal responses
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_TTL_SECONDS: float = 60  # memory only: writes invalidate every worker via user_cache_version
+
+    # Privacy export (streamed, or prepared to a file for later download)
+    EXPORT_CHUNK_SIZE: int = 1000  # rows fetched per server-side cursor round trip
+    EXPORT_DIR: str = "exports"  # must be shared by all workers serving downloads
+    EXPORT_TTL_HOURS: int = 24
+
+    # /api/user/me profile cache and write-behind last_login
+    PROFILE_CACHE_MAX_ENTRIES: int = 10000
+    PROFILE_CACHE_TTL_SECONDS: float = 60  # bounds staleness across worker processes
+    LAST_LOGIN_FLUSH_SECONDS: float = 30  # most a stored last_login lags behind
+
+    # User context for the suggestion prompts
+    USER_CONTEXT_CACHE_MAX_ENTRIES: int = 10000
+    USER_CONTEXT_CACHE_TTL_SECONDS: float = 300  # memory only: goal and preference writes invalidate every worker via user_cache_version
+    SUGGESTION_CONTEXT_TOKENS: int = 80  # budget for goals and preferences in each prompt
+
+    # Daily quote pool (generated ahead, served from memory)
+    QUOTE_POOL_DAYS: int = 7  # days generated ahead
+    QUOTE_POOL_MIN_DAYS: int = 3  # refill in the background below this many days
+    QUOTE_POOL_PER_DAY: int = 3  # quotes per day; each user gets one of them
+    QUOTE_REFILL_RETRY_SECONDS: float = 300  # wait after a failed refill (e.g. Gemini down)
+
+    # Conversation sessions (app/core/memory.py)
+    SESSION_BACKEND: str = "memory"  # memory (per process) or sqlite (shared by the workers of a host)
+    SESSION_SQLITE_PATH: str = "sessions.sqlite3"
+    SESSION_MAX_ENTRIES: int = 10000
+    SESSION_MAX_BYTES: int = 64 * 1024 * 1024  # approximate; least recently used sessions go first
+    SESSION_IDLE_TTL_SECONDS: float = 3600
+    SESSION_HISTORY_SIZE: int = 10  # recent messages kept after the first 2
+
+    # /metrics (Prometheus text format)
+    METRICS_MULTIPROC_DIR: Optional[str] = None  # shared by the gunicorn workers of a host; empty it before each start
+    METRICS_FLUSH_SECONDS: float = 5  # how often each worker writes its metrics there
+
+    # Logging (app/core/logs.py): JSON lines written by a background thread
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped (and counted) rather than block
+    LOG_SAMPLE_RATES: str = ""  # e.g. "envfootprint.agents=0.1,envfootprint.http=0.2"; warnings are always kept
+
+    # Tracing (app/core/tracing.py); off unless an exporter is set
+    TRACE_EXPORTER: str = ""  # jsonl (local file) or otlp (OTLP/HTTP JSON collector)
+    TRACE_JSONL_PATH: str = "traces.jsonl"
+    TRACE_OTLP_URL: str = "http://localhost:4318/v1/traces"
+    TRACE_SAMPLE_RATE: float = 0.01  # share of requests traced; an incoming traceparent decides for itself
+    TRACE_FLUSH_SECONDS: float = 5
+    TRACE_MAX_QUEUED_SPANS: int = 10000  # spans beyond this are dropped until the next export
+
+    # Account deletion (hidden at once, purged in batches by background workers)
+    ACCOUNT_DELETE_WORKERS: int = 1  # in-process workers (0 = use `python -m app.cli worker`)
+    ACCOUNT_DELETE_BATCH_SIZE: int = 2000  # rows per DELETE transaction
+    ACCOUNT_DELETE_PAUSE_SECONDS: float = 0.05  # throttle between batches, lets hot writes through
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+_background_tasks: set = set()
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[..., Awaitable[Any]], deps: Iterable[str] = (), critical: bool = True):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.critical = critical
+
+class DAGRun:
+    def __init__(self, outputs: dict, timings: dict, background: list):
+        self.outputs = outputs
+        self.timings = timings  # stage name -> seconds, filled in as background stages finish
+        self.background = background
+
+    def __getitem__(self, name: str) -> Any:
+        return self.outputs[name]
+
+class AgentDAG:
+    """
+    Small dependency-aware executor for agent pipelines.
+
+    Each stage declares the names it needs (earlier stages or run() inputs) and
+    receives them as keyword arguments. Independent stages run concurrently.
+    run() returns once every critical stage is done; non-critical stages keep
+    running in the background and only log their failures.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: dict[str, Stage] = {}
+
+    def stage(self, name: str, fn: Callable[..., Awaitable[Any]], deps: Iterable[str] = (), critical: bool = True) -> "AgentDAG":
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, fn, deps, critical)
+        return self
+
+    async def run(self, **inputs) -> DAGRun:
+        outputs: dict = dict(inputs)
+        timings: dict = {}
+        futures: dict[str, asyncio.Future] = {}
+
+        for name in inputs:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(inputs[name])
+            futures[name] = future
+
+        async def execute(stage: Stage):
+            try:
+                kwargs = {dep: await futures[dep] for dep in stage.deps}
+            except KeyError as e:
+                raise ValueError(f"Stage {stage.name} depends on unknown {e}") from None
+            start = time.perf_counter()
+            try:
+                result = await stage.fn(**kwargs)
+            finally:
+                timings[stage.name] = round(time.perf_counter() - start, 4)
+            outputs[stage.name] = result
+            return result
+
+        for stage in self.stages.values():
+            futures[stage.name] = asyncio.ensure_future(execute(stage))
+
+        critical = [futures[s.name] for s in self.stages.values() if s.critical]
+        background = [futures[s.name] for s in self.stages.values() if not s.critical]
+
+        for task in background:
+            _background_tasks.add(task)
+            task.add_done_callback(self._finish_background)
+
+        try:
+            await asyncio.gather(*critical)
+        except BaseException:
+            for task in critical + background:
+                task.cancel()
+            raise
+
+        return DAGRun(outputs, timings, background)
+
+    def _finish_background(self, task: asyncio.Future):
+        _background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("%s background stage failed: %s", self.name, task.exception())
+
+def run_in_background(coro, name: str = "background"):
+    """Runs a coroutine off the response path, keeping a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+
+    def finish(task):
+        _background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("%s task failed: %s", name, task.exception())
+
+    task.add_done_callback(finish)
+    return task
+
+async def drain_background_tasks():
+    """Waits for outstanding non-critical stages (used on shutdown and in tests)"""
+    if _background_tasks:
+        await asyncio.gather(*list(_background_tasks), return_exceptions=True)
@@ -1,7 +1,11 @@
+import time
 from sqlmodel import SQLModel
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import get_settings
+from app.core.metrics import db_checkout_wait
 
 settings = get_settings()
 database_url = settings.DATABASE_URL
@@ -11,10 +15,21 @@ if database_url and database_url.startswith("postgres://"):
 if database_url and "?sslmode=" in database_url:
     database_url = database_url.split("?sslmode=")[0]
 
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_checkout_wait.observe(time.perf_counter() - started)
+
 engine = create_async_engine(
     database_url,
     echo=False,
     future=True,
+    poolclass=TimedQueuePool,
     pool_size=20,
     max_overflow=10,
     pool_pre_ping=True,
@@ -25,9 +40,85 @@ async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
+# Single-column user_id indexes replaced by the composite per-user indexes in
+# app/models.py. ensure_indexes(drop_stale=True) drops these and nothing else.
+SUPERSEDED_INDEXES = (
+    "ix_footprint_record_user_id",
+    "ix_memory_log_user_id",
+    "ix_user_goal_user_id",
+    "ix_userpreference_user_id",
+)
+
+def plan_indexes(tables, existing: dict[str, tuple[str, bool]], drop_stale: bool = False) -> dict[str, list]:
+    """
+    Decides what ensure_indexes does, given the database's indexes as
+    {name: (table, valid)}. Returns lists of model Index objects to "create"
+    and to "rebuild" (present but INVALID, e.g. left by an interrupted CREATE
+    INDEX CONCURRENTLY), and of index names to "drop" (superseded, with
+    drop_stale) and to only "report" (other ix_* indexes the models do not
+    declare, e.g. created by hand).
+    """
+    plan = {"create": [], "rebuild": [], "drop": [], "report": []}
+    for table in tables:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                plan["create"].append(index)
+            elif not existing[index.name][1]:
+                plan["rebuild"].append(index)
+
+    declared = {index.name for table in tables for index in table.indexes}
+    model_tables = {table.name for table in tables}
+    for name, (table, _) in sorted(existing.items()):
+        if not name.startswith("ix_") or table not in model_tables or name in declared:
+            continue
+        plan["drop" if drop_stale and name in SUPERSEDED_INDEXES else "report"].append(name)
+    return plan
+
+async def ensure_indexes(drop_stale: bool = False) -> dict[str, list[str]]:
+    """
+    Creates indexes declared in the models that an existing database lacks
+    (create_all only adds indexes together with new tables) and rebuilds the
+    invalid ones. With drop_stale, also drops the SUPERSEDED_INDEXES. Other
+    undeclared ix_* indexes are reported, never dropped. All of it runs
+    CONCURRENTLY so writes keep flowing. Returns the plan_indexes lists as
+    index names.
+    """
+    tables = SQLModel.metadata.sorted_tables
+    async with engine.connect() as conn:
+        rows = await conn.execute(text(
+            "SELECT t.relname, i.relname, x.indisvalid FROM pg_index x"
+            " JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid"
+            " WHERE i.relnamespace = current_schema()::regnamespace"
+        ))
+        plan = plan_indexes(tables, {index: (table, valid) for table, index, valid in rows}, drop_stale)
+        await conn.commit()
+        await conn.execution_options(isolation_level="AUTOCOMMIT")  # CONCURRENTLY cannot run in a transaction
+
+        for index in plan["rebuild"]:
+            await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+        for index in plan["create"] + plan["rebuild"]:
+            index.dialect_options["postgresql"]["concurrently"] = True
+            try:
+                await conn.execute(CreateIndex(index, if_not_exists=True))
+            finally:
+                index.dialect_options["postgresql"]["concurrently"] = False
+        for name in plan["drop"]:
+            await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        return {
+            "created": [index.name for index in plan["create"]],
+            "rebuilt": [index.name for index in plan["rebuild"]],
+            "dropped": plan["drop"],
+            "unknown": plan["report"],
+        }
+
+def open_session() -> AsyncSession:
+    """
+    A session for code outside a route's Depends(get_session). Use it as
+    `async with open_session() as session:`, so the session is closed and its
+    connection back in the pool as soon as the block exits, however it exits.
+    """
+    return AsyncSession(engine, expire_on_commit=False)
+
 async def get_session() -> AsyncSession:
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    async with async_session() as session:
+    async with open_session() as session:
         yield session
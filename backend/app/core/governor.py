@@ -0,0 +1,234 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from google.api_core import exceptions as google_exceptions
+from app.core.config import get_settings
+from app.core.metrics import llm_latency, llm_tokens
+from app.core.tracing import trace_attributes, tracer
+
+settings = get_settings()
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Work started from background jobs sets this to BATCH so interactive requests go first
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+# Errors that mean the upstream is unhealthy (as opposed to a bad prompt)
+UPSTREAM_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+    ConnectionError,
+)
+
+def _count_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        count = getattr(usage, field, None)
+        if isinstance(count, int):
+            llm_tokens.inc(count, kind=kind)
+            trace_attributes(**{f"{kind}_tokens": count})
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open"""
+
+@contextmanager
+def batch_priority():
+    token = llm_priority.set(BATCH)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Takes one token, sleeping until one is available. Returns the time waited."""
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1
+        return waited
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and rejects calls
+    for `reset_seconds`; then lets a single probe through (half-open) to decide
+    whether to close again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                raise CircuitOpenError("Gemini circuit breaker is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError("Gemini circuit breaker is half-open")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        # A probe that ended without an upstream verdict (e.g. a bad prompt)
+        self._probe_in_flight = False
+
+class LLMGovernor:
+    """
+    Process-wide gate for outbound Gemini calls: a concurrency limit handed out
+    by priority, a token bucket sized to the quota and a circuit breaker.
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_minute: float, burst: int,
+                 failure_threshold: int, reset_seconds: float, call_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.call_timeout = call_timeout
+        self.bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._active = 0
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._recent_waits: deque = deque(maxlen=1000)
+        self.counters = {"calls": 0, "succeeded": 0, "failed": 0, "rejected": 0, "rate_limited": 0}
+
+    @property
+    def degraded(self) -> bool:
+        return self.breaker.state != "closed"
+
+    async def _acquire_slot(self, priority: int):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._sequence), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_slot()  # the slot was handed over just as we were cancelled
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release_slot(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # hand the slot straight to the next waiter
+                return
+        self._active -= 1
+
+    async def generate(self, model, prompt, priority: int = None):
+        """
+        Runs model.generate_content_async(prompt) under the governor.
+        Raises CircuitOpenError without calling Gemini while the upstream is unhealthy.
+        """
+        with tracer.span("llm.generate", model=getattr(model, "model_name", type(model).__name__)):
+            return await self._generate(model, prompt, priority)
+
+    async def _generate(self, model, prompt, priority):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.counters["rejected"] += 1
+            raise
+
+        self.counters["calls"] += 1
+        queued_at = time.monotonic()
+        verdict = False
+        outcome = "error"
+        waited = None
+        try:
+            await self._acquire_slot(llm_priority.get() if priority is None else priority)
+            try:
+                if await self.bucket.acquire() > 0:
+                    self.counters["rate_limited"] += 1
+                waited = time.monotonic() - queued_at
+                self._recent_waits.append(waited)
+
+                response = await asyncio.wait_for(model.generate_content_async(prompt), timeout=self.call_timeout)
+                outcome = "ok"
+            except UPSTREAM_ERRORS:
+                outcome = "upstream_error"
+                self.counters["failed"] += 1
+                self.breaker.record_failure()
+                verdict = True
+                raise
+            finally:
+                self._release_slot()
+        finally:
+            if not verdict:
+                self.breaker.release_probe()
+            llm_latency.observe(time.monotonic() - queued_at, outcome=outcome)
+            trace_attributes(outcome=outcome, queued_seconds=round(waited, 4) if waited is not None else None)
+
+        self.counters["succeeded"] += 1
+        _count_tokens(response)
+        self.breaker.record_success()
+        return response
+
+    def stats(self) -> dict:
+        waits = sorted(self._recent_waits)
+        return {
+            "circuit": self.breaker.state,
+            "in_flight": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": len(self._waiters),
+            "wait_seconds_p50": round(waits[len(waits) // 2], 4) if waits else 0.0,
+            "wait_seconds_p95": round(waits[int(len(waits) * 0.95)], 4) if waits else 0.0,
+            "wait_seconds_max": round(waits[-1], 4) if waits else 0.0,
+            **self.counters,
+        }
+
+llm_governor = LLMGovernor(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    rate_per_minute=settings.LLM_RATE_LIMIT_PER_MINUTE,
+    burst=settings.LLM_RATE_LIMIT_BURST,
+    failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS,
+    call_timeout=settings.LLM_CALL_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+from sqlalchemy import and_, or_, select, update
+from app.core.db import open_session
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(Exception):
+    """Another worker reclaimed the row after our lease expired"""
+
+class LeaseTable:
+    """
+    Work queue on a table with status, lease_owner, lease_expires_at, attempts,
+    created_at, updated_at and finished_at columns. A worker leases a "queued"
+    row (or a "running" one whose lease expired, i.e. its worker died), renews
+    the lease while working, and every write is fenced by lease_owner.
+    """
+
+    def __init__(self, model, lease_seconds: float):
+        self.model = model
+        self.lease_seconds = lease_seconds
+
+    def expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def claim(self, worker_id: str):
+        """
+        Leases the oldest claimable row. SKIP LOCKED lets any number of workers
+        poll the table concurrently.
+        """
+        model, now = self.model, datetime.utcnow()
+        candidate = (
+            select(model.id)
+            .where(or_(
+                model.status == "queued",
+                and_(model.status == "running", model.lease_expires_at < now),
+            ))
+            .order_by(model.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        statement = (
+            update(model)
+            .where(model.id == candidate)
+            .values(
+                status="running",
+                lease_owner=worker_id,
+                lease_expires_at=self.expiry(),
+                attempts=model.attempts + 1,
+                updated_at=now,
+            )
+            .returning(model)
+            .execution_options(synchronize_session=False)
+        )
+        async with open_session() as session:
+            row = (await session.scalars(statement)).first()
+            await session.commit()
+            return row
+
+    async def update(self, session, row_id, worker_id: str, **values):
+        # Fenced by lease_owner: a worker that lost its lease can no longer write
+        result = await session.execute(
+            update(self.model)
+            .where(self.model.id == row_id, self.model.lease_owner == worker_id)
+            .values(updated_at=datetime.utcnow(), **values)
+        )
+        if result.rowcount == 0:
+            raise LeaseLost(row_id)
+
+    async def finish(self, row_id, worker_id: str, status: str, **values):
+        async with open_session() as session:
+            await self.update(session, row_id, worker_id, status=status, lease_owner=None,
+                              lease_expires_at=None, finished_at=datetime.utcnow(), **values)
+            await session.commit()
+
+    async def release(self, row_id, worker_id: str):
+        # Graceful shutdown: hand the row back so the next worker resumes it immediately
+        async with open_session() as session:
+            await self.update(session, row_id, worker_id, status="queued", lease_owner=None, lease_expires_at=None,
+                              attempts=self.model.attempts - 1)  # not a failed attempt
+            await session.commit()
+
+    async def heartbeat(self, row_id, worker_id: str):
+        """Renews the lease until cancelled (run it as a task next to the work)"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with open_session() as session:
+                    await self.update(session, row_id, worker_id, lease_expires_at=self.expiry())
+                    await session.commit()
+            except LeaseLost:
+                return
+            except Exception as e:
+                logger.warning("Lease heartbeat error for %s %s: %s", self.model.__tablename__, row_id, e)
+
+class LeasedWorkerPool:
+    """
+    Bounded pool of worker loops: each claims a row with claim(worker_id) and
+    processes it with run(row, worker_id), which returns an outcome name that
+    is counted in stats(). Idle workers poll every poll_seconds, or sooner
+    when notify() is called.
+    """
+
+    def __init__(self, kind: str, workers: int, poll_seconds: float,
+                 claim: Callable[[str], Awaitable[Any]], run: Callable[[Any, str], Awaitable[str]],
+                 outcomes: tuple[str, ...] = ()):
+        self.kind = kind
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.claim = claim
+        self.run = run
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.busy = 0
+        self.counters = {"claimed": 0, **{outcome: 0 for outcome in outcomes}}
+
+    def start(self, workers: Optional[int] = None):
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.ensure_future(self._work(f"{self.name}/{self.kind}/{n}"))
+            for n in range(workers if workers is not None else self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def wait(self):
+        await asyncio.gather(*self._tasks)
+
+    def notify(self):
+        """Wakes idle workers of this process (new work enqueued)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _work(self, worker_id: str):
+        while True:
+            try:
+                row = await self.claim(worker_id)
+            except Exception as e:
+                logger.error("%s claim error: %s", self.kind, e)
+                row = None
+            if row is None:
+                await self._idle()
+                continue
+
+            self.counters["claimed"] += 1
+            self.busy += 1
+            try:
+                outcome = await self.run(row, worker_id)
+            finally:
+                self.busy -= 1
+            self.counters[outcome] = self.counters.get(outcome, 0) + 1
+
+    def stats(self) -> dict:
+        return {"workers": len(self._tasks), "busy": self.busy, **self.counters}
@@ -0,0 +1,160 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from app.core.config import get_settings
+from app.core.tracing import current_span
+
+settings = get_settings()
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, message, trace_id when the
+    record was logged inside a trace, the `fields` passed as extra, and the
+    traceback if any. Runs on the listener thread, on records whose message
+    and traceback AsyncQueueHandler already rendered.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def _snapshot(value):
+    # Copies dicts, lists, tuples and sets all the way down; their items are
+    # kept as they are, for JSONFormatter to encode on the listener thread
+    if isinstance(value, dict):
+        return {key: _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_snapshot(item) for item in value]
+    return value
+
+def parse_sample_rates(value: str) -> dict[str, float]:
+    """"envfootprint.agents=0.1,app.agents.tools=0.5" -> {logger name: rate}"""
+    rates = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on a bounded queue for a QueueListener thread to encode and
+    write, so logging never blocks the event loop on I/O. When the queue is
+    full the record is dropped and counted. Records below WARNING from a
+    logger (or its parents) listed in sample_rates are kept at that rate.
+    """
+
+    def __init__(self, maxsize: int, sample_rates: Optional[dict[str, float]] = None):
+        super().__init__(queue.Queue(maxsize))
+        self.sample_rates = sample_rates or {}
+        self._rates: dict[str, float] = {}  # logger name -> resolved rate
+        self.counters = {"enqueued": 0, "dropped": 0, "sampled_out": 0}
+
+    def _rate(self, name: str) -> float:
+        rate = self._rates.get(name)
+        if rate is None:
+            prefix = name
+            while prefix and prefix not in self.sample_rates:
+                prefix = prefix.rpartition(".")[0]
+            rate = self._rates[name] = self.sample_rates.get(prefix, 1.0)
+        return rate
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno < logging.WARNING and self.sample_rates:
+            rate = self._rate(record.name)
+            if rate < 1.0 and random.random() >= rate:
+                self.counters["sampled_out"] += 1
+                return
+        super().emit(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments and fields may be live objects that the caller keeps
+        # mutating (e.g. a run's timings), so this thread merges %-style args
+        # into the message (like the stdlib QueueHandler), renders the traceback
+        # and copies the containers of `fields`. The JSON encoding is left to
+        # the listener thread.
+        span = current_span()
+        record = copy.copy(record)
+        record.trace_id = span.trace_id if span is not None else None
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = _snapshot(fields)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.counters["dropped"] += 1
+            return
+        self.counters["enqueued"] += 1
+
+    def stats(self) -> dict:
+        return {"queued": self.queue.qsize(), "max_queued": self.queue.maxsize, **self.counters}
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel, timeout=5)  # waits for room when the queue is full
+
+_handler: Optional[AsyncQueueHandler] = None
+_listener: Optional[_Listener] = None
+
+def setup_logging(stream=None) -> AsyncQueueHandler:
+    """
+    Routes every logger through the queue to a JSON writer thread (idempotent).
+    Called once per process by app.main and the CLI.
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter())
+    _handler = AsyncQueueHandler(settings.LOG_QUEUE_SIZE, parse_sample_rates(settings.LOG_SAMPLE_RATES))
+    _listener = _Listener(_handler.queue, output)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    atexit.register(shutdown_logging)
+    return _handler
+
+def shutdown_logging():
+    """Writes the records still queued and stops the writer thread"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _handler = _listener = None
+
+def log_stats() -> dict:
+    return _handler.stats() if _handler is not None else {"queued": 0, "max_queued": 0, "enqueued": 0,
+                                                           "dropped": 0, "sampled_out": 0}
@@ -1,47 +1,316 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Iterator, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
 import json
+import sqlite3
+import threading
+import time
+from app.core.config import get_settings
+
+settings = get_settings()
+
+_MESSAGE_OVERHEAD = 200  # approximate bytes of the dict and str objects around a message
+_COMPACTED_NOTE = {"role": "system", "content": "[Previous context compacted]"}
+
+def _message_bytes(message: Dict[str, Any]) -> int:
+    return _MESSAGE_OVERHEAD + len(message["content"]) + len(message["role"])
+
+def _data_bytes(data: Dict[str, Any]) -> int:
+    return len(json.dumps(data, default=str))
+
+class Session:
+    """
+    One user's session. History keeps the first messages plus a fixed-capacity
+    ring buffer of the most recent ones, so appending never copies the history.
+    `data` holds the context, preferences and any other session keys.
+    """
+
+    HEAD = 2
+
+    def __init__(self, history_size: int, head=(), recent=(), dropped: int = 0, data: Optional[Dict[str, Any]] = None):
+        self.head: List[Dict[str, Any]] = list(head)
+        self.recent: deque = deque(recent, maxlen=history_size)
+        self.dropped = dropped
+        self.data: Dict[str, Any] = data if data is not None else {"context": {}, "preferences": {}}
+        self.nbytes = sum(_message_bytes(m) for m in (*self.head, *self.recent)) + _data_bytes(self.data)
+
+    def append(self, message: Dict[str, Any]):
+        if len(self.head) < self.HEAD:
+            self.head.append(message)
+        else:
+            if len(self.recent) == self.recent.maxlen:
+                self.dropped += 1
+                self.nbytes -= _message_bytes(self.recent[0])
+            self.recent.append(message)
+        self.nbytes += _message_bytes(message)
+
+    def replace_history(self, history: List[Dict[str, Any]]):
+        self.nbytes -= sum(_message_bytes(m) for m in (*self.head, *self.recent))
+        self.head, self.dropped = [], 0
+        self.recent.clear()
+        for message in history:
+            self.append(message)
+
+    def update(self, data: Dict[str, Any]):
+        data = dict(data)
+        if "history" in data:
+            self.replace_history(data.pop("history"))
+        self.nbytes -= _data_bytes(self.data)
+        self.data.update(data)
+        self.nbytes += _data_bytes(self.data)
+
+    @property
+    def history(self) -> List[Dict[str, Any]]:
+        return self.head + ([_COMPACTED_NOTE] if self.dropped else []) + list(self.recent)
+
+    def view(self) -> Dict[str, Any]:
+        return {"history": self.history, **self.data}
+
+    def dumps(self) -> str:
+        return json.dumps({"head": self.head, "recent": list(self.recent), "dropped": self.dropped, "data": self.data},
+                          default=str)
+
+    @classmethod
+    def loads(cls, history_size: int, raw: str) -> "Session":
+        state = json.loads(raw)
+        return cls(history_size, state["head"], state["recent"], state["dropped"], state["data"])
+
+class MemorySessionStore:
+    """
+    Sessions in this process, bounded by entry count and an approximate byte
+    budget (least recently used go first) and expired after idle_ttl seconds.
+    """
+
+    backend = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int, max_bytes: int, idle_ttl: float, history_size: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.history_size = history_size
+        self._sessions: "OrderedDict[str, tuple[Session, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"evicted_lru": 0, "evicted_bytes": 0, "expired": 0}
+
+    def _pop(self, user_id: str, counter: Optional[str] = None):
+        session, _ = self._sessions.pop(user_id)
+        self._bytes -= session.nbytes
+        if counter:
+            self.counters[counter] += 1
+
+    def _evict(self, now: float):
+        while self._sessions:
+            user_id, (_, accessed_at) = next(iter(self._sessions.items()))
+            if now - accessed_at < self.idle_ttl:
+                break
+            self._pop(user_id, "expired")
+        while len(self._sessions) > self.max_entries:
+            self._pop(next(iter(self._sessions)), "evicted_lru")
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._pop(next(iter(self._sessions)), "evicted_bytes")
+
+    def read(self, user_id: str) -> Optional[Session]:
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None or time.monotonic() - entry[1] >= self.idle_ttl:
+                return None
+            return entry[0]
+
+    @contextmanager
+    def edit(self, user_id: str) -> Iterator[Session]:
+        with self._lock:
+            now = time.monotonic()
+            entry = self._sessions.get(user_id)
+            if entry is None or now - entry[1] >= self.idle_ttl:
+                if entry is not None:
+                    self._pop(user_id, "expired")
+                session = Session(self.history_size)
+                self._bytes += session.nbytes
+            else:
+                session = entry[0]
+            before = session.nbytes
+            try:
+                yield session
+            finally:
+                self._bytes += session.nbytes - before
+                self._sessions[user_id] = (session, now)
+                self._sessions.move_to_end(user_id)
+                self._evict(now)
+
+    def delete(self, user_id: str):
+        with self._lock:
+            if user_id in self._sessions:
+                self._pop(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "entries": len(self._sessions), "bytes": self._bytes,
+                "max_bytes": self.max_bytes, **self.counters}
+
+class SQLiteSessionStore:
+    """
+    Sessions in a local SQLite file (WAL mode), shared by every worker process
+    on the host. Same limits as the memory store, enforced every
+    EVICT_EVERY writes; idle sessions are invisible as soon as they expire.
+    Calls block (up to 5 s on another process's write lock): async code
+    goes through InMemorySessionService, which runs them on its own thread.
+    """
+
+    backend = "sqlite"
+    blocking = True
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int, idle_ttl: float, history_size: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.history_size = history_size
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"evicted_lru": 0, "evicted_bytes": 0, "expired": 0}
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, nbytes INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_accessed_at ON sessions (accessed_at)")
+
+    def _load(self, user_id: str, now: float) -> Optional[Session]:
+        row = self._conn.execute(
+            "SELECT data FROM sessions WHERE user_id = ? AND accessed_at > ?", (user_id, now - self.idle_ttl)
+        ).fetchone()
+        return Session.loads(self.history_size, row[0]) if row else None
+
+    def _evict(self, now: float):
+        expired = self._conn.execute("DELETE FROM sessions WHERE accessed_at <= ?", (now - self.idle_ttl,))
+        self.counters["expired"] += expired.rowcount
+        lru = self._conn.execute(
+            "DELETE FROM sessions WHERE user_id IN "
+            "(SELECT user_id FROM sessions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+        self.counters["evicted_lru"] += lru.rowcount
+        over_budget = self._conn.execute(
+            "DELETE FROM sessions WHERE user_id IN (SELECT user_id FROM "
+            "(SELECT user_id, SUM(nbytes) OVER (ORDER BY accessed_at DESC) AS running FROM sessions) "
+            "WHERE running > ?)", (self.max_bytes,)
+        )
+        self.counters["evicted_bytes"] += over_budget.rowcount
+
+    def read(self, user_id: str) -> Optional[Session]:
+        with self._lock:
+            return self._load(user_id, time.time())
+
+    @contextmanager
+    def edit(self, user_id: str) -> Iterator[Session]:
+        with self._lock:
+            now = time.time()
+            self._conn.execute("BEGIN IMMEDIATE")  # serializes read-modify-write across processes
+            try:
+                session = self._load(user_id, now) or Session(self.history_size)
+                yield session
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (user_id, data, nbytes, accessed_at) VALUES (?, ?, ?, ?)",
+                    (user_id, session.dumps(), session.nbytes, now),
+                )
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0:
+                    self._evict(now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, nbytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM sessions").fetchone()
+        return {"backend": self.backend, "entries": entries, "bytes": nbytes, "max_bytes": self.max_bytes,
+                **self.counters}
+
+def build_session_store():
+    limits = dict(
+        max_entries=settings.SESSION_MAX_ENTRIES,
+        max_bytes=settings.SESSION_MAX_BYTES,
+        idle_ttl=settings.SESSION_IDLE_TTL_SECONDS,
+        history_size=settings.SESSION_HISTORY_SIZE,
+    )
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(settings.SESSION_SQLITE_PATH, **limits)
+    if settings.SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND {settings.SESSION_BACKEND!r} (memory, sqlite)")
+    return MemorySessionStore(**limits)
+
+session_store = build_session_store()
 
 class InMemorySessionService:
-    _sessions: Dict[str, Dict[str, Any]] = {}
+    """
+    Per-user conversation sessions, kept in session_store (SESSION_BACKEND).
+    Calls to a blocking store (sqlite) run on a dedicated thread, never on
+    the event loop.
+    """
+
+    store = session_store
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-store")
+
+    @classmethod
+    async def _call(cls, fn: Callable[[], Any]) -> Any:
+        if not cls.store.blocking:
+            return fn()
+        return await asyncio.get_running_loop().run_in_executor(cls._executor, fn)
 
     @classmethod
-    def get_session(cls, user_id: str) -> Dict[str, Any]:
-        if user_id not in cls._sessions:
-            cls._sessions[user_id] = {
-                "history": [],
-                "context": {},
-                "preferences": {}
-            }
-        return cls._sessions[user_id]
+    async def get_session(cls, user_id: str) -> Dict[str, Any]:
+        """The user's history and session data (empty if none); read-only"""
+        def read():
+            session = cls.store.read(user_id)
+            return (session or Session(cls.store.history_size)).view()
+        return await cls._call(read)
 
     @classmethod
-    def update_session(cls, user_id: str, data: Dict[str, Any]):
-        session = cls.get_session(user_id)
-        session.update(data)
-        cls._sessions[user_id] = session
+    async def update_session(cls, user_id: str, data: Dict[str, Any]):
+        def update():
+            with cls.store.edit(user_id) as session:
+                session.update(data)
+        await cls._call(update)
 
     @classmethod
-    def add_history(cls, user_id: str, message: str, role: str):
-        session = cls.get_session(user_id)
-        session["history"].append({"role": role, "content": message})
-        # Trigger compaction if history gets too long
-        if len(session["history"]) > 20:
-            cls.compact_context(user_id)
+    async def add_history(cls, user_id: str, message: str, role: str):
+        def append():
+            with cls.store.edit(user_id) as session:
+                session.append({"role": role, "content": message})
+        await cls._call(append)
 
     @classmethod
     def compact_context(cls, user_id: str):
         """
-        Simple context compaction: Keep first 2 and last 10 messages.
+        Context compaction: the first 2 messages, a compaction note and the
+        last SESSION_HISTORY_SIZE messages. The ring buffer keeps history in
+        this shape on every append, so there is nothing left to do here.
         In a real system, this would use an LLM to summarize.
         """
-        session = cls.get_session(user_id)
-        history = session["history"]
-        if len(history) > 12:
-            summary_note = {"role": "system", "content": "[Previous context compacted]"}
-            new_history = history[:2] + [summary_note] + history[-10:]
-            session["history"] = new_history
 
     @classmethod
-    def clear_session(cls, user_id: str):
-        if user_id in cls._sessions:
-            del cls._sessions[user_id]
+    async def clear_session(cls, user_id: str):
+        await cls._call(lambda: cls.store.delete(user_id))
+
+    @classmethod
+    async def stats(cls) -> Dict[str, Any]:
+        return await cls._call(cls.store.stats)
@@ -0,0 +1,257 @@
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+from typing import Callable, Optional
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DEAD_FILE = "metrics_dead.json"  # counters and histograms of workers that exited
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[tuple(str(labels[name]) for name in self.labelnames)] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self.values: dict[tuple, list] = {}  # labels -> per-bucket counts + [sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        entry[-2] += value
+        entry[-1] += 1
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text format.
+
+    With a multiproc_dir (one directory shared by all gunicorn workers of a
+    host), every process writes its snapshot to metrics_<pid>.json and a scrape
+    of any worker merges them: counters and histograms are summed over all
+    processes that ever wrote (so totals never go backwards when a worker is
+    recycled), gauges only over live ones. The first scrape that finds a dead
+    worker's file folds its counters and histograms into metrics_dead.json
+    and deletes it, like prometheus_client's mark_process_dead, so recycling
+    workers does not grow the directory.
+    """
+
+    def __init__(self, multiproc_dir: Optional[str] = None):
+        self.multiproc_dir = multiproc_dir
+        self._metrics: dict[str, object] = {}
+        self._callbacks: dict[str, tuple[str, Callable[[], float]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], float]):
+        """A gauge read at scrape time, e.g. the DB pool's checked-out connections"""
+        self._callbacks[name] = (help, fn)
+
+    def snapshot(self) -> dict:
+        metrics = {
+            name: {"kind": metric.kind, "help": metric.help, "labelnames": list(metric.labelnames),
+                   "buckets": list(getattr(metric, "buckets", ())),
+                   "values": [[list(key), value] for key, value in metric.values.items()]}
+            for name, metric in self._metrics.items()
+        }
+        for name, (help, fn) in self._callbacks.items():
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            metrics[name] = {"kind": "gauge", "help": help, "labelnames": [], "buckets": [], "values": [[[], value]]}
+        return {"pid": os.getpid(), "metrics": metrics}
+
+    # --- Multi-process ------------------------------------------------------
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self):
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)  # readers never see a partial file
+
+    def _snapshots(self) -> list[dict]:
+        snapshots = [self.snapshot()]
+        if not self.multiproc_dir:
+            return snapshots
+        dead_path, dead = os.path.join(self.multiproc_dir, DEAD_FILE), []
+        for path in glob.glob(os.path.join(self.multiproc_dir, "metrics_*.json")):
+            snapshot = _read(path) if path != dead_path else None
+            if snapshot is None or snapshot["pid"] == os.getpid():
+                continue
+            if _alive(snapshot["pid"]):
+                snapshots.append(snapshot)
+            else:
+                dead.append(path)
+        if dead:
+            self._fold_dead(dead)
+        snapshot = _read(dead_path)
+        if snapshot is not None:
+            snapshots.append({**snapshot, "alive": False})
+        return snapshots
+
+    def _fold_dead(self, paths: list[str]):
+        # Under a lock, as the workers of a host may be scraped at the same time:
+        # a file another scrape already folded is gone by the time we read it
+        with open(os.path.join(self.multiproc_dir, DEAD_FILE + ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead_path = os.path.join(self.multiproc_dir, DEAD_FILE)
+            merged: dict[str, dict] = {}
+            _merge(merged, {**(_read(dead_path) or {"metrics": {}}), "alive": False})
+            folded = []
+            for path in paths:
+                snapshot = _read(path)
+                if snapshot is not None:
+                    _merge(merged, {**snapshot, "alive": False})
+                    folded.append(path)
+            if not folded:
+                return
+            metrics = {name: {**metric, "values": [[list(key), value] for key, value in metric["values"].items()]}
+                       for name, metric in merged.items()}
+            with open(dead_path + ".tmp", "w") as f:
+                json.dump({"pid": None, "metrics": metrics}, f)
+            os.replace(dead_path + ".tmp", dead_path)
+            for path in folded:
+                os.remove(path)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self.write_snapshot)
+            except Exception as e:
+                logger.error("Metrics flush error: %s", e)
+
+    def start(self):
+        if self.multiproc_dir:
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.write_snapshot()
+
+    # --- Exposition ---------------------------------------------------------
+
+    def render(self) -> str:
+        merged: dict[str, dict] = {}
+        for snapshot in self._snapshots():
+            _merge(merged, snapshot)
+
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for key, value in sorted(metric["values"].items()):
+                labels = dict(zip(metric["labelnames"], key))
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric["buckets"], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': repr(float(bound))})} {cumulative}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {value[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+def _merge(merged: dict[str, dict], snapshot: dict):
+    # Sums a snapshot into merged (name -> metric with values keyed by label tuple)
+    for name, metric in snapshot["metrics"].items():
+        if metric["kind"] == "gauge" and not snapshot.get("alive", True):
+            continue
+        target = merged.setdefault(name, {**metric, "values": {}})
+        for key, value in metric["values"]:
+            key = tuple(key)
+            if metric["kind"] == "histogram":
+                current = target["values"].get(key)
+                target["values"][key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                target["values"][key] = target["values"].get(key, 0) + value
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+metrics = MetricsRegistry(settings.METRICS_MULTIPROC_DIR)
+
+http_requests = metrics.counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+http_latency = metrics.histogram("http_request_duration_seconds", "HTTP request latency until the response ends", ("method", "route"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being served")
+db_checkout_wait = metrics.histogram("db_pool_checkout_seconds", "Time spent waiting for a pooled database connection")
+llm_latency = metrics.histogram("llm_request_duration_seconds", "Gemini call latency including queueing", ("outcome",))
+llm_tokens = metrics.counter("llm_tokens_total", "Gemini tokens reported by usage metadata", ("kind",))
+search_latency = metrics.histogram("search_request_duration_seconds", "Web search latency", ("outcome",))
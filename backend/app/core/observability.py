@@ -1,29 +1,70 @@
 import time
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-
-# Setup basic logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("envfootprint")
-
-class ObservabilityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        logger.info(
-            f"Path: {request.url.path} | Method: {request.method} | "
-            f"Status: {response.status_code} | Latency: {process_time:.4f}s"
-        )
-        
-        # Add custom header for debugging
-        response.headers["X-Process-Time"] = str(process_time)
-        return response
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.metrics import http_in_flight, http_latency, http_requests
+from app.core.tracing import parse_traceparent, tracer
+
+# Written as JSON by the queue listener of app.core.logs; LOG_SAMPLE_RATES can thin these out
+logger = logging.getLogger("envfootprint.http")
+agent_logger = logging.getLogger("envfootprint.agents")
+
+class ObservabilityMiddleware:
+    """
+    Pure ASGI middleware: per-route latency histograms, status counters and an
+    in-flight gauge, a log line and the X-Process-Time header, without the task
+    and stream wrapping of BaseHTTPMiddleware. Requests are labelled with the
+    matched route template (/api/assess/jobs/{job_id}), never the raw path.
+    Each request is the root span of a trace (continuing an incoming W3C
+    traceparent) and its id is returned in X-Trace-Id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        status_code = 500
+        headers = dict(scope["headers"])
+        trace_id, parent_id, sampled = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        with tracer.trace("http.request", trace_id, parent_id, sampled, method=scope["method"]) as span:
+            async def send_wrapper(message: Message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-Process-Time", str(time.perf_counter() - start_time))
+                    headers.append("X-Trace-Id", span.trace_id)
+                await send(message)
+
+            http_in_flight.inc()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                http_in_flight.dec()
+                process_time = time.perf_counter() - start_time
+                # The router stores the matched route in the (shared) scope
+                route = scope.get("route")
+                template = getattr(route, "path", None) or "unmatched"
+                span.set(route=template, status=status_code)
+                http_requests.inc(method=scope["method"], route=template, status=status_code)
+                http_latency.observe(process_time, method=scope["method"], route=template)
+                logger.info(
+                    "%s %s %s %.4fs", scope["method"], scope["path"], status_code, process_time,
+                    extra={"fields": {"method": scope["method"], "path": scope["path"], "route": template,
+                                      "status": status_code, "latency_s": round(process_time, 6)}},
+                )
 
 def log_agent_action(agent_name: str, action: str, details: dict):
     """
-    Log specific agent actions for traceability.
+    Log specific agent actions for traceability. The record carries the id of
+    the current trace (if any) to find the request's spans; details are only
+    formatted by the log writer thread.
     """
-    logger.info(f"Agent: {agent_name} | Action: {action} | Details: {details}")
+    agent_logger.info("Agent: %s | Action: %s | Details: %s", agent_name, action, details,
+                      extra={"fields": {"agent": agent_name, "action": action, "details": details}})
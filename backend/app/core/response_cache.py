@@ -0,0 +1,47 @@
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Hashable
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import get_settings
+from app.core.user_versions import UserVersionedCache
+
+settings = get_settings()
+
+# Rendered JSON body and ETag per (user, version, key)
+response_cache = UserVersionedCache("responses", settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+def _render(content: Any) -> bytes:
+    # Same bytes as FastAPI's JSONResponse
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+async def cached_response(request: Request, session: AsyncSession, user_id: str, key: Hashable,
+                          compute: Callable[[], Awaitable[Any]]) -> Response:
+    """
+    Serves compute()'s JSON from the user's response cache, with an ETag.
+    A matching If-None-Match gets an empty 304; while the entry is cached the
+    only database access is the read of the user's version, in the request's
+    own session.
+    """
+    version = await response_cache.version(user_id, session)
+    entry = response_cache.get(user_id, version, key)
+    if entry is None:
+        body = _render(await compute())
+        entry = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+        response_cache.set(user_id, version, key, entry)
+
+    body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Hashable
+from app.core.tracing import trace_attributes
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one shared upstream call.
+
+    The first caller starts the work as a task; later callers with the same key
+    await that task instead of issuing their own. Every caller gets the same
+    result or exception. A caller that is cancelled only stops waiting; the
+    shared call is cancelled once no caller is waiting for it any more.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: dict[Hashable, list] = {}  # key -> [task, waiter count]
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(fn())
+            call = [task, 0]
+            self._calls[key] = call
+            task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        else:
+            self.stats["coalesced"] += 1
+            trace_attributes(coalesced=True)  # the span of the leading call has the details
+
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        except asyncio.CancelledError:
+            if call[1] == 1 and not call[0].done():
+                # Last interested caller left: stop the upstream call
+                call[0].cancel()
+                self._forget(key, call)
+            raise
+        finally:
+            call[1] -= 1
+
+    def _forget(self, key: Hashable, call: list):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+def make_key(*parts) -> str:
+    """Stable key for arbitrary JSON-able arguments (dicts are key-sorted)"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def coalesce(group: SingleFlight, key_fn: Callable[..., Hashable]):
+    """
+    Decorator: concurrent calls whose key_fn(*args, **kwargs) match share one call.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await group.do(key_fn(*args, **kwargs), lambda: fn(*args, **kwargs))
+        wrapper.singleflight = group
+        return wrapper
+    return decorator
@@ -0,0 +1,279 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+import httpx
+from app.core.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+class Span:
+    """
+    One timed operation. Children started while a span is current (in the same
+    task or in tasks created from it) share its trace id and record it as parent.
+    """
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        self.end_ns = time.time_ns()
+        self.tracer.finished(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, "name": self.name,
+            "start_ns": self.start_ns, "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status, "error": self.error, "attributes": self.attributes,
+        }
+
+class NonRecordingSpan:
+    """Stands in for a trace that was not sampled: keeps the id, records nothing"""
+
+    recording = False
+    span_id = None
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+
+    def set(self, **attributes):
+        pass
+
+class JSONLExporter:
+    """Appends one JSON object per span to a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: list[dict]):
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(span, default=str) + "\n" for span in spans)
+
+class OTLPExporter:
+    """
+    Posts spans as OTLP/HTTP JSON (ExportTraceServiceRequest) to a collector,
+    e.g. http://localhost:4318/v1/traces.
+    """
+
+    def __init__(self, url: str, service_name: str = "mygreenscore", timeout: float = 5.0):
+        self.url = url
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def payload(self, spans: list[dict]) -> dict:
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "app.core.tracing"}, "spans": [
+                {
+                    "traceId": span["trace_id"], "spanId": span["span_id"], "parentSpanId": span["parent_id"] or "",
+                    "name": span["name"], "kind": 1,
+                    "startTimeUnixNano": str(span["start_ns"]), "endTimeUnixNano": str(span["end_ns"]),
+                    "attributes": [_otlp_attribute(k, v) for k, v in span["attributes"].items()],
+                    "status": {"code": 2, "message": span["error"] or ""} if span["status"] == "error" else {"code": 1},
+                }
+                for span in spans
+            ]}],
+        }]}
+
+    def export(self, spans: list[dict]):
+        httpx.post(self.url, json=self.payload(spans), timeout=self.timeout).raise_for_status()
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+class Tracer:
+    """
+    Head-sampled tracing: the root span of a trace (an HTTP request, a job)
+    decides with sample_rate whether the whole trace is recorded. Unsampled
+    traces only carry their id, so tracing costs next to nothing for them.
+    Finished spans are queued (at most max_queued, the rest are dropped) and
+    exported in batches from a background loop every flush_seconds.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 0.0, flush_seconds: float = 5.0, max_queued: int = 10000):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self.flush_seconds = flush_seconds
+        self._queue: deque = deque()
+        self.max_queued = max_queued
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"traces": 0, "sampled": 0, "spans": 0, "dropped": 0, "exported": 0, "export_errors": 0}
+
+    def _root(self, name: str, trace_id: Optional[str], parent_id: Optional[str], sampled: Optional[bool],
+              attributes: dict):
+        self.counters["traces"] += 1
+        if sampled is None:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not trace_id:
+            trace_id, parent_id = _new_id(16), None
+        if not sampled or self.exporter is None:
+            return NonRecordingSpan(trace_id)
+        self.counters["sampled"] += 1
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Any]:
+        """Times the block as a child of the current span, or as a new trace"""
+        parent = _current_span.get()
+        if parent is None:
+            span = self._root(name, None, None, None, attributes)
+        elif not parent.recording:
+            yield parent  # the whole trace is unsampled: nothing to record
+            return
+        else:
+            span = Span(self, name, parent.trace_id, parent.span_id, attributes)
+        with self._activate(span):
+            yield span
+
+    @contextmanager
+    def trace(self, name: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+              sampled: Optional[bool] = None, **attributes) -> Iterator[Any]:
+        """
+        Starts a new trace, or continues the one of an incoming traceparent
+        header: its root span then records the caller's span as parent.
+        """
+        with self._activate(self._root(name, trace_id, parent_id, sampled, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def _activate(self, span):
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if span.recording:
+                span.status, span.error = "error", repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            if span.recording:
+                span.end()
+
+    def finished(self, span: Span):
+        self.counters["spans"] += 1
+        if len(self._queue) >= self.max_queued:
+            self.counters["dropped"] += 1
+            return
+        self._queue.append(span.to_dict())
+
+    def flush(self) -> int:
+        """Exports the queued spans (blocking: call it from a thread)"""
+        spans = []
+        while self._queue and len(spans) < 1000:
+            spans.append(self._queue.popleft())
+        if not spans:
+            return 0
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            logger.error("Trace export error: %s", e)
+            self.counters["export_errors"] += 1
+            self.counters["dropped"] += len(spans)
+            return 0
+        self.counters["exported"] += len(spans)
+        return len(spans)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            while await asyncio.to_thread(self.flush):
+                pass
+
+    def start(self):
+        if self.exporter is not None:
+            self._task = asyncio.ensure_future(self._flush_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.exporter is not None:
+            while await asyncio.to_thread(self.flush):
+                pass
+
+    def stats(self) -> dict:
+        return {"exporter": type(self.exporter).__name__ if self.exporter else None, "sample_rate": self.sample_rate,
+                "queued": len(self._queue), **self.counters}
+
+def current_span():
+    """The active span (recording or not), or None outside any trace"""
+    return _current_span.get()
+
+def trace_attributes(**attributes):
+    """Sets attributes on the active span, if it is recorded"""
+    span = _current_span.get()
+    if span is not None and span.recording:
+        span.set(**attributes)
+
+def traced(name: str):
+    """Decorator: runs an async function inside tracer.span(name)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def parse_traceparent(header: Optional[str]) -> tuple[Optional[str], Optional[str], Optional[bool]]:
+    """
+    (trace_id, parent span id, sampled) from a W3C traceparent header,
+    (None, None, None) if absent or invalid
+    """
+    parts = (header or "").strip().split("-")
+    if (len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16
+            or parts[1] == "0" * 32 or parts[2] == "0" * 16):
+        return None, None, None
+    try:
+        int(parts[1], 16)
+        int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None, None, None
+    return parts[1], parts[2], sampled
+
+def build_exporter():
+    if not settings.TRACE_EXPORTER:
+        return None
+    if settings.TRACE_EXPORTER == "jsonl":
+        return JSONLExporter(settings.TRACE_JSONL_PATH)
+    if settings.TRACE_EXPORTER == "otlp":
+        return OTLPExporter(settings.TRACE_OTLP_URL)
+    raise ValueError(f"Unknown TRACE_EXPORTER {settings.TRACE_EXPORTER!r} (jsonl, otlp)")
+
+tracer = Tracer(build_exporter(), settings.TRACE_SAMPLE_RATE, settings.TRACE_FLUSH_SECONDS, settings.TRACE_MAX_QUEUED_SPANS)
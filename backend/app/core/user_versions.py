@@ -0,0 +1,62 @@
+from typing import Any, Hashable, Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from app.core.cache import TTLCache
+from app.core.db import open_session
+from app.models import UserCacheVersion
+
+async def read_user_version(user_id: str, scope: str, session=None) -> int:
+    """The user's counter for this scope, read in `session` if given (e.g. the request's own)."""
+    statement = select(UserCacheVersion.version).where(
+        UserCacheVersion.user_id == user_id, UserCacheVersion.scope == scope)
+    if session is not None:
+        return await session.scalar(statement) or 0
+    async with open_session() as session:
+        return await session.scalar(statement) or 0
+
+async def bump_user_versions(session, user_ids: Iterable[str], scopes: Iterable[str]):
+    """
+    Increments the users' counters for these cache scopes. Call it inside the
+    write's own transaction, so the caches of every process stop serving the
+    old entries exactly when the write commits. Rows are never deleted: a
+    counter going back to 0 would revive entries cached at 0.
+    """
+    rows = [{"user_id": user_id, "scope": scope, "version": 1}
+            for user_id in sorted(set(user_ids)) for scope in sorted(set(scopes))]  # fixed lock order
+    if not rows:
+        return
+    statement = insert(UserCacheVersion).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "scope"], set_={"version": UserCacheVersion.version + 1})
+    await session.execute(statement)
+
+class UserVersionedCache:
+    """
+    Per-process entries keyed by (user, version, key), where version is the
+    user's counter for this cache's scope in the user_cache_version table.
+    Writers bump the counter in their transaction (bump_user_versions), so a
+    write by any API process or standalone worker invalidates the user's
+    entries everywhere at once. Each lookup costs one primary key read;
+    superseded entries are never read again and age out of the LRU.
+    """
+
+    def __init__(self, scope: str, max_entries: int, ttl_seconds: float):
+        self.scope = scope
+        self._entries = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    async def version(self, user_id: str, session=None) -> int:
+        return await read_user_version(user_id, self.scope, session)
+
+    def get(self, user_id: str, version: int, key: Hashable = None) -> Optional[Any]:
+        return self._entries.get((user_id, version, key))
+
+    def set(self, user_id: str, version: int, key: Hashable, value: Any):
+        # Read the version before computing value: an answer computed across a
+        # write is then stored under the old version, which nobody reads anymore
+        self._entries.set((user_id, version, key), value)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return self._entries.stats()
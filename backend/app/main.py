@@ -1,22 +1,65 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 from app.routes import assess, dashboard, goals, privacy, quotes, user
-from app.core.db import init_db
+from app.core.db import engine, init_db
+from app.core.metrics import metrics
+from app.core.tracing import tracer
+from app.core.logs import log_stats, setup_logging
+from app.core.dag import drain_background_tasks
+from app.core.governor import llm_governor
 from app.core.observability import ObservabilityMiddleware
+from app.core.response_cache import response_cache
+from app.core.memory import InMemorySessionService
 from app.core.config import get_settings
+from app.agents.emission_cache import emission_cache_stats
+from app.agents.local_classifier import local_classifier
+from app.agents.reference_factors import load_reference_factors, reference_factors
+from app.agents.tools import close_search_backend, search_cache_stats, search_flights
+from app.agents.classifier import classifier_flights
+from app.agents.calculator_agent import calculator_flights
+from app.agents.suggestion_agent import suggestion_flights
+from app.agents.jobs import job_workers
+from app.agents.deletion import deletion_workers
+from app.agents.memory_agent import user_context_cache, user_context_flights
+from app.agents.quote_agent import quote_pool
+from app.agents.profiles import last_logins, profile_cache, profile_flights
 import os
 
 settings = get_settings()
+setup_logging()
+
+metrics.gauge_callback("db_pool_checked_out", "Database connections in use", lambda: engine.pool.checkedout())
+metrics.gauge_callback("llm_in_flight", "Gemini calls in progress", lambda: llm_governor.stats()["in_flight"])
+metrics.gauge_callback("llm_queue_depth", "Gemini calls waiting for a slot", lambda: llm_governor.stats()["queue_depth"])
+metrics.gauge_callback("log_records_dropped", "Log records dropped because the log queue was full", lambda: log_stats()["dropped"])
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    metrics.start()
+    tracer.start()
+    local_classifier.load_snapshot(settings.LOCAL_CLASSIFIER_SNAPSHOT)
+    await load_reference_factors()
+    if settings.JOB_WORKERS > 0:
+        job_workers.start()
+    if settings.ACCOUNT_DELETE_WORKERS > 0:
+        deletion_workers.start()
+    last_logins.start()
+    await quote_pool.load()
+    quote_pool.ensure_refill()  # generates missing days in the background
     yield
-    # Shutdown (if needed in future)
-    pass
+    # Shutdown
+    await job_workers.stop()  # running jobs are handed back to the queue
+    await deletion_workers.stop()
+    await last_logins.stop()  # flushes buffered last_login updates
+    await drain_background_tasks()
+    await close_search_backend()
+    await metrics.stop()
+    await tracer.stop()  # exports the spans still queued
 
 app = FastAPI(
     title="Environmental Footprint API",
@@ -55,4 +98,36 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return {"status": "healthy", "service": "MyGreenScore API"}
+    return {
+        "status": "degraded" if llm_governor.degraded else "healthy",
+        "service": "MyGreenScore API",
+        "llm": llm_governor.stats(),
+        "jobs": job_workers.stats(),
+        "deletions": deletion_workers.stats(),
+        "last_login": last_logins.stats(),
+        "quotes": quote_pool.stats(),
+        "tracing": tracer.stats(),
+        "logging": log_stats(),
+        "caches": {
+            "emission_factors": emission_cache_stats(),
+            "local_classifier": local_classifier.stats,
+            "reference_factors": reference_factors.stats(),
+            "search": search_cache_stats(),
+            "responses": response_cache.stats(),
+            "profiles": profile_cache.stats(),
+            "sessions": await InMemorySessionService.stats(),
+            "user_context": user_context_cache.stats(),
+        },
+        "coalescing": {
+            flights.name: flights.stats
+            for flights in (
+                classifier_flights, calculator_flights, suggestion_flights, search_flights,
+                profile_flights, user_context_flights,
+            )
+        },
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics, merged across the workers sharing METRICS_MULTIPROC_DIR"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,6 +1,8 @@
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Column, JSON
-from datetime import datetime
+from sqlalchemy import Index, UniqueConstraint
+from datetime import date, datetime
+import uuid
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
@@ -15,9 +17,14 @@ class User(SQLModel, table=True):
 
 class FootprintRecord(SQLModel, table=True):
     __tablename__ = "footprint_record"
+    __table_args__ = (
+        # Per-user history and rollup rebuilds: index-only scans, no heap visits
+        Index("ix_footprint_record_user_id_created_at", "user_id", "created_at",
+              postgresql_include=["category", "co2e_kg"]),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True)  # Index for fast user queries
+    user_id: str  # Leading column of ix_footprint_record_user_id_created_at
     item_name: str
     category: Optional[str] = Field(default=None, index=True)  # Index for category filtering
     classification_confidence: float = Field(default=0.0)
@@ -27,17 +34,36 @@ class FootprintRecord(SQLModel, table=True):
     suggestions: List[str] = Field(default=[], sa_column=Column(JSON))
     created_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # Index for time-based queries
 
+class DailyFootprintRollup(SQLModel, table=True):
+    """Per user, day and category totals of footprint_record, kept up to date on every insert"""
+    __tablename__ = "footprint_daily_rollup"
+    __table_args__ = (UniqueConstraint("user_id", "day", "category"),)  # also serves (user_id, day) lookups
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: str
+    day: date  # UTC day of FootprintRecord.created_at
+    category: str  # "Other" for records without a category
+    co2e_kg: float = Field(default=0.0)
+    record_count: int = Field(default=0)
+
 class UserGoal(SQLModel, table=True):
     __tablename__ = "user_goal"
+    __table_args__ = (
+        Index("ix_user_goal_user_id_end_date", "user_id", "end_date"),  # active goal: end_date IS NULL
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True)  # Index for user lookups
+    user_id: str
     target_co2e: float
     period: str = "monthly"  # weekly, monthly, yearly
     start_date: datetime = Field(default_factory=datetime.utcnow)
     end_date: Optional[datetime] = None
 
 class UserPreference(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_userpreference_user_id_key", "user_id", "key"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str
     key: str
@@ -45,9 +71,120 @@ class UserPreference(SQLModel, table=True):
 
 class MemoryLog(SQLModel, table=True):
     __tablename__ = "memory_log"
+    __table_args__ = (
+        Index("ix_memory_log_user_id_timestamp", "user_id", "timestamp"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: str = Field(index=True)  # Index for user memory queries
+    user_id: str
     role: str  # user, assistant, system
     content: str
     timestamp: datetime = Field(default_factory=datetime.utcnow, index=True)  # Index for time-based queries
+
+class UserCacheVersion(SQLModel, table=True):
+    """Per user and cache scope, bumped in the transaction of every write the cache depends on"""
+    __tablename__ = "user_cache_version"
+    
+    user_id: str = Field(primary_key=True)
+    scope: str = Field(primary_key=True)  # responses, user_context
+    version: int = Field(default=0)
+
+class EmissionFactor(SQLModel, table=True):
+    __tablename__ = "emission_factor"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cache_key: str = Field(index=True, unique=True)  # normalized "item|category|unit"
+    item_name: str = Field(index=True)  # normalized, for targeted invalidation
+    category: str
+    unit: str
+    factor: float  # kg CO2e per unit
+    source: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)  # Index for expiry sweeps
+
+class AssessmentJob(SQLModel, table=True):
+    __tablename__ = "assessment_job"
+    
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    user_id: str = Field(index=True)
+    status: str = Field(default="queued", index=True)  # queued, running, succeeded, failed
+    items: List[dict] = Field(default=[], sa_column=Column(JSON))
+    results: List[dict] = Field(default=[], sa_column=Column(JSON))  # one entry per processed item
+    processed: int = Field(default=0)
+    total_co2e_kg: float = Field(default=0.0)
+    attempts: int = Field(default=0)
+    error: Optional[str] = None
+    lease_owner: Optional[str] = None  # worker currently holding the job
+    lease_expires_at: Optional[datetime] = Field(default=None, index=True)  # expired leases are reclaimed
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+class DataExport(SQLModel, table=True):
+    """A prepared privacy export, written to EXPORT_DIR for later download"""
+    __tablename__ = "data_export"
+    
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    user_id: str = Field(index=True)
+    status: str = Field(default="pending")  # pending, ready, failed
+    format: str = "ndjson"  # json, ndjson
+    path: Optional[str] = None
+    size_bytes: int = Field(default=0)
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+class AccountDeletion(SQLModel, table=True):
+    """
+    A pending "delete all my data" request. Rows up to the cutoff ids are hidden
+    at once and purged by the deletion workers in batches.
+    """
+    __tablename__ = "account_deletion"
+    
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex, primary_key=True)
+    user_id: str = Field(index=True)
+    status: str = Field(default="queued", index=True)  # queued, running, completed
+    footprint_cutoff_id: int = Field(default=0)  # rows with id <= cutoff existed when deletion was requested
+    memory_log_cutoff_id: int = Field(default=0)
+    footprints_deleted: int = Field(default=0)
+    memory_logs_deleted: int = Field(default=0)
+    attempts: int = Field(default=0)
+    error: Optional[str] = None  # last failed attempt; the purge is retried until it completes
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = Field(default=None, index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+class DailyQuote(SQLModel, table=True):
+    """Pre-generated quote and tip, served on its day"""
+    __tablename__ = "daily_quote"
+    __table_args__ = (
+        UniqueConstraint("day", "slot"),  # workers refilling the same day cannot duplicate it
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(index=True)
+    slot: int  # 0 .. QUOTE_POOL_PER_DAY - 1
+    quote: str
+    author: str
+    tip: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ReferenceFactor(SQLModel, table=True):
+    """An imported reference emission factor (see `python -m app.cli reference-factors import`)"""
+    __tablename__ = "reference_factor"
+    __table_args__ = (
+        UniqueConstraint("dataset", "item_name", "unit"),  # re-importing a table updates its rows
+    )
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    dataset: str = Field(index=True)
+    item_name: str  # normalized canonical name
+    aliases: List[str] = Field(default=[], sa_column=Column(JSON))  # normalized
+    category: str
+    unit: str  # normalized
+    factor: float  # kg CO2e per unit
+    basis: Optional[str] = None  # scope, region or method, shown in the answer's source
+    created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
 from typing import List
-from app.agents.coordinator import coordinator_agent
+import json
+from app.agents.coordinator import coordinator_agent, coordinator_agent_stream
+from app.agents.jobs import enqueue_job, get_job, job_status
 from app.core.auth import get_current_user
 
 router = APIRouter()
@@ -14,6 +18,13 @@ class Item(BaseModel):
 class AssessRequest(BaseModel):
     items: List[Item]
 
+async def _queue_job(user_id: str, items_data: list):
+    job = await enqueue_job(user_id, items_data)
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder({**job_status(job), "status_url": f"/api/assess/jobs/{job.id}"}),
+    )
+
 @router.post("/assess")
 async def assess_footprint(request: AssessRequest, user_id: str = Depends(get_current_user)):
     try:
@@ -23,3 +34,50 @@ async def assess_footprint(request: AssessRequest, user_id: str = Depends(get_cu
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/assess/stream")
+async def assess_footprint_stream(request: AssessRequest, user_id: str = Depends(get_current_user)):
+    """
+    Same as /assess, but streams Server-Sent Events: one "item" (or "error") event per
+    item as soon as it is ready, then a "summary" event with total_co2e_kg.
+    Disconnecting cancels the items that are still being processed.
+    """
+    items_data = [item.dict() for item in request.items]
+
+    async def events():
+        async for update in coordinator_agent_stream(user_id, items_data):
+            event = update.pop("event")
+            yield f"event: {event}\ndata: {json.dumps(update)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",  # also keeps GZipMiddleware from buffering events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/assess/jobs", status_code=202)
+async def create_assessment_job(request: AssessRequest, user_id: str = Depends(get_current_user)):
+    """Queue items for background assessment; poll status_url for progress"""
+    try:
+        return await _queue_job(user_id, [item.dict() for item in request.items])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/assess/jobs/{job_id}")
+async def get_assessment_job(job_id: str, user_id: str = Depends(get_current_user)):
+    job = await get_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+@router.get("/assess/jobs/{job_id}/results")
+async def get_assessment_job_results(job_id: str, offset: int = 0, user_id: str = Depends(get_current_user)):
+    """
+    Results of the items processed so far, in submission order (partial while the
+    job is running). Pass offset=<results already fetched> to get only new ones.
+    Failed items carry an "error" instead of a CO2 result.
+    """
+    job = await get_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {**job_status(job), "offset": offset, "results": job.results[max(offset, 0):]}
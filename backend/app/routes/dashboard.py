@@ -1,33 +1,34 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy import select, func
 from app.core.db import get_session
-from app.models import FootprintRecord
+from app.models import DailyFootprintRollup
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from app.core.auth import get_current_user
+from app.core.response_cache import cached_response
 
 router = APIRouter()
 
 @router.get("/stats")
-async def get_dashboard_stats(session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+async def get_dashboard_stats(request: Request, session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
     """
-    Get aggregated CO2e stats for the user.
+    Get aggregated CO2e stats for the user (cached until the user's data changes).
     """
-    # Total CO2e
-    stmt = select(func.sum(FootprintRecord.co2e_kg)).where(FootprintRecord.user_id == user_id)
-    result = await session.execute(stmt)
-    total_co2e = result.scalar() or 0.0
-    
-    # CO2e by Category
+    return await cached_response(request, session, user_id, "dashboard:stats", lambda: _stats(session, user_id))
+
+async def _stats(session: AsyncSession, user_id: str):
+    # CO2e by Category from the daily rollup (the total is their sum),
+    # so the cost does not grow with the number of records
     stmt = select(
-        FootprintRecord.category, 
-        func.sum(FootprintRecord.co2e_kg)
+        DailyFootprintRollup.category,
+        func.sum(DailyFootprintRollup.co2e_kg)
     ).where(
-        FootprintRecord.user_id == user_id
-    ).group_by(FootprintRecord.category)
+        DailyFootprintRollup.user_id == user_id
+    ).group_by(DailyFootprintRollup.category)
     
     result = await session.execute(stmt)
     by_category = {row[0]: row[1] for row in result.all()}
+    total_co2e = sum(by_category.values())
     
     return {
         "total_co2e_kg": total_co2e,
@@ -36,19 +37,24 @@ async def get_dashboard_stats(session: AsyncSession = Depends(get_session), user
     }
 
 @router.get("/trends")
-async def get_trends(days: int = 30, session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+async def get_trends(request: Request, days: int = 30, session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
     """
-    Get daily CO2e trends for the last N days.
+    Get daily CO2e trends for the last N days (cached until the user's data changes).
     """
-    start_date = datetime.utcnow() - timedelta(days=days)
+    # Keyed by the day too: "the last N days" moves at midnight
+    key = ("dashboard:trends", days, datetime.utcnow().date())
+    return await cached_response(request, session, user_id, key, lambda: _trends(session, user_id, days))
+
+async def _trends(session: AsyncSession, user_id: str, days: int):
+    start_date = (datetime.utcnow() - timedelta(days=days)).date()
     
     stmt = select(
-        func.date_trunc('day', FootprintRecord.created_at).label('day'),
-        func.sum(FootprintRecord.co2e_kg)
+        DailyFootprintRollup.day,
+        func.sum(DailyFootprintRollup.co2e_kg)
     ).where(
-        FootprintRecord.user_id == user_id,
-        FootprintRecord.created_at >= start_date
-    ).group_by('day').order_by('day')
+        DailyFootprintRollup.user_id == user_id,
+        DailyFootprintRollup.day >= start_date
+    ).group_by(DailyFootprintRollup.day).order_by(DailyFootprintRollup.day)
     
     result = await session.execute(stmt)
     trends = [{"date": row[0].strftime("%Y-%m-%d"), "co2e_kg": row[1]} for row in result.all()]
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from sqlalchemy import select
 from app.core.db import get_session
@@ -6,6 +6,9 @@ from app.models import UserGoal
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.core.auth import get_current_user
+from app.agents.memory_agent import invalidate_user_context
+from app.core.response_cache import cached_response, response_cache
+from app.core.user_versions import bump_user_versions
 
 router = APIRouter()
 
@@ -37,13 +40,18 @@ async def set_goal(goal: GoalCreate, session: AsyncSession = Depends(get_session
         period=goal.period
     )
     session.add(new_goal)
+    await bump_user_versions(session, [user_id], [response_cache.scope])
+    await invalidate_user_context(session, user_id)
     await session.commit()
     await session.refresh(new_goal)
     
     return new_goal
 
 @router.get("/")
-async def get_active_goal(session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+async def get_active_goal(request: Request, session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+    return await cached_response(request, session, user_id, "goals:active", lambda: _active_goal(session, user_id))
+
+async def _active_goal(session: AsyncSession, user_id: str):
     stmt = select(UserGoal).where(
         UserGoal.user_id == user_id,
         UserGoal.end_date == None
@@ -1,63 +1,89 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import select, delete
-from app.core.db import get_session
-from app.models import FootprintRecord, UserGoal, UserPreference, MemoryLog
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
+from app.models import DataExport
 from app.core.auth import get_current_user
+from app.agents.deletion import deletion_status, get_deletion, request_deletion
+from app.agents.export import FORMATS, get_export, prepare_export, purge_exports, stream_export
+from datetime import datetime
+import os
 
 router = APIRouter()
 
 @router.get("/export")
-async def export_data(session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+async def export_data(format: str = "json", user_id: str = Depends(get_current_user)):
     """
-    Export all data associated with the user.
+    Export all data associated with the user, streamed as it is read.
+    format=json (default) returns one document; format=ndjson one row per line.
     """
-    data = {}
-    
-    # Footprints
-    res = await session.execute(select(FootprintRecord).where(FootprintRecord.user_id == user_id))
-    footprints = res.scalars().all()
-    data["footprints"] = [
-        {k: v for k, v in r.dict().items() if k not in ["user_id", "classification_confidence"]}
-        for r in footprints
-    ]
-    
-    # Goals
-    res = await session.execute(select(UserGoal).where(UserGoal.user_id == user_id))
-    goals = res.scalars().all()
-    data["goals"] = [
-        {k: v for k, v in r.dict().items() if k not in ["user_id"]}
-        for r in goals
-    ]
-    
-    # Preferences
-    res = await session.execute(select(UserPreference).where(UserPreference.user_id == user_id))
-    preferences = res.scalars().all()
-    data["preferences"] = [
-        {k: v for k, v in r.dict().items() if k not in ["user_id"]}
-        for r in preferences
-    ]
-    
-    # Memory Logs
-    res = await session.execute(select(MemoryLog).where(MemoryLog.user_id == user_id))
-    memory_logs = res.scalars().all()
-    data["memory_logs"] = [
-        {k: v for k, v in r.dict().items() if k not in ["user_id"]}
-        for r in memory_logs
-    ]
-    
-    return data
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    media_type = "application/json" if format == "json" else "application/x-ndjson"
+    return StreamingResponse(stream_export(user_id, format), media_type=media_type)
+
+def _export_status(export: DataExport) -> dict:
+    status = {
+        "export_id": export.id,
+        "status": export.status,
+        "format": export.format,
+        "size_bytes": export.size_bytes,
+        "error": export.error,
+        "created_at": export.created_at,
+        "expires_at": export.expires_at,
+    }
+    if export.status == "ready":
+        status["download_url"] = f"/api/privacy/export/{export.id}/download"
+    return status
 
-@router.delete("/data")
-async def delete_data(session: AsyncSession = Depends(get_session), user_id: str = Depends(get_current_user)):
+@router.post("/export/prepare", status_code=202)
+async def prepare_data_export(format: str = "ndjson", user_id: str = Depends(get_current_user)):
+    """
+    Prepare the export in the background for very large accounts;
+    poll status_url, then fetch download_url once it is ready.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    export = await prepare_export(user_id, format)
+    return {**_export_status(export), "status_url": f"/api/privacy/export/{export.id}"}
+
+@router.get("/export/{export_id}")
+async def get_data_export(export_id: str, user_id: str = Depends(get_current_user)):
+    export = await get_export(export_id, user_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return _export_status(export)
+
+@router.get("/export/{export_id}/download")
+async def download_data_export(export_id: str, user_id: str = Depends(get_current_user)):
+    export = await get_export(export_id, user_id)
+    if export is None:
+        raise HTTPException(status_code=404, detail="Export not found")
+    if export.status != "ready":
+        raise HTTPException(status_code=409, detail=f"Export is {export.status}")
+    if export.expires_at < datetime.utcnow() or not os.path.exists(export.path):
+        raise HTTPException(status_code=410, detail="Export expired")
+    media_type = "application/json" if export.format == "json" else "application/x-ndjson"
+    return FileResponse(export.path, media_type=media_type, filename=f"mygreenscore-export.{export.format}")
+
+@router.delete("/data", status_code=202)
+async def delete_data(user_id: str = Depends(get_current_user)):
     """
     Delete all data associated with the user.
+    The data is hidden at once; footprints and memory logs are purged in the
+    background, poll status_url for progress.
     """
-    await session.execute(delete(FootprintRecord).where(FootprintRecord.user_id == user_id))
-    await session.execute(delete(UserGoal).where(UserGoal.user_id == user_id))
-    await session.execute(delete(UserPreference).where(UserPreference.user_id == user_id))
-    await session.execute(delete(MemoryLog).where(MemoryLog.user_id == user_id))
-    
-    await session.commit()
+    deletion = await request_deletion(user_id)
+    await purge_exports(user_id)  # prepared export files hold the same data
     
-    return {"status": "success", "message": "All user data deleted"}
+    return {
+        "status": "success",
+        "message": "All user data deleted",
+        "deletion_id": deletion.id,
+        "status_url": f"/api/privacy/deletion/{deletion.id}",
+    }
+
+@router.get("/deletion/{deletion_id}")
+async def get_data_deletion(deletion_id: str, user_id: str = Depends(get_current_user)):
+    deletion = await get_deletion(deletion_id, user_id)
+    if deletion is None:
+        raise HTTPException(status_code=404, detail="Deletion not found")
+    return deletion_status(deletion)
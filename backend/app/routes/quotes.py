@@ -1,15 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from app.core.auth import get_current_user
-from app.agents.quote_agent import quote_agent
+from app.agents.quote_agent import quote_pool
 
 router = APIRouter()
 
 @router.get("/daily")
 async def get_daily_quote(user_id: str = Depends(get_current_user)):
     """
-    Get a daily sustainability quote and tip generated by AI.
+    Get today's sustainability quote and tip, pre-generated by AI.
+    Each user keeps the same quote for the whole day.
     """
-    try:
-        return await quote_agent()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return quote_pool.daily(user_id)
@@ -5,6 +5,7 @@ from app.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.core.auth import get_current_user
+from app.agents.profiles import cache_profile, load_profile
 from pydantic import BaseModel
 from typing import Optional
 
@@ -15,40 +16,12 @@ class UserProfile(BaseModel):
     name: Optional[str] = None
 
 @router.get("/me")
-async def get_user_profile(
-    session: AsyncSession = Depends(get_session), 
-    user_id: str = Depends(get_current_user)
-):
+async def get_user_profile(user_id: str = Depends(get_current_user)):
     """
     Get the current user's profile. Creates one if it doesn't exist.
+    Served from the profile cache; last_login is written behind in batches.
     """
-    # Try to find existing user
-    stmt = select(User).where(User.clerk_id == user_id)
-    result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        # Create new user profile
-        user = User(clerk_id=user_id)
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-    else:
-        # Update last login
-        user.last_login = datetime.utcnow()
-        session.add(user)
-        await session.commit()
-        await session.refresh(user)
-    
-    return {
-        "id": user.id,
-        "clerk_id": user.clerk_id,
-        "email": user.email,
-        "name": user.name,
-        "onboarding_completed": user.onboarding_completed,
-        "created_at": user.created_at.isoformat(),
-        "last_login": user.last_login.isoformat()
-    }
+    return await load_profile(user_id)
 
 @router.put("/me")
 async def update_user_profile(
@@ -83,6 +56,7 @@ async def update_user_profile(
     
     await session.commit()
     await session.refresh(user)
+    cache_profile(user)
     
     return {
         "id": user.id,
@@ -111,6 +85,7 @@ async def complete_onboarding(
         session.add(user)
         await session.commit()
         await session.refresh(user)
+        cache_profile(user)
         return {"status": "success", "onboarding_completed": True}
     
     return {"status": "error", "message": "User not found"}
@@ -0,0 +1,102 @@
+"""
+Auth benchmark for get_current_user.
+
+Signs tokens with a throwaway RSA key and times the verification paths:
+  pem_string    - the old per-request path: jwt.decode with the raw PEM string
+                  (key parsed and signature verified on every call)
+  parsed_key    - key object parsed once, signature still verified every call
+  jwks_kid      - key selected by kid from a JWKS file, verified every call
+  cached_token  - repeat calls with the same token (verified-token cache hit)
+
+Usage (from backend/):
+    python -m benchmarks.auth_benchmark --calls 2000 --output auth.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi.security import HTTPAuthorizationCredentials
+from app.core import auth
+from benchmarks.query_benchmark import percentiles
+
+def _keys():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM, format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    jwk = {**json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key())), "kid": "bench", "alg": "RS256"}
+    return private_key, pem, jwk
+
+def _tokens(private_key, calls: int, headers=None) -> list[str]:
+    exp = int(time.time()) + 3600
+    return [jwt.encode({"sub": f"user_{n}", "exp": exp}, private_key, algorithm="RS256", headers=headers)
+            for n in range(calls)]
+
+async def _time(calls: int, call) -> dict:
+    samples = []
+    for n in range(calls):
+        started = time.perf_counter()
+        await call(n)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+async def benchmark(calls: int) -> dict:
+    private_key, pem, jwk = _keys()
+    fresh = _tokens(private_key, calls)
+    fresh_kid = _tokens(private_key, calls, headers={"kid": "bench"})
+    repeated = HTTPAuthorizationCredentials(scheme="Bearer", credentials=fresh[0])
+
+    async def pem_string(n):
+        jwt.decode(fresh[n], key=pem, algorithms=["RS256"])
+
+    async def current_user(tokens):
+        async def call(n):
+            await auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=tokens[n]))
+        return call
+
+    async def cached_token(n):
+        await auth.get_current_user(repeated)
+
+    with tempfile.TemporaryDirectory() as directory, patch.object(auth.settings, "CLERK_PEM_PUBLIC_KEY", pem):
+        jwks = os.path.join(directory, "jwks.json")
+        with open(jwks, "w") as f:
+            json.dump({"keys": [jwk]}, f)
+
+        results = {"pem_string": await _time(calls, pem_string)}
+        with patch.object(auth, "clerk_keys", auth.ClerkKeys(None, 3600)):
+            auth.verified_tokens.clear()
+            results["parsed_key"] = await _time(calls, await current_user(fresh))
+            results["cached_token"] = await _time(calls, cached_token)
+        with patch.object(auth, "clerk_keys", auth.ClerkKeys(jwks, 3600)):
+            auth.verified_tokens.clear()
+            results["jwks_kid"] = await _time(calls, await current_user(fresh_kid))
+    results["token_cache"] = auth.verified_tokens.stats()
+    return results
+
+def print_report(results: dict):
+    print(f"{'path':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for path in ("pem_string", "parsed_key", "jwks_kid", "cached_token"):
+        stats = results[path]
+        print(f"{path:<14}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+async def main(args):
+    results = await benchmark(args.calls)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.auth_benchmark")
+    parser.add_argument("--calls", type=int, default=1000, help="Calls timed per path")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    return parser
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
@@ -0,0 +1,155 @@
+"""
+Simulated upstreams for offline benchmarks.
+
+FakeGenerativeModel stands in for google.generativeai.GenerativeModel and
+answers every prompt the agents send (classify, calculate, suggest, quotes,
+single and batched) with well-formed JSON. FakeSearchBackend plugs into
+set_search_backend(). Both draw latencies from a log-normal distribution
+given by its median and p99, fail at a configurable rate and answer 429 when
+their per-minute quota is exhausted or at random.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Optional
+from unittest.mock import patch
+import httpx
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+CATEGORIES = ["Food", "Transport", "Energy", "Clothing", "Electronics", "Household", "Other"]
+Z_99 = 2.326
+
+class LatencyModel:
+    """Log-normal latency with the given median and p99, in milliseconds"""
+
+    def __init__(self, median_ms: float, p99_ms: Optional[float] = None):
+        self.median_ms = median_ms
+        self.p99_ms = p99_ms or median_ms
+        self.sigma = math.log(self.p99_ms / median_ms) / Z_99 if median_ms > 0 and self.p99_ms > median_ms else 0.0
+
+    @classmethod
+    def parse(cls, value: str) -> "LatencyModel":
+        """"800" or "800:3000" (median:p99 ms)"""
+        median, _, p99 = value.partition(":")
+        return cls(float(median), float(p99) if p99 else None)
+
+    def sample(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * math.exp(random.gauss(0, self.sigma)) / 1000
+
+class Upstream:
+    """Latency, random failures and a per-minute quota shared by a fake backend"""
+
+    def __init__(self, latency: LatencyModel, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 quota_per_minute: Optional[float] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.quota_per_minute = quota_per_minute
+        self._window_start = time.monotonic()
+        self._window_calls = 0
+        self.counters = {"calls": 0, "errors": 0, "rate_limited": 0}
+
+    def _over_quota(self) -> bool:
+        if not self.quota_per_minute:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_calls = now, 0
+        self._window_calls += 1
+        return self._window_calls > self.quota_per_minute
+
+    async def call(self) -> Optional[str]:
+        """Waits like the upstream would; returns "429", "error" or None (success)"""
+        self.counters["calls"] += 1
+        await asyncio.sleep(self.latency.sample())
+        if self._over_quota() or random.random() < self.rate_limit_rate:
+            self.counters["rate_limited"] += 1
+            return "429"
+        if random.random() < self.error_rate:
+            self.counters["errors"] += 1
+            return "error"
+        return None
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+# --- Gemini -------------------------------------------------------------------
+
+def _numbered(prompt: str) -> list[str]:
+    return re.findall(r"^\s*\d+\.\s+(.+)$", prompt, flags=re.MULTILINE)
+
+def _co2e(name: str) -> float:
+    return round(0.1 + (sum(map(ord, name)) % 500) / 50, 3)  # stable per item
+
+def answer(prompt: str) -> object:
+    """The JSON an agent expects for this prompt"""
+    if "inspiring quotes" in prompt:
+        count = int(re.search(r"Generate (\d+)", prompt).group(1))
+        return [{"quote": f"Benchmark quote {n}", "author": "Load Test", "tip": "Turn off idle devices."}
+                for n in range(count)]
+
+    items = _numbered(prompt)
+    if "Classify each of the following items" in prompt:
+        return [{"index": i, "category": random.choice(CATEGORIES), "confidence": 0.9} for i in range(len(items))]
+    if "Classify the following item" in prompt:
+        return {"category": random.choice(CATEGORIES), "confidence": 0.9}
+    if "for each of the following products" in prompt and "co2e_kg" in prompt:
+        return [{"index": i, "co2e_kg": _co2e(item), "factor_used": _co2e(item), "source": "benchmark"}
+                for i, item in enumerate(items)]
+    if "for the product" in prompt and "co2e_kg" in prompt:
+        name = re.search(r"for the product: (.+?) \(", prompt).group(1)
+        return {"co2e_kg": _co2e(name), "factor_used": _co2e(name), "source": "benchmark"}
+    if "alternatives for each of the following products" in prompt:
+        return [{"index": i, "suggestions": ["Buy second-hand", "Choose local", "Repair it"]} for i in range(len(items))]
+    if "alternatives for the product" in prompt:
+        return {"suggestions": ["Buy second-hand", "Choose local", "Repair it"]}
+    return {}
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel backed by a shared Upstream"""
+
+    upstream = Upstream(LatencyModel(0))
+
+    def __init__(self, model_name: str = "gemini-flash-latest", **kwargs):
+        self.model_name = f"models/{model_name}"
+
+    async def generate_content_async(self, prompt, **kwargs):
+        outcome = await self.upstream.call()
+        if outcome == "429":
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (fake quota)")
+        if outcome == "error":
+            raise google_exceptions.InternalServerError("Internal error (fake)")
+        text = "```json\n" + json.dumps(answer(str(prompt))) + "\n```"
+        usage = SimpleNamespace(prompt_token_count=len(str(prompt)) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+@contextmanager
+def fake_gemini(upstream: Upstream):
+    """Routes every genai.GenerativeModel(...) in the app to FakeGenerativeModel"""
+    model = type("FakeGenerativeModel", (FakeGenerativeModel,), {"upstream": upstream})
+    with patch.object(genai, "GenerativeModel", model):
+        yield upstream
+
+# --- Custom Search ------------------------------------------------------------
+
+class FakeSearchBackend:
+    """set_search_backend() stand-in returning a few emission factor snippets"""
+
+    def __init__(self, upstream: Upstream):
+        self.upstream = upstream
+
+    async def search(self, query: str) -> list[str]:
+        outcome = await self.upstream.call()
+        if outcome is not None:
+            status = 429 if outcome == "429" else 500
+            request = httpx.Request("GET", "https://search.invalid/customsearch/v1")
+            raise httpx.HTTPStatusError(f"{status} (fake)", request=request, response=httpx.Response(status, request=request))
+        return [f"{query}: about {_co2e(query)} kg CO2e per unit (benchmark snippet {n})" for n in range(3)]
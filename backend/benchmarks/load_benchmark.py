@@ -0,0 +1,348 @@
+"""
+Load benchmark for the whole API, offline.
+
+Boots app.main with uvicorn in a background thread (its own event loop, so the
+load generator does not distort it) against DATABASE_URL, with Gemini replaced
+by benchmarks.fakes.FakeGenerativeModel and Custom Search by FakeSearchBackend.
+Requests carry Clerk tokens signed with a throwaway key. At each concurrency
+level, that many clients send a weighted mix of /api/assess, /api/dashboard/*,
+/api/user/me and /api/privacy/export back to back for --duration seconds.
+
+Reports throughput, latency percentiles per endpoint, the server's event-loop
+lag and upstream/governor counters as JSON; --compare prints the change
+against an earlier report (e.g. from the previous commit).
+
+Usage (from backend/, with DATABASE_URL pointing at a SCRATCH database):
+    python -m benchmarks.load_benchmark --concurrency 8,32,64 --duration 20 --output before.json
+    python -m benchmarks.load_benchmark --concurrency 8,32,64 --duration 20 --compare before.json
+    python -m benchmarks.load_benchmark --gemini-latency 800:4000 --gemini-429-rate 0.05 --search-error-rate 0.02
+    python -m benchmarks.load_benchmark --reset   # remove the benchmark users and their rows
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
+import httpx
+import jwt
+from sqlalchemy import delete, text
+from benchmarks.auth_benchmark import _keys
+from benchmarks.fakes import FakeSearchBackend, LatencyModel, Upstream, fake_gemini
+from benchmarks.query_benchmark import ITEMS, percentiles
+
+USER_PREFIX = "load_"
+DEFAULT_MIX = "assess=2,dashboard_stats=3,dashboard_trends=2,user_me=3,export=0.5"
+UNITS = {"Bus ride": "km", "Train ticket": "km", "Flight": "km", "Electricity": "kWh", "Gas heating": "kWh"}
+LAG_INTERVAL = 0.01
+
+# --- Scenarios ----------------------------------------------------------------
+# Each sends one request with the given auth headers and returns the response (body fully read).
+
+def _items(variants: int) -> list[dict]:
+    picked = random.sample(ITEMS, random.randint(1, 3))
+    return [
+        {"item_name": f"{name} {random.randrange(variants)}" if variants > 1 else name,
+         "quantity": random.randint(1, 5), "unit": UNITS.get(name, "kg")}
+        for name in picked
+    ]
+
+async def assess(client: httpx.AsyncClient, headers: dict, args) -> httpx.Response:
+    return await client.post("/api/assess", json={"items": _items(args.item_variants)}, headers=headers)
+
+async def dashboard_stats(client: httpx.AsyncClient, headers: dict, args) -> httpx.Response:
+    return await client.get("/api/dashboard/stats", headers=headers)
+
+async def dashboard_trends(client: httpx.AsyncClient, headers: dict, args) -> httpx.Response:
+    return await client.get("/api/dashboard/trends", headers=headers)
+
+async def user_me(client: httpx.AsyncClient, headers: dict, args) -> httpx.Response:
+    return await client.get("/api/user/me", headers=headers)
+
+async def export(client: httpx.AsyncClient, headers: dict, args) -> httpx.Response:
+    async with client.stream("GET", "/api/privacy/export", params={"format": "ndjson"}, headers=headers) as response:
+        await response.aread()
+    return response
+
+SCENARIOS = {fn.__name__: fn for fn in (assess, dashboard_stats, dashboard_trends, user_me, export)}
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+# --- Server -------------------------------------------------------------------
+
+class ServerThread:
+    """uvicorn serving app.main on its own event loop, with an event-loop lag probe"""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                                    access_log=False, lifespan="on"))
+        self.loop = asyncio.new_event_loop()
+        self.lags: list[tuple[float, float]] = []  # (monotonic time, seconds late)
+        self._thread = threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),), daemon=True)
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + LAG_INTERVAL
+            await asyncio.sleep(LAG_INTERVAL)
+            now = time.monotonic()
+            self.lags.append((now, max(0.0, now - expected)))
+
+    async def _serve(self):
+        probe = asyncio.ensure_future(self._probe())
+        try:
+            await self.server.serve()
+        finally:
+            probe.cancel()
+
+    def start(self, timeout: float = 60):
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise SystemExit("The app did not start (is DATABASE_URL reachable?)")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self._thread.join(timeout=60)
+
+    def lag_between(self, start: float, end: float) -> list[float]:
+        return [lag for at, lag in list(self.lags) if start <= at <= end]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# --- Load ---------------------------------------------------------------------
+
+async def run_level(base_url: str, tokens: list[str], mix: dict, concurrency: int, duration: float, args) -> list:
+    """Closed loop: `concurrency` clients, each sending its next request when the last one finished"""
+    samples = []  # (scenario, status, seconds)
+    names, weights = list(mix), list(mix.values())
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            while time.monotonic() < deadline:
+                scenario = random.choices(names, weights)[0]
+                headers = {"Authorization": f"Bearer {random.choice(tokens)}"}
+                started = time.perf_counter()
+                try:
+                    status = (await SCENARIOS[scenario](client, headers, args)).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                samples.append((scenario, status, time.perf_counter() - started))
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return samples
+
+def _summary(samples: list) -> dict:
+    statuses: dict[str, int] = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {"requests": len(samples), "errors": errors, "status": statuses,
+            **(percentiles([seconds for _, _, seconds in samples]) if samples else {})}
+
+def level_report(concurrency: int, elapsed: float, samples: list, lags: list, upstreams: dict) -> dict:
+    from app.core.governor import llm_governor
+
+    by_scenario: dict[str, list] = {}
+    for sample in samples:
+        by_scenario.setdefault(sample[0], []).append(sample)
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "all": _summary(samples),
+        "endpoints": {name: {**_summary(rows), "throughput_rps": round(len(rows) / elapsed, 2)}
+                      for name, rows in sorted(by_scenario.items())},
+        "loop_lag": percentiles(lags) if lags else {},
+        "upstreams": {name: upstream.stats() for name, upstream in upstreams.items()},
+        "llm_governor": llm_governor.stats(),  # counters since the server started
+    }
+
+# --- Database -----------------------------------------------------------------
+
+async def reset():
+    from app.core.db import open_session
+    from app.models import (
+        AccountDeletion, AssessmentJob, DailyFootprintRollup, DataExport, FootprintRecord, MemoryLog, User,
+        UserGoal, UserPreference,
+    )
+
+    async with open_session() as session:
+        for model in (FootprintRecord, MemoryLog, DailyFootprintRollup, UserGoal, UserPreference, AssessmentJob,
+                      AccountDeletion, DataExport):
+            result = await session.execute(delete(model).where(model.user_id.startswith(USER_PREFIX)))
+            print(f"  {model.__tablename__}: deleted {result.rowcount} row(s)")
+        result = await session.execute(delete(User).where(User.clerk_id.startswith(USER_PREFIX)))
+        print(f"  user: deleted {result.rowcount} row(s)")
+        await session.commit()
+
+async def seed_history(users: int, records_per_user: int):
+    """Past footprints so dashboards and exports have something to read"""
+    from app.agents.rollup import backfill_rollup
+    from app.core.db import engine
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"""
+            INSERT INTO footprint_record
+                (user_id, item_name, category, classification_confidence, quantity, unit, co2e_kg, suggestions, created_at)
+            SELECT '{USER_PREFIX}' || u, 'Seeded item', 'Food', 0.9, 1, 'kg', round((random() * 20)::numeric, 3), '[]',
+                   (now() at time zone 'utc') - random() * interval '90 days'
+            FROM generate_series(0, {users - 1}) u, generate_series(1, {records_per_user})
+        """))
+    for n in range(users):
+        await backfill_rollup(f"{USER_PREFIX}{n}")
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# --- Main ---------------------------------------------------------------------
+
+async def _drive(base_url: str, tokens: list[str], server: ServerThread, upstreams: dict, args) -> list:
+    mix = parse_mix(args.mix)
+    levels = []
+    if args.warmup:
+        await run_level(base_url, tokens, mix, min(args.concurrency), args.warmup, args)
+    for concurrency in args.concurrency:
+        for upstream in upstreams.values():
+            upstream.counters = dict.fromkeys(upstream.counters, 0)
+        start = time.monotonic()
+        samples = await run_level(base_url, tokens, mix, concurrency, args.duration, args)
+        end = time.monotonic()
+        level = level_report(concurrency, end - start, samples, server.lag_between(start, end), upstreams)
+        levels.append(level)
+        print(f"  concurrency {concurrency:>4}: {level['throughput_rps']:>8} req/s, "
+              f"p50 {level['all'].get('p50_ms')} ms, p99 {level['all'].get('p99_ms')} ms, "
+              f"loop lag p99 {level['loop_lag'].get('p99_ms')} ms, errors {level['all']['errors']}")
+    return levels
+
+def benchmark(args) -> dict:
+    from app.core.logs import setup_logging
+
+    log_file = open(args.log_file, "a")
+    setup_logging(log_file)  # before app.main, which would log to stdout
+
+    from app.agents.tools import set_search_backend
+    from app.core import auth
+    from app.main import app
+
+    gemini = Upstream(LatencyModel.parse(args.gemini_latency), args.gemini_error_rate, args.gemini_429_rate,
+                      args.gemini_quota_per_minute)
+    search = Upstream(LatencyModel.parse(args.search_latency), args.search_error_rate, args.search_429_rate)
+    private_key, pem, _ = _keys()
+    exp = int(time.time()) + 24 * 3600
+    tokens = [jwt.encode({"sub": f"{USER_PREFIX}{n}", "exp": exp}, private_key, algorithm="RS256")
+              for n in range(args.users)]
+
+    previous_search = set_search_backend(FakeSearchBackend(search))
+    try:
+        with fake_gemini(gemini), patch.object(auth.settings, "CLERK_PEM_PUBLIC_KEY", pem):
+            server = ServerThread(app, _free_port())
+            server.start()
+            try:
+                if args.seed_records:
+                    future = asyncio.run_coroutine_threadsafe(seed_history(args.users, args.seed_records), server.loop)
+                    future.result()
+                base_url = f"http://127.0.0.1:{server.server.config.port}"
+                levels = asyncio.run(_drive(base_url, tokens, server, {"gemini": gemini, "search": search}, args))
+            finally:
+                server.stop()
+    finally:
+        set_search_backend(previous_search)
+        log_file.close()
+
+    return {
+        "meta": {"commit": _commit(), "timestamp": datetime.utcnow().isoformat(), "args": vars(args)},
+        "levels": levels,
+    }
+
+def _change(before, after) -> str:
+    if before in (None, 0) or after is None:
+        return f"{after}"
+    return f"{after} ({(after - before) / before * 100:+.0f}%)"
+
+def print_comparison(baseline: dict, report: dict):
+    before_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    print(f"\nAgainst {baseline['meta']['commit']} ({baseline['meta']['timestamp']}):")
+    print(f"{'concurrency':>11} {'endpoint':<18} {'req/s':>20} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20}")
+    for level in report["levels"]:
+        before = before_levels.get(level["concurrency"])
+        if before is None:
+            continue
+        rows = [("all", before["all"], level["all"], before["throughput_rps"], level["throughput_rps"])]
+        rows += [(name, before["endpoints"].get(name, {}), entry,
+                  before["endpoints"].get(name, {}).get("throughput_rps"), entry["throughput_rps"])
+                 for name, entry in level["endpoints"].items()]
+        for name, old, new, old_rps, new_rps in rows:
+            print(f"{level['concurrency']:>11} {name:<18} {_change(old_rps, new_rps):>20} "
+                  + " ".join(f"{_change(old.get(key), new.get(key)):>20}" for key in ("p50_ms", "p95_ms", "p99_ms")))
+        lag_before, lag_after = before["loop_lag"].get("p99_ms"), level["loop_lag"].get("p99_ms")
+        print(f"{level['concurrency']:>11} {'loop lag p99':<18} {'':>20} {_change(lag_before, lag_after):>20}")
+
+def main(args):
+    if args.reset:
+        asyncio.run(reset())
+        return
+    print(f"Load benchmark: concurrency {args.concurrency}, {args.duration}s per level, mix {args.mix}")
+    report = benchmark(args)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+def _levels(value: str) -> list[int]:
+    return [int(level) for level in value.split(",") if level.strip()]
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_benchmark")
+    parser.add_argument("--concurrency", type=_levels, default=[8, 32], help="Comma-separated client counts")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level")
+    parser.add_argument("--warmup", type=float, default=5, help="Untimed seconds before the first level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--users", type=int, default=200, help="Distinct benchmark users")
+    parser.add_argument("--seed-records", type=int, default=0, help="Past footprint rows to seed per user")
+    parser.add_argument("--item-variants", type=int, default=50,
+                        help="Variants per item name; more variants mean more cache misses")
+    parser.add_argument("--timeout", type=float, default=60, help="Client timeout per request")
+    parser.add_argument("--gemini-latency", default="600:2500", help="Fake Gemini median[:p99] latency in ms")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-429-rate", type=float, default=0.0, help="Share of calls answered 429 at random")
+    parser.add_argument("--gemini-quota-per-minute", type=float, help="Calls per minute before every call gets 429")
+    parser.add_argument("--search-latency", default="150:600", help="Fake search median[:p99] latency in ms")
+    parser.add_argument("--search-error-rate", type=float, default=0.0)
+    parser.add_argument("--search-429-rate", type=float, default=0.0)
+    parser.add_argument("--log-file", default=os.devnull, help="Where the app's JSON logs go")
+    parser.add_argument("--compare", help="Earlier --output report to compare against")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--reset", action="store_true", help="Delete the benchmark users and their rows, then exit")
+    return parser
+
+if __name__ == "__main__":
+    main(build_parser().parse_args())
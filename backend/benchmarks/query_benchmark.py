@@ -0,0 +1,314 @@
+"""
+Query benchmark for the footprint schema.
+
+Seeds a scratch Postgres database with skewed synthetic data, runs every query
+the dashboard, goals, privacy, memory_agent, rollup and job code paths issue,
+and reports latency percentiles plus EXPLAIN ANALYZE plans.
+
+Usage (from backend/, with DATABASE_URL pointing at a SCRATCH database, e.g. the
+docker-compose one):
+    python -m benchmarks.query_benchmark --seed --records 2000000 --memory-logs 1000000
+    python -m benchmarks.query_benchmark --compare --explain
+    python -m benchmarks.query_benchmark --reset
+
+--compare also runs the suite with the composite indexes from app/models.py
+dropped (inside a transaction that is rolled back), to show what they buy.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, func, or_, select, text, cast, Date
+from sqlalchemy.dialects import postgresql
+from sqlmodel import SQLModel
+from app.core.db import engine, init_db
+from app.models import (
+    AssessmentJob, DailyFootprintRollup, FootprintRecord, MemoryLog, UserGoal, UserPreference,
+)
+
+USER_PREFIX = "bench_"
+CATEGORIES = ["Food", "Transport", "Energy", "Clothing", "Electronics", "Household", "Other"]
+ITEMS = ["Coffee", "Beef burger", "Bus ride", "Jeans", "Laptop", "Electricity", "Apple", "Train ticket",
+         "Milk", "T-shirt", "Gas heating", "Smartphone", "Rice", "Flight", "Cheese", "Sofa"]
+
+# --- Seeding ----------------------------------------------------------------
+# User ids follow floor(users * random() ^ skew): with skew 3 and 10k users the
+# heaviest user owns ~5% of all rows and half the users have only a handful,
+# which is roughly what long-time vs. casual users look like.
+
+def _user_expr(users: int, skew: float) -> str:
+    return f"'{USER_PREFIX}' || floor({users} * power(random(), {skew}))::int"
+
+def _array(values: list[str]) -> str:
+    return "ARRAY[" + ", ".join(f"'{v}'" for v in values) + "]"
+
+async def seed(records: int, memory_logs: int, users: int, skew: float, batch: int = 200_000):
+    await init_db()
+    async with engine.begin() as conn:
+        for start in range(0, records, batch):
+            await conn.execute(text(f"""
+                INSERT INTO footprint_record
+                    (user_id, item_name, category, classification_confidence, quantity, unit, co2e_kg, suggestions, created_at)
+                SELECT {_user_expr(users, skew)},
+                       ({_array(ITEMS)})[1 + floor(random() * {len(ITEMS)})::int],
+                       ({_array(CATEGORIES)})[1 + floor(random() * {len(CATEGORIES)})::int],
+                       0.9, 1 + floor(random() * 5), 'kg', round((random() * 20)::numeric, 3), '[]',
+                       (now() at time zone 'utc') - random() * interval '730 days'
+                FROM generate_series(1, {min(batch, records - start)})
+            """))
+            print(f"  footprint_record: {min(start + batch, records)}/{records}")
+
+        for start in range(0, memory_logs, batch):
+            await conn.execute(text(f"""
+                INSERT INTO memory_log (user_id, role, content, timestamp)
+                SELECT {_user_expr(users, skew)}, 'system', 'Processed item: ' || round((random() * 20)::numeric, 2) || 'kg CO2e',
+                       (now() at time zone 'utc') - random() * interval '730 days'
+                FROM generate_series(1, {min(batch, memory_logs - start)})
+            """))
+            print(f"  memory_log: {min(start + batch, memory_logs)}/{memory_logs}")
+
+        # Three goals per user (the last one active) and two preferences
+        await conn.execute(text(f"""
+            INSERT INTO user_goal (user_id, target_co2e, period, start_date, end_date)
+            SELECT '{USER_PREFIX}' || u, 100 + g * 10, 'monthly',
+                   (now() at time zone 'utc') - (3 - g) * interval '30 days',
+                   CASE WHEN g < 2 THEN (now() at time zone 'utc') - (2 - g) * interval '30 days' END
+            FROM generate_series(0, {users - 1}) u, generate_series(0, 2) g
+        """))
+        await conn.execute(text(f"""
+            INSERT INTO userpreference (user_id, key, value)
+            SELECT '{USER_PREFIX}' || u, k, 'yes'
+            FROM generate_series(0, {users - 1}) u, unnest(ARRAY['vegetarian', 'public_transport']) k
+        """))
+
+        # Dashboard rollup for the seeded users (same statement as `app.cli rollup backfill`)
+        day = cast(func.date_trunc("day", FootprintRecord.created_at), Date)
+        category = func.coalesce(FootprintRecord.category, "Other")
+        await conn.execute(
+            postgresql.insert(DailyFootprintRollup).from_select(
+                ["user_id", "day", "category", "co2e_kg", "record_count"],
+                select(FootprintRecord.user_id, day, category, func.sum(FootprintRecord.co2e_kg), func.count())
+                .where(FootprintRecord.user_id.startswith(USER_PREFIX))
+                .group_by(FootprintRecord.user_id, day, category),
+            ).on_conflict_do_nothing()
+        )
+        await conn.execute(text(f"""
+            INSERT INTO assessment_job (id, user_id, status, items, results, processed, total_co2e_kg, attempts, created_at, updated_at, finished_at)
+            SELECT md5(random()::text), '{USER_PREFIX}' || floor(random() * {users})::int, 'succeeded', '[]', '[]', 0, 0, 1,
+                   (now() at time zone 'utc') - random() * interval '30 days', now() at time zone 'utc', now() at time zone 'utc'
+            FROM generate_series(1, {max(users // 10, 1)})
+        """))
+
+    await vacuum()
+
+async def reset():
+    async with engine.begin() as conn:
+        for model in (FootprintRecord, MemoryLog, UserGoal, UserPreference, DailyFootprintRollup, AssessmentJob):
+            result = await conn.execute(delete(model).where(model.user_id.startswith(USER_PREFIX)))
+            print(f"  {model.__tablename__}: deleted {result.rowcount} row(s)")
+
+async def sample_users(conn) -> dict:
+    """The heaviest, a median and a light benchmark user (by footprint rows)"""
+    rows = (await conn.execute(
+        select(FootprintRecord.user_id, func.count())
+        .where(FootprintRecord.user_id.startswith(USER_PREFIX))
+        .group_by(FootprintRecord.user_id)
+        .order_by(func.count().desc())
+    )).all()
+    if not rows:
+        raise SystemExit("No benchmark data: run with --seed first")
+    return {"heavy": rows[0], "median": rows[len(rows) // 2], "light": rows[-1]}
+
+# --- Queries ----------------------------------------------------------------
+# Each mirrors the statement issued by the named code path.
+
+def queries(user_id: str) -> dict:
+    now = datetime.utcnow()
+    day = cast(func.date_trunc("day", FootprintRecord.created_at), Date)
+    category = func.coalesce(FootprintRecord.category, "Other")
+    return {
+        "dashboard.stats (rollup by category)": select(
+            DailyFootprintRollup.category, func.sum(DailyFootprintRollup.co2e_kg)
+        ).where(DailyFootprintRollup.user_id == user_id).group_by(DailyFootprintRollup.category),
+
+        "dashboard.trends (30 days)": select(
+            DailyFootprintRollup.day, func.sum(DailyFootprintRollup.co2e_kg)
+        ).where(
+            DailyFootprintRollup.user_id == user_id,
+            DailyFootprintRollup.day >= (now - timedelta(days=30)).date(),
+        ).group_by(DailyFootprintRollup.day).order_by(DailyFootprintRollup.day),
+
+        "goals.active": select(UserGoal).where(UserGoal.user_id == user_id, UserGoal.end_date == None),
+
+        "memory_agent.preferences": select(UserPreference).where(UserPreference.user_id == user_id),
+
+        "memory_agent.goals": select(UserGoal).where(UserGoal.user_id == user_id),
+
+        "privacy.export footprints": select(FootprintRecord).where(FootprintRecord.user_id == user_id),
+
+        "privacy.export memory_logs": select(MemoryLog).where(MemoryLog.user_id == user_id),
+
+        "privacy.delete footprints": delete(FootprintRecord).where(FootprintRecord.user_id == user_id),
+
+        "privacy.delete memory_logs": delete(MemoryLog).where(MemoryLog.user_id == user_id),
+
+        "rollup.backfill (one user)": select(
+            FootprintRecord.user_id, day, category, func.sum(FootprintRecord.co2e_kg), func.count(),
+        ).where(FootprintRecord.user_id == user_id).group_by(FootprintRecord.user_id, day, category),
+
+        "jobs.claim candidate": select(AssessmentJob.id).where(or_(
+            AssessmentJob.status == "queued",
+            and_(AssessmentJob.status == "running", AssessmentJob.lease_expires_at < now),
+        )).order_by(AssessmentJob.created_at).limit(1).with_for_update(skip_locked=True),
+
+        "legacy stats (raw footprint by category)": select(
+            FootprintRecord.category, func.sum(FootprintRecord.co2e_kg)
+        ).where(FootprintRecord.user_id == user_id).group_by(FootprintRecord.category),
+    }
+
+def _is_write(statement) -> bool:
+    return statement.is_dml and not statement.is_select
+
+def _literal_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+async def _timed(conn, statement) -> float:
+    # Writes run in a savepoint that is rolled back, so every run sees the same data
+    start = time.perf_counter()
+    if _is_write(statement):
+        savepoint = await conn.begin_nested()
+        await conn.execute(statement)
+        elapsed = time.perf_counter() - start
+        await savepoint.rollback()
+        return elapsed
+    result = await conn.execute(statement)
+    result.fetchall()
+    return time.perf_counter() - start
+
+async def _explain(conn, statement) -> str:
+    savepoint = await conn.begin_nested()
+    rows = await conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + _literal_sql(statement)))
+    plan = "\n".join(row[0] for row in rows)
+    await savepoint.rollback()
+    return plan
+
+def percentiles(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+    }
+
+async def run_suite(conn, users: dict, runs: int, explain: bool, writes: bool) -> dict:
+    report = {}
+    for profile, (user_id, rows) in users.items():
+        for name, statement in queries(user_id).items():
+            if _is_write(statement) != writes:
+                continue
+            await _timed(conn, statement)  # warm-up
+            samples = [await _timed(conn, statement) for _ in range(runs)]
+            entry = {"user": profile, "footprint_rows": rows, **percentiles(samples)}
+            if explain and profile == "heavy":
+                entry["plan"] = await _explain(conn, statement)
+            report[f"{name} [{profile}]"] = entry
+    return report
+
+def composite_indexes() -> list:
+    """Multi-column or covering indexes declared in app/models.py"""
+    return [
+        index
+        for table in SQLModel.metadata.sorted_tables
+        for index in table.indexes
+        if len(index.columns) > 1 or index.dialect_options["postgresql"]["include"]
+    ]
+
+async def benchmark(runs: int, explain: bool, compare: bool) -> dict:
+    report = {"with_indexes": {}}
+    if compare:
+        report["without_composite_indexes"] = {}
+
+    async with engine.connect() as conn:
+        users = await sample_users(conn)
+        await conn.commit()
+
+        # Reads first: even rolled-back deletes clear the visibility map,
+        # which would turn the index-only scans below into heap fetches
+        for writes in (False, True):
+            async with conn.begin():
+                report["with_indexes"].update(await run_suite(conn, users, runs, explain, writes))
+
+            if compare:
+                transaction = await conn.begin()
+                for index in composite_indexes():
+                    await conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+                report["without_composite_indexes"].update(await run_suite(conn, users, runs, explain, writes))
+                await transaction.rollback()  # DDL is transactional: the indexes come back
+
+    await vacuum()
+    return report
+
+async def vacuum():
+    """Sets the visibility map again, so index-only scans skip the heap"""
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in ("footprint_record", "memory_log"):
+            await conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+def print_report(report: dict):
+    baseline = report.get("without_composite_indexes", {})
+    header = f"{'query':<58} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'p95 w/o composite':>18}"
+    print(header)
+    for name, entry in report["with_indexes"].items():
+        line = f"{name:<58} {entry['p50_ms']:>9} {entry['p95_ms']:>9} {entry['p99_ms']:>9}"
+        if name in baseline:
+            line += f" {baseline[name]['p95_ms']:>18}"
+        print(line)
+
+    for variant, entries in report.items():
+        for name, entry in entries.items():
+            if "plan" in entry:
+                print(f"\n--- {name} ({variant}) ---\n{entry['plan']}")
+
+async def main(args):
+    if args.reset:
+        await reset()
+    if args.seed:
+        started = time.perf_counter()
+        await seed(args.records, args.memory_logs, args.users, args.skew)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+    if args.seed or args.reset:
+        if not args.run:
+            return
+
+    report = await benchmark(args.runs, args.explain, args.compare)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.query_benchmark")
+    parser.add_argument("--seed", action="store_true", help="Insert synthetic data first")
+    parser.add_argument("--reset", action="store_true", help="Delete previously seeded data first")
+    parser.add_argument("--run", action="store_true", help="Also run the queries after --seed/--reset")
+    parser.add_argument("--records", type=int, default=1_000_000, help="Footprint records to seed")
+    parser.add_argument("--memory-logs", type=int, default=1_000_000, help="Memory log rows to seed")
+    parser.add_argument("--users", type=int, default=10_000, help="Distinct users to seed")
+    parser.add_argument("--skew", type=float, default=3.0, help="Activity skew (1 = uniform)")
+    parser.add_argument("--runs", type=int, default=30, help="Timed runs per query and user")
+    parser.add_argument("--explain", action="store_true", help="Print EXPLAIN ANALYZE plans (heavy user)")
+    parser.add_argument("--compare", action="store_true", help="Also run without the composite indexes")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    return parser
+
+if __name__ == "__main__":
+    asyncio.run(main(build_parser().parse_args()))
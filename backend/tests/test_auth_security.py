@@ -1,7 +1,10 @@
+import json
+import time
 import pytest
 import jwt
 from fastapi import HTTPException
 from unittest.mock import MagicMock, patch
+from app.core import auth
 from app.core.auth import get_current_user
 
 # Generate a temporary RSA key pair for testing
@@ -84,3 +87,45 @@ async def test_get_current_user_no_sub():
         
         assert excinfo.value.status_code == 401
         assert "Invalid authentication credentials" in excinfo.value.detail
+
+def jwk(key, kid):
+    return {**json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key())), "kid": kid, "use": "sig", "alg": "RS256"}
+
+@pytest.mark.asyncio
+async def test_get_current_user_selects_rotated_jwks_key_by_kid(tmp_path):
+    new_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwks = tmp_path / "jwks.json"
+    jwks.write_text(json.dumps({"keys": [jwk(private_key, "old")]}))
+    keys = auth.ClerkKeys(str(jwks), refresh_seconds=3600)
+    keys.MIN_REFRESH_SECONDS = 0
+
+    with patch("app.core.auth.settings") as mock_settings, patch.object(auth, "clerk_keys", keys):
+        mock_settings.CLERK_PEM_PUBLIC_KEY = ""
+        credentials = MagicMock()
+        credentials.credentials = jwt.encode({"sub": "user_old"}, pem_private, algorithm="RS256", headers={"kid": "old"})
+        assert await get_current_user(credentials) == "user_old"
+
+        # Key rotated: the unknown kid triggers a refresh of the JWKS document
+        jwks.write_text(json.dumps({"keys": [jwk(private_key, "old"), jwk(new_private_key, "new")]}))
+        credentials.credentials = jwt.encode({"sub": "user_new"}, new_private_key, algorithm="RS256", headers={"kid": "new"})
+        assert await get_current_user(credentials) == "user_new"
+
+@pytest.mark.asyncio
+async def test_get_current_user_caches_verified_tokens_until_exp():
+    valid = jwt.encode({"sub": "user_123", "exp": int(time.time()) + 60}, pem_private, algorithm="RS256")
+    expired = jwt.encode({"sub": "user_123", "exp": int(time.time()) - 5}, pem_private, algorithm="RS256")
+    auth.verified_tokens.clear()
+
+    with patch("app.core.auth.settings") as mock_settings, patch.object(auth.jwt, "decode", wraps=jwt.decode) as decode:
+        mock_settings.CLERK_PEM_PUBLIC_KEY = pem_public.decode("utf-8")
+        credentials = MagicMock()
+        credentials.credentials = valid
+        for _ in range(3):
+            assert await get_current_user(credentials) == "user_123"
+        assert decode.call_count == 1
+
+        credentials.credentials = expired
+        for _ in range(2):
+            with pytest.raises(HTTPException):
+                await get_current_user(credentials)
+        assert decode.call_count == 3
@@ -0,0 +1,69 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.llm import index_batch_results, parse_json_response
+from app.agents.local_classifier import LocalClassifier
+from app.agents.classifier import batch_classifier_agent
+from app.agents.calculator_agent import batch_calculator_agent
+from app.agents.suggestion_agent import batch_suggestion_agent
+
+def fake_model(*answers):
+    """GenerativeModel stand-in whose successive calls return the given JSON payloads"""
+    responses = []
+    for answer in answers:
+        response = MagicMock()
+        response.text = answer if isinstance(answer, str) else "```json\n" + json.dumps(answer) + "\n```"
+        responses.append(response)
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(side_effect=responses)
+    return model
+
+def test_index_batch_results_maps_by_index_and_drops_malformed():
+    parsed = parse_json_response('[{"index": 1, "v": "b"}, "junk", {"index": 0, "v": "a"}, {"index": 7, "v": "x"}]')
+    assert index_batch_results(parsed, 3) == [{"index": 0, "v": "a"}, {"index": 1, "v": "b"}, None]
+    assert index_batch_results({"unexpected": True}, 2) == [None, None]
+
+@pytest.mark.asyncio
+async def test_batch_classifier_retries_only_dropped_items():
+    model = fake_model(
+        [{"index": 0, "category": "Household"}, {"index": 1, "category": "Nonsense", "confidence": 0.9}],
+        {"category": "Clothing", "confidence": 0.9},
+    )
+    with patch("app.agents.classifier.local_classifier", LocalClassifier()), \
+         patch("app.agents.classifier.genai.GenerativeModel", return_value=model):
+        results = await batch_classifier_agent(["Zorblax polish", "Quux weave", "Bananas"])
+
+    assert results[0] == {"category": "Household", "confidence": 0.0}
+    assert results[1] == {"category": "Clothing", "confidence": 0.9}  # per-item fallback
+    assert results[2]["category"] == "Food"                           # answered locally
+    assert model.generate_content_async.await_count == 2
+
+@pytest.mark.asyncio
+async def test_batch_calculator_splits_by_max_batch_size():
+    items = [{"item_name": f"thing {i}", "quantity": 2, "unit": "kg", "category": "Other"} for i in range(3)]
+    model = fake_model(
+        [{"index": 0, "co2e_kg": 2.0, "factor_used": 1.0, "source": "a"}, {"index": 1, "co2e_kg": 4.0, "source": "b"}],
+        [{"index": 0, "co2e_kg": 6.0, "factor_used": 3.0, "source": "c"}],
+    )
+    store = AsyncMock()
+    with patch("app.agents.calculator_agent.settings.LLM_BATCH_MAX_SIZE", 2), \
+         patch("app.agents.calculator_agent.get_cached_factor", AsyncMock(return_value=None)), \
+         patch("app.agents.calculator_agent.store_factor", store), \
+         patch("app.agents.calculator_agent.google_search_tool", AsyncMock(return_value="")), \
+         patch("app.agents.calculator_agent.genai.GenerativeModel", return_value=model):
+        results = await batch_calculator_agent(items)
+
+    assert sorted(r["co2e_kg"] for r in results) == [2.0, 4.0, 6.0]
+    assert model.generate_content_async.await_count == 2
+    assert store.await_count == 3
+
+@pytest.mark.asyncio
+async def test_batch_suggestions_fall_back_for_malformed_entries():
+    model = fake_model(
+        [{"index": 0, "suggestions": ["reusable bottle"]}, {"index": 1, "suggestions": "not a list"}],
+        {"suggestions": ["bike"]},
+    )
+    with patch("app.agents.suggestion_agent.genai.GenerativeModel", return_value=model):
+        results = await batch_suggestion_agent(["Plastic bottle", "Taxi"], {"preferences": {}, "goals": []})
+
+    assert results == [["reusable bottle"], ["bike"]]
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.agents import coordinator
+from app.core.dag import drain_background_tasks
+
+ITEMS = [
+    {"item_name": "Apple", "quantity": 2, "unit": "kg"},
+    {"item_name": "Bus ride", "quantity": 10, "unit": "km"},
+    {"item_name": "Laptop", "quantity": 1, "unit": "item"},
+]
+
+@pytest.fixture
+def agents():
+    calculations = {"Apple": 0.8, "Bus ride": 1.0, "Laptop": 300.0}
+
+    async def calculate(item_name, quantity, unit, category):
+        if item_name == "Laptop":
+            raise RuntimeError("LLM exploded")
+        return {"co2e_kg": calculations[item_name]}
+
+    with patch.object(coordinator.settings, "LLM_BATCH_MODE", False), \
+         patch.object(coordinator, "get_user_context", AsyncMock(return_value={"preferences": {}, "goals": []})), \
+         patch.object(coordinator, "calculator_agent", side_effect=calculate), \
+         patch.object(coordinator, "suggestion_agent", AsyncMock(return_value=["walk"])), \
+         patch.object(coordinator.InMemorySessionService, "add_history"):
+        yield
+
+@pytest.mark.asyncio
+async def test_request_is_written_in_one_bulk_call(agents):
+    writer = AsyncMock(return_value=[11, 12])
+    with patch.object(coordinator, "bulk_writer_tool", writer):
+        response = await coordinator.coordinator_agent("user_1", ITEMS)
+        await drain_background_tasks()
+
+    writer.assert_awaited_once()
+    records, memory_logs = writer.await_args.args
+    assert [r["item_name"] for r in records] == ["Apple", "Bus ride"]
+    assert [log["content"] for log in memory_logs] == ["Processed Apple: 0.8kg CO2e", "Processed Bus ride: 1.0kg CO2e"]
+    assert [r["item"] for r in response["results"]] == ["Apple", "Bus ride"]
+    assert response["total_co2e_kg"] == pytest.approx(1.8)
+
+@pytest.mark.asyncio
+async def test_rows_that_fail_to_save_are_dropped_like_failed_items(agents):
+    with patch.object(coordinator, "bulk_writer_tool", AsyncMock(return_value=[None, 12])):
+        response = await coordinator.coordinator_agent("user_1", ITEMS)
+        await drain_background_tasks()
+
+    assert [r["item"] for r in response["results"]] == ["Bus ride"]
+
+@pytest.mark.asyncio
+async def test_database_outage_drops_all_items(agents):
+    with patch.object(coordinator, "bulk_writer_tool", AsyncMock(side_effect=ConnectionError("pool exhausted"))):
+        response = await coordinator.coordinator_agent("user_1", ITEMS)
+
+    assert response["results"] == []
+    assert response["total_co2e_kg"] == 0
+
+@pytest.mark.asyncio
+async def test_stream_yields_items_as_they_finish_then_summary(agents):
+    async def slow_suggestions(item_name, user_context):
+        await asyncio.sleep({"Apple": 0.1, "Bus ride": 0.0, "Laptop": 0.05}[item_name])
+        return ["walk"]
+
+    writer = AsyncMock(return_value=[11, 12])
+    with patch.object(coordinator, "suggestion_agent", side_effect=slow_suggestions), \
+         patch.object(coordinator, "bulk_writer_tool", writer):
+        events = [e async for e in coordinator.coordinator_agent_stream("user_1", ITEMS)]
+        await drain_background_tasks()
+
+    order = [(e["event"], e.get("item")) for e in events]
+    assert set(order[:2]) == {("item", "Bus ride"), ("error", "Laptop")}
+    assert order[2:] == [("item", "Apple"), ("summary", None)]  # the slowest item comes last
+    assert events[-1]["saved"] == 2
+    assert events[-1]["total_co2e_kg"] == pytest.approx(1.8)
+    writer.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_stream_disconnect_cancels_remaining_items_and_keeps_finished_ones(agents):
+    cancelled = asyncio.Event()
+
+    async def suggestions(item_name, user_context):
+        if item_name == "Apple":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return ["walk"]
+
+    writer = AsyncMock(return_value=[12])
+    with patch.object(coordinator, "suggestion_agent", side_effect=suggestions), \
+         patch.object(coordinator, "bulk_writer_tool", writer):
+        stream = coordinator.coordinator_agent_stream("user_1", ITEMS)
+        first = await stream.__anext__()
+        await stream.aclose()
+        await drain_background_tasks()
+        await asyncio.sleep(0.01)
+
+    assert first["event"] in ("item", "error")
+    assert cancelled.is_set()
+    records, _ = writer.await_args.args
+    assert [r["item_name"] for r in records] == ["Bus ride"]
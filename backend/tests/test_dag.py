@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from app.core.dag import AgentDAG, drain_background_tasks
+
+@pytest.mark.asyncio
+async def test_independent_stages_run_concurrently():
+    async def slow(value, delay=0.2):
+        await asyncio.sleep(delay)
+        return value
+
+    async def combine(left, right):
+        return left + right
+
+    dag = (
+        AgentDAG()
+        .stage("left", lambda x: slow(x * 2), deps=["x"])
+        .stage("right", lambda x: slow(x * 3), deps=["x"])
+        .stage("total", combine, deps=["left", "right"])
+    )
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    run = await dag.run(x=1)
+    assert run["total"] == 5
+    assert loop.time() - start < 0.35
+    assert set(run.timings) == {"left", "right", "total"}
+
+@pytest.mark.asyncio
+async def test_non_critical_stages_do_not_block_the_result():
+    finished = asyncio.Event()
+
+    async def log_later(result):
+        await asyncio.sleep(0.1)
+        finished.set()
+
+    async def compute(x):
+        return x + 1
+
+    dag = (
+        AgentDAG()
+        .stage("result", compute, deps=["x"])
+        .stage("memory", log_later, deps=["result"], critical=False)
+    )
+
+    run = await dag.run(x=1)
+    assert run["result"] == 2
+    assert not finished.is_set()
+    await drain_background_tasks()
+    assert finished.is_set()
+    assert "memory" in run.timings
+
+@pytest.mark.asyncio
+async def test_critical_failure_propagates_and_cancels_siblings():
+    cancelled = asyncio.Event()
+
+    async def fail(x):
+        raise RuntimeError("boom")
+
+    async def wait_forever(x):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    dag = AgentDAG().stage("bad", fail, deps=["x"]).stage("slow", wait_forever, deps=["x"])
+    with pytest.raises(RuntimeError):
+        await dag.run(x=1)
+    await asyncio.sleep(0)
+    assert cancelled.is_set()
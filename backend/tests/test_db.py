@@ -0,0 +1,25 @@
+from sqlmodel import SQLModel
+import app.models  # noqa: F401 - registers the tables
+from app.core.db import plan_indexes
+
+def _names(indexes):
+    return [index.name for index in indexes]
+
+def test_index_plan_creates_missing_rebuilds_invalid_and_only_drops_superseded():
+    tables = SQLModel.metadata.sorted_tables
+    declared = {index.name: table.name for table in tables for index in table.indexes}
+    existing = {name: (table, True) for name, table in declared.items()
+                if name not in ("ix_memory_log_user_id_timestamp", "ix_user_goal_user_id_end_date")}
+    existing["ix_userpreference_user_id_key"] = ("userpreference", False)  # interrupted CREATE INDEX CONCURRENTLY
+    existing["ix_footprint_record_user_id"] = ("footprint_record", True)  # replaced by the composite index
+    existing["ix_footprint_record_item_name"] = ("footprint_record", True)  # created by hand
+    existing["ix_other_table"] = ("not_a_model_table", True)
+
+    plan = plan_indexes(tables, existing, drop_stale=True)
+    assert sorted(_names(plan["create"])) == ["ix_memory_log_user_id_timestamp", "ix_user_goal_user_id_end_date"]
+    assert _names(plan["rebuild"]) == ["ix_userpreference_user_id_key"]
+    assert plan["drop"] == ["ix_footprint_record_user_id"]
+    assert plan["report"] == ["ix_footprint_record_item_name"]
+
+    plan = plan_indexes(tables, existing)
+    assert plan["drop"] == [] and plan["report"] == ["ix_footprint_record_item_name", "ix_footprint_record_user_id"]
@@ -0,0 +1,48 @@
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents import deletion
+from app.models import AccountDeletion, FootprintRecord, MemoryLog
+from app.routes import privacy
+
+@asynccontextmanager
+async def fake_session():
+    yield MagicMock(commit=AsyncMock(), execute=AsyncMock())
+
+@pytest.fixture
+def leases():
+    with patch.object(deletion.settings, "ACCOUNT_DELETE_BATCH_SIZE", 100), \
+         patch.object(deletion.settings, "ACCOUNT_DELETE_PAUSE_SECONDS", 0), \
+         patch.object(deletion, "open_session", fake_session), \
+         patch.object(deletion.deletion_leases, "update", AsyncMock()) as update, \
+         patch.object(deletion.deletion_leases, "finish", AsyncMock()) as finish:
+        yield update, finish
+
+@pytest.mark.asyncio
+async def test_deletion_purges_in_batches_and_resumes_progress(leases):
+    update, finish = leases
+    batches = {FootprintRecord: [100, 100, 40], MemoryLog: [0]}
+    purge = AsyncMock(side_effect=lambda session, model, user_id, cutoff_id: batches[model].pop(0))
+    record = AccountDeletion(id="del1", user_id="user_1", footprint_cutoff_id=900, memory_log_cutoff_id=50,
+                             footprints_deleted=300, attempts=2)  # resumed after 3 committed batches
+
+    with patch.object(deletion, "_purge_batch", purge):
+        assert await deletion.run_deletion(record, "worker-1") == "completed"
+
+    assert [(call.args[1], call.args[3]) for call in purge.await_args_list] == [
+        (FootprintRecord, 900), (FootprintRecord, 900), (FootprintRecord, 900), (MemoryLog, 50),
+    ]
+    assert [call.kwargs["footprints_deleted"] for call in update.await_args_list] == [400, 500, 540, 540]
+    finish.assert_awaited_once_with("del1", "worker-1", "completed", error=None)
+
+@pytest.mark.asyncio
+async def test_delete_data_returns_a_status_url():
+    record = AccountDeletion(id="del1", user_id="user_1")
+    with patch.object(privacy, "request_deletion", AsyncMock(return_value=record)) as request, \
+         patch.object(privacy, "purge_exports", AsyncMock()) as purge_exports:
+        response = await privacy.delete_data("user_1")
+
+    request.assert_awaited_once_with("user_1")
+    purge_exports.assert_awaited_once_with("user_1")
+    assert response["status"] == "success"
+    assert response["status_url"] == "/api/privacy/deletion/del1"
@@ -0,0 +1,57 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.core.cache import TTLCache
+from app.agents.emission_cache import make_cache_key
+from app.agents.calculator_agent import calculator_agent
+
+def test_cache_key_normalization():
+    assert make_cache_key("Beef  Burgers", "food", "Servings") == make_cache_key("beef burger", "Food", "serving")
+    assert make_cache_key("Potatoes", "Food", "kgs") == "potato|food|kg"
+    assert make_cache_key("beef burger", "Food", "kg") != make_cache_key("beef burger", "Food", "serving")
+
+def test_ttl_cache_lru_eviction_and_counters():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)           # evicts "b"
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+def test_ttl_cache_expiry():
+    cache = TTLCache(max_entries=10, ttl_seconds=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+@pytest.mark.asyncio
+async def test_calculator_scales_cached_factor_without_llm():
+    cached = {"factor": 2.5, "source": "cache"}
+    with patch("app.agents.calculator_agent.get_cached_factor", AsyncMock(return_value=cached)), \
+         patch("app.agents.calculator_agent.genai.GenerativeModel") as model_cls:
+        result = await calculator_agent("Beef burger", 4, "serving", "Food")
+
+    model_cls.assert_not_called()
+    assert result == {"co2e_kg": 10.0, "factor_used": 2.5, "source": "cache"}
+
+@pytest.mark.asyncio
+async def test_calculator_stores_per_unit_factor_on_miss():
+    response = MagicMock()
+    response.text = '{"co2e_kg": 6.0, "factor_used": 3.0, "source": "web"}'
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(return_value=response)
+    store = AsyncMock()
+
+    with patch("app.agents.calculator_agent.get_cached_factor", AsyncMock(return_value=None)), \
+         patch("app.agents.calculator_agent.store_factor", store), \
+         patch("app.agents.calculator_agent.google_search_tool", AsyncMock(return_value="")), \
+         patch("app.agents.calculator_agent.genai.GenerativeModel", return_value=model):
+        result = await calculator_agent("Beef burger", 2, "serving", "Food")
+
+    assert result["co2e_kg"] == 6.0
+    store.assert_awaited_once_with("Beef burger", "Food", "serving", 3.0, "web")
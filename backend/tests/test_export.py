@@ -0,0 +1,44 @@
+import json
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import patch
+from app.agents import export
+
+ROWS = {
+    "footprints": [[{"id": 1, "co2e_kg": 0.5, "created_at": datetime(2025, 3, 1, 8)}], [{"id": 2, "co2e_kg": 1.0, "created_at": datetime(2025, 3, 2)}]],
+    "goals": [],
+    "preferences": [[{"id": 7, "key": "diet", "value": "végétarien"}]],
+    "memory_logs": [],
+}
+
+async def section_rows(session, user_id, model, columns, order):
+    section = next(name for name, section_model, *_ in export.EXPORT_SECTIONS if section_model is model)
+    for chunk in ROWS[section]:
+        yield chunk
+
+@asynccontextmanager
+async def fake_session():
+    yield None
+
+async def collect(format):
+    with patch.object(export, "_section_rows", section_rows), patch.object(export, "open_session", fake_session):
+        return "".join([chunk async for chunk in export.stream_export("user_1", format)])
+
+@pytest.mark.asyncio
+async def test_json_export_keeps_the_original_document_shape():
+    document = json.loads(await collect("json"))
+    assert document == {
+        "footprints": [
+            {"id": 1, "co2e_kg": 0.5, "created_at": "2025-03-01T08:00:00"},
+            {"id": 2, "co2e_kg": 1.0, "created_at": "2025-03-02T00:00:00"},
+        ],
+        "goals": [],
+        "preferences": [{"id": 7, "key": "diet", "value": "végétarien"}],
+        "memory_logs": [],
+    }
+
+@pytest.mark.asyncio
+async def test_ndjson_export_writes_one_row_per_line():
+    lines = [json.loads(line) for line in (await collect("ndjson")).splitlines()]
+    assert [(line["table"], line["row"]["id"]) for line in lines] == [("footprints", 1), ("footprints", 2), ("preferences", 7)]
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from google.api_core import exceptions as google_exceptions
+from app.core.governor import LLMGovernor, CircuitOpenError, INTERACTIVE, batch_priority
+
+def make_governor(**overrides):
+    options = dict(max_concurrency=2, rate_per_minute=60000, burst=100,
+                   failure_threshold=2, reset_seconds=0.2, call_timeout=5)
+    options.update(overrides)
+    return LLMGovernor(**options)
+
+class SlowModel:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.order = []
+
+    async def generate_content_async(self, prompt):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.order.append(prompt)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return MagicMock(text="{}")
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    governor = make_governor()
+    model = SlowModel()
+    await asyncio.gather(*[governor.generate(model, f"p{i}") for i in range(6)])
+    assert model.peak == 2
+    assert governor.stats()["succeeded"] == 6
+    assert governor.stats()["queue_depth"] == 0
+
+@pytest.mark.asyncio
+async def test_interactive_work_jumps_the_batch_queue():
+    governor = make_governor(max_concurrency=1)
+    model = SlowModel()
+
+    async def batch_call(prompt):
+        with batch_priority():
+            return await governor.generate(model, prompt)
+
+    first = asyncio.ensure_future(governor.generate(model, "running"))
+    await asyncio.sleep(0.01)
+    queued = [asyncio.ensure_future(batch_call("batch-1")), asyncio.ensure_future(batch_call("batch-2"))]
+    await asyncio.sleep(0.01)
+    queued.append(asyncio.ensure_future(governor.generate(model, "interactive", priority=INTERACTIVE)))
+    await asyncio.gather(first, *queued)
+
+    assert model.order == ["running", "interactive", "batch-1", "batch-2"]
+
+@pytest.mark.asyncio
+async def test_circuit_opens_fails_fast_and_recovers():
+    governor = make_governor()
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(side_effect=google_exceptions.ResourceExhausted("429"))
+
+    for _ in range(2):
+        with pytest.raises(google_exceptions.ResourceExhausted):
+            await governor.generate(model, "p")
+    assert governor.degraded
+
+    with pytest.raises(CircuitOpenError):
+        await governor.generate(model, "p")
+    assert model.generate_content_async.await_count == 2
+    assert governor.stats()["rejected"] == 1
+
+    await asyncio.sleep(0.25)
+    model.generate_content_async = AsyncMock(return_value=MagicMock(text="{}"))
+    await governor.generate(model, "probe")
+    assert not governor.degraded
+
+@pytest.mark.asyncio
+async def test_bad_prompts_do_not_trip_the_breaker():
+    governor = make_governor()
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(side_effect=google_exceptions.InvalidArgument("bad"))
+    for _ in range(5):
+        with pytest.raises(google_exceptions.InvalidArgument):
+            await governor.generate(model, "p")
+    assert not governor.degraded
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_out_calls():
+    governor = make_governor(rate_per_minute=600, burst=1)  # one call per 100 ms
+    model = SlowModel(delay=0)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*[governor.generate(model, "p") for _ in range(3)])
+    assert loop.time() - start >= 0.18
+    assert governor.stats()["rate_limited"] == 2
@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents import jobs
+from app.core.dag import drain_background_tasks
+from app.models import AssessmentJob
+from app.routes import assess
+
+ITEMS = [{"item_name": f"Item {n}", "quantity": 1, "unit": "kg"} for n in range(5)]
+
+async def analyze(user_id, items):
+    return [
+        RuntimeError("LLM exploded") if item["item_name"] == "Item 3" else {
+            "result": {"item": item["item_name"], "category": "Food", "co2e_kg": 1.5, "suggestions": []},
+            "record": {"user_id": user_id, "item_name": item["item_name"]},
+            "memory_log": {"user_id": user_id, "role": "system", "content": item["item_name"]},
+        }
+        for item in items
+    ]
+
+async def write(records, memory_logs, before_commit):
+    ids = list(range(len(records)))
+    await before_commit(MagicMock(), ids)
+    return ids
+
+@pytest.fixture
+def pipeline():
+    writer = AsyncMock(side_effect=write)
+    with patch.object(jobs.settings, "JOB_CHUNK_SIZE", 2), \
+         patch.object(jobs, "analyze_items", AsyncMock(side_effect=analyze)) as analyzer, \
+         patch.object(jobs, "bulk_writer_tool", writer), \
+         patch.object(jobs, "_update_leased", AsyncMock()) as update_leased, \
+         patch.object(jobs, "_finish", AsyncMock()) as finish, \
+         patch.object(jobs, "remember_history", AsyncMock()):
+        yield analyzer, writer, update_leased, finish
+
+@pytest.mark.asyncio
+async def test_job_resumes_after_last_committed_chunk(pipeline):
+    analyzer, writer, update_leased, finish = pipeline
+    job = AssessmentJob(id="job1", user_id="user_1", items=ITEMS, attempts=2, processed=2, total_co2e_kg=3.0,
+                        results=[{"index": 0}, {"index": 1}])
+
+    assert await jobs.run_job(job, "worker-1") == "succeeded"
+    await drain_background_tasks()
+
+    assert [len(call.args[1]) for call in analyzer.await_args_list] == [2, 1]  # items 2-3, then 4
+    progress = update_leased.await_args.kwargs
+    assert progress["processed"] == 5
+    assert progress["total_co2e_kg"] == pytest.approx(6.0)
+    assert [r["index"] for r in progress["results"]] == [0, 1, 2, 3, 4]
+    assert progress["results"][3] == {"index": 3, "item": "Item 3", "error": "LLM exploded"}
+    finish.assert_awaited_once_with("job1", "worker-1", "succeeded")
+
+@pytest.mark.asyncio
+async def test_worker_that_lost_its_lease_stops_without_finishing(pipeline):
+    _, _, update_leased, finish = pipeline
+    update_leased.side_effect = jobs.LeaseLost("job1")
+    job = AssessmentJob(id="job1", user_id="user_1", items=ITEMS, attempts=1)
+
+    assert await jobs.run_job(job, "worker-1") == "lost"
+    finish.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_job_fails_after_too_many_attempts(pipeline):
+    analyzer, _, _, finish = pipeline
+    job = AssessmentJob(id="job1", user_id="user_1", items=ITEMS, attempts=jobs.settings.JOB_MAX_ATTEMPTS + 1)
+
+    assert await jobs.run_job(job, "worker-1") == "failed"
+    analyzer.assert_not_awaited()
+    assert finish.await_args.args[2] == "failed"
+
+@pytest.mark.asyncio
+async def test_assessments_are_queued_only_through_the_jobs_endpoint():
+    job = AssessmentJob(id="job1", user_id="user_1", items=ITEMS)
+    request = assess.AssessRequest(items=ITEMS)
+    with patch.object(assess, "enqueue_job", AsyncMock(return_value=job)) as enqueue, \
+         patch.object(assess, "coordinator_agent", AsyncMock(return_value=[])) as coordinator:
+        assert await assess.assess_footprint(request, "user_1") == []  # answered inline, whatever its size
+        response = await assess.create_assessment_job(request, "user_1")
+
+    assert response.status_code == 202
+    assert b'"status_url":"/api/assess/jobs/job1"' in response.body
+    enqueue.assert_awaited_once_with("user_1", ITEMS)
+    coordinator.assert_awaited_once()
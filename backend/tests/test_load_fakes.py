@@ -0,0 +1,19 @@
+import pytest
+from benchmarks.fakes import LatencyModel, Upstream, fake_gemini
+from app.agents.quote_agent import generate_quotes
+from app.agents.suggestion_agent import batch_suggestion_agent
+
+def test_latency_model_matches_median_and_p99():
+    model = LatencyModel.parse("100:400")
+    samples = sorted(model.sample() for _ in range(20000))
+    assert samples[10000] == pytest.approx(0.1, rel=0.1)
+    assert samples[19800] == pytest.approx(0.4, rel=0.2)
+
+@pytest.mark.asyncio
+async def test_fake_gemini_answers_the_agents_prompts():
+    with fake_gemini(Upstream(LatencyModel(0))) as upstream:
+        suggestions = await batch_suggestion_agent(["Benchmark apple", "Benchmark jeans"], {"preferences": {}, "goals": []})
+        quotes = await generate_quotes(3)
+
+    assert [len(s) for s in suggestions] == [3, 3]
+    assert len(quotes) == 3 and upstream.stats() == {"calls": 2, "errors": 0, "rate_limited": 0}
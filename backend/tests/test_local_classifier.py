@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.local_classifier import LocalClassifier
+from app.agents.classifier import classifier_agent
+
+def test_keyword_index_is_confident_for_unambiguous_items():
+    classifier = LocalClassifier()
+    assert classifier.classify("Beef Burgers")["category"] == "Food"
+    assert classifier.classify("electric car trip")["category"] == "Transport"
+    assert classifier.classify("Laptop")["confidence"] >= 0.8
+
+def test_conflicting_or_unknown_items_are_low_confidence():
+    classifier = LocalClassifier()
+    assert classifier.classify("apple iphone")["confidence"] < 0.8
+    assert classifier.classify("zorblax")["confidence"] == 0.0
+
+def test_items_with_unknown_words_fall_back_to_gemini():
+    classifier = LocalClassifier()
+    for item in ("apple watch", "power bank", "rice cooker", "pot roast"):
+        assert classifier.classify(item)["confidence"] < 0.8, item
+    assert classifier.classify("eggs and bacon")["confidence"] >= 0.8  # filler words need no match
+
+def test_learned_tables_keep_the_most_recently_learned_entries():
+    classifier = LocalClassifier(max_learned=3)
+    for n in range(5):
+        classifier.learn(f"gizmo{n}", "Electronics", 0.9)
+
+    assert classifier.classify("gizmo0") == {"category": "Other", "confidence": 0.0}
+    assert classifier.classify("gizmo4") == {"category": "Electronics", "confidence": 0.9}
+    assert len(classifier.to_dict()["learned"]) == 3 and classifier.stats["evicted"] == 4
+
+def test_learned_table_and_snapshot_round_trip(tmp_path):
+    classifier = LocalClassifier()
+    classifier.load_rows([("Oat Latte", "Food", 0.9, 3), ("Kombucha", "Food", 0.95, 1)])
+    assert classifier.classify("kombucha") == {"category": "Food", "confidence": 0.95}
+
+    path = str(tmp_path / "snapshot.json")
+    classifier.save_snapshot(path)
+    restored = LocalClassifier()
+    assert restored.load_snapshot(path)
+    assert restored.classify("Kombuchas") == {"category": "Food", "confidence": 0.95}
+
+@pytest.mark.asyncio
+async def test_classifier_agent_skips_gemini_when_local_is_confident():
+    with patch("app.agents.classifier.genai.GenerativeModel") as model_cls:
+        result = await classifier_agent("Bananas")
+    model_cls.assert_not_called()
+    assert result["category"] == "Food"
+
+@pytest.mark.asyncio
+async def test_classifier_agent_learns_from_gemini_fallback():
+    response = MagicMock()
+    response.text = '{"category": "Household", "confidence": 0.92}'
+    model = MagicMock()
+    model.generate_content_async = AsyncMock(return_value=response)
+    local = LocalClassifier()
+
+    with patch("app.agents.classifier.local_classifier", local), \
+         patch("app.agents.classifier.genai.GenerativeModel", return_value=model):
+        first = await classifier_agent("Zorblax polish")
+        second = await classifier_agent("zorblax polish")
+
+    assert first == second == {"category": "Household", "confidence": 0.92}
+    model.generate_content_async.assert_awaited_once()
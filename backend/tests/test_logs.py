@@ -0,0 +1,62 @@
+import io
+import json
+import logging
+from app.core.logs import AsyncQueueHandler, JSONFormatter, _Listener, parse_sample_rates
+from app.core.tracing import NonRecordingSpan, _current_span
+
+class Details:
+    formatted = 0
+
+    def __str__(self):
+        Details.formatted += 1
+        return "details"
+
+def _logger(name: str, handler: logging.Handler) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers, logger.propagate = [handler], False
+    logger.setLevel(logging.INFO)
+    return logger
+
+def test_records_are_rendered_when_logged_and_encoded_by_the_listener_thread():
+    handler = AsyncQueueHandler(maxsize=100)
+    logger = _logger("test.logs.json", handler)
+    timings = {"classify": 1.0}
+    token = _current_span.set(NonRecordingSpan("ab" * 16))
+    try:
+        logger.info("Agent: %s %s", Details(), timings, extra={"fields": {"agent": "Classifier", "details": {"timings": timings}}})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Failed")
+    finally:
+        _current_span.reset(token)
+    assert Details.formatted == 1  # arguments are rendered on the logging thread
+    timings["search"] = 2.0  # the caller keeps mutating what it logged
+
+    output = io.StringIO()
+    handler_output = logging.StreamHandler(output)
+    handler_output.setFormatter(JSONFormatter())
+    listener = _Listener(handler.queue, handler_output)
+    listener.start()
+    listener.stop()
+
+    entry, failure = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert Details.formatted == 1
+    assert entry["message"] == "Agent: details {'classify': 1.0}" and entry["level"] == "INFO"
+    assert entry["logger"] == "test.logs.json" and entry["trace_id"] == "ab" * 16 and entry["agent"] == "Classifier"
+    assert entry["details"] == {"timings": {"classify": 1.0}}
+    assert failure["message"] == "Failed" and "ValueError: boom" in failure["exc_info"]
+
+def test_full_queue_drops_and_sampling_keeps_warnings():
+    handler = AsyncQueueHandler(maxsize=2, sample_rates=parse_sample_rates("test.sampled=0"))
+    sampled = _logger("test.sampled.agent", handler)
+    other = _logger("test.other", handler)
+
+    for _ in range(5):
+        sampled.info("high volume")
+    sampled.warning("kept")
+    for _ in range(3):
+        other.info("not sampled")
+
+    assert handler.stats() == {"queued": 2, "max_queued": 2, "enqueued": 2, "dropped": 2, "sampled_out": 5}
+    assert [record.getMessage() for record in (handler.queue.get(), handler.queue.get())] == ["kept", "not sampled"]
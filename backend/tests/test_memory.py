@@ -0,0 +1,78 @@
+import asyncio
+import sqlite3
+import pytest
+from app.core.memory import InMemorySessionService, MemorySessionStore, SQLiteSessionStore
+
+def add_messages(store, user_id, count):
+    for n in range(count):
+        with store.edit(user_id) as session:
+            session.append({"role": "user", "content": f"message {n}"})
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    limits = dict(max_entries=3, max_bytes=1_000_000, idle_ttl=3600, history_size=10)
+    if request.param == "memory":
+        return MemorySessionStore(**limits)
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"), **limits)
+
+def test_history_keeps_first_messages_and_a_ring_of_recent_ones(store):
+    add_messages(store, "user_1", 25)
+
+    history = store.read("user_1").history
+    assert [m["content"] for m in history[:2]] == ["message 0", "message 1"]
+    assert history[2] == {"role": "system", "content": "[Previous context compacted]"}
+    assert [m["content"] for m in history[3:]] == [f"message {n}" for n in range(15, 25)]
+
+def test_least_recently_used_sessions_are_evicted(store):
+    store.EVICT_EVERY = 1
+    for user_id in ("a", "b", "c", "d"):
+        add_messages(store, user_id, 1)
+
+    assert store.read("a") is None
+    assert store.stats()["entries"] == 3
+    assert store.stats()["evicted_lru"] == 1
+
+def test_byte_budget_and_idle_ttl_are_enforced():
+    store = MemorySessionStore(max_entries=100, max_bytes=2000, idle_ttl=3600, history_size=10)
+    for user_id in ("a", "b", "c"):
+        add_messages(store, user_id, 4)
+    assert store.stats()["bytes"] <= 2000
+    assert store.read("a") is None and store.read("c") is not None
+
+    store.idle_ttl = 0
+    assert store.read("c") is None
+
+@pytest.mark.asyncio
+async def test_session_service_keeps_its_api(monkeypatch):
+    monkeypatch.setattr(InMemorySessionService, "store", MemorySessionStore(10, 1_000_000, 3600, 10))
+    assert (await InMemorySessionService.get_session("user_1"))["history"] == []
+    assert InMemorySessionService.store.stats()["entries"] == 0  # reads never create a session
+    await InMemorySessionService.add_history("user_1", "hello", "user")
+    await InMemorySessionService.update_session("user_1", {"context": {"goal": "less meat"}})
+
+    session = await InMemorySessionService.get_session("user_1")
+    assert session["history"] == [{"role": "user", "content": "hello"}]
+    assert session["context"] == {"goal": "less meat"}
+    await InMemorySessionService.clear_session("user_1")
+    assert (await InMemorySessionService.stats())["entries"] == 0
+
+@pytest.mark.asyncio
+async def test_sqlite_lock_waits_do_not_block_the_event_loop(monkeypatch, tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    monkeypatch.setattr(InMemorySessionService, "store", SQLiteSessionStore(path, 10, 1_000_000, 3600, 10))
+    other_process = sqlite3.connect(path, isolation_level=None)
+    other_process.execute("BEGIN IMMEDIATE")  # holds the write lock for 0.3 s
+    asyncio.get_running_loop().call_later(0.3, other_process.execute, "COMMIT")
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+    task = asyncio.ensure_future(ticker())
+    await InMemorySessionService.add_history("user_1", "hello", "user")
+    task.cancel()
+
+    assert ticks >= 10  # the loop kept running while the write waited for the lock
+    assert (await InMemorySessionService.get_session("user_1"))["history"] == [{"role": "user", "content": "hello"}]
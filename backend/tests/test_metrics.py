@@ -0,0 +1,75 @@
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.core import metrics as metrics_module
+from app.core.metrics import MetricsRegistry, http_requests
+from app.core.observability import ObservabilityMiddleware
+
+app = FastAPI()
+app.add_middleware(ObservabilityMiddleware)
+
+@app.get("/items/{item_id}")
+async def item(item_id: int):
+    return {"id": item_id}
+
+@pytest.mark.asyncio
+async def test_requests_are_counted_by_route_template():
+    http_requests.values.clear()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        for item_id in (1, 2, 3):
+            response = await client.get(f"/items/{item_id}")
+        await client.get("/items/not-a-number")
+        await client.get("/missing")
+
+    assert "x-process-time" in response.headers
+    assert http_requests.values == {
+        ("GET", "/items/{item_id}", "200"): 3,
+        ("GET", "/items/{item_id}", "422"): 1,
+        ("GET", "unmatched", "404"): 1,
+    }
+
+def test_scrape_merges_worker_snapshots(tmp_path, monkeypatch):
+    registry = MetricsRegistry(str(tmp_path))
+    requests = registry.counter("requests_total", "Requests", ("status",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    requests.inc(status=200)
+    in_flight.inc()
+    latency.observe(0.05)
+    latency.observe(5)
+
+    for pid, alive in ((101, True), (102, False)):
+        snapshot = registry.snapshot()
+        snapshot["pid"] = pid
+        (tmp_path / f"metrics_{pid}.json").write_text(json.dumps(snapshot))
+    monkeypatch.setattr(metrics_module, "_alive", lambda pid: pid == 101)
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{status="200"} 3' in lines  # this process + a live and a finished worker
+    assert "in_flight 2" in lines  # gauges of finished workers are dropped
+    assert 'latency_seconds_bucket{le="0.1"} 3' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 6' in lines
+    assert "latency_seconds_count 6" in lines
+
+def test_dead_worker_snapshots_are_folded_into_one_file(tmp_path, monkeypatch):
+    registry = MetricsRegistry(str(tmp_path))
+    requests = registry.counter("requests_total", "Requests", ("status",))
+    in_flight = registry.gauge("in_flight", "In flight")
+    requests.inc(status=200)
+    in_flight.inc()
+    monkeypatch.setattr(metrics_module, "_alive", lambda pid: False)
+
+    for pid in (201, 202, 203):  # recycled workers
+        snapshot = registry.snapshot()
+        snapshot["pid"] = pid
+        (tmp_path / f"metrics_{pid}.json").write_text(json.dumps(snapshot))
+        lines = registry.render().splitlines()
+        assert 'requests_total{status="200"} ' + str(pid - 199) in lines  # never goes backwards
+        assert "in_flight 1" in lines
+
+    assert sorted(path.name for path in tmp_path.glob("metrics_*.json")) == ["metrics_dead.json"]
+    dead = json.loads((tmp_path / "metrics_dead.json").read_text())
+    assert dead["metrics"]["requests_total"]["values"] == [[["200"], 3]]
+    assert "in_flight" not in dead["metrics"]  # gauges of dead workers are dropped
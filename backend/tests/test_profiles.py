@@ -0,0 +1,59 @@
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents import profiles
+
+PROFILE = {"id": 1, "clerk_id": "user_1", "email": None, "name": None,
+           "onboarding_completed": True, "created_at": "2025-01-01T00:00:00"}
+
+@pytest.fixture
+def cache():
+    profiles.profile_cache.clear()
+    with patch.object(profiles, "last_logins", profiles.LastLoginBuffer(30)) as buffer:
+        yield buffer
+    profiles.profile_cache.clear()
+
+@pytest.mark.asyncio
+async def test_profile_is_created_once_then_served_from_cache(cache):
+    upsert = AsyncMock(side_effect=lambda clerk_id: profiles._cache_profile(PROFILE) or PROFILE)
+    with patch.object(profiles, "_upsert_profile", upsert):
+        for _ in range(3):
+            profile = await profiles.load_profile("user_1")
+
+    upsert.assert_awaited_once_with("user_1")
+    assert profile["id"] == 1 and "last_login" in profile
+    assert cache.stats()["pending"] == 1  # two hits coalesced into one buffered update
+
+@pytest.mark.asyncio
+async def test_profiles_before_onboarding_are_never_cached(cache):
+    pending = {**PROFILE, "onboarding_completed": False}
+    upsert = AsyncMock(side_effect=lambda clerk_id: profiles._cache_profile(pending) or pending)
+    with patch.object(profiles, "_upsert_profile", upsert):
+        for _ in range(2):
+            assert (await profiles.load_profile("user_1"))["onboarding_completed"] is False
+        pending["onboarding_completed"] = True  # completed through another worker
+        assert (await profiles.load_profile("user_1"))["onboarding_completed"] is True
+        await profiles.load_profile("user_1")
+
+    assert upsert.await_count == 3
+
+@pytest.mark.asyncio
+async def test_failed_last_login_flush_is_retried(cache):
+    session = MagicMock(execute=AsyncMock(side_effect=[RuntimeError("db down"), None]), commit=AsyncMock())
+
+    @asynccontextmanager
+    async def fake_session():
+        yield session
+
+    cache.touch("user_1", datetime(2025, 1, 1))
+    cache.touch("user_2", datetime(2025, 1, 2))
+    cache.touch("user_1", datetime(2025, 1, 3))
+    with patch.object(profiles, "open_session", fake_session):
+        assert await cache.flush() == 0
+        assert await cache.flush() == 2
+
+    rows = session.execute.await_args.args[1]
+    assert {row["b_clerk_id"]: row["b_last_login"] for row in rows} == {
+        "user_1": datetime(2025, 1, 3), "user_2": datetime(2025, 1, 2),
+    }
@@ -0,0 +1,62 @@
+import pytest
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from app.agents import quote_agent
+from app.core.dag import drain_background_tasks
+
+QUOTES = [{"quote": f"Quote {n}", "author": "Author", "tip": "Tip"} for n in range(3)]
+
+def test_quote_selection_is_stable_per_user_and_day():
+    day = date(2025, 3, 1)
+    assert quote_agent.pick_quote(QUOTES, "user_1", day) == quote_agent.pick_quote(QUOTES, "user_1", day)
+    picks = {quote_agent.pick_quote(QUOTES, f"user_{n}", day)["quote"] for n in range(30)}
+    assert picks == {q["quote"] for q in QUOTES}
+
+@pytest.mark.asyncio
+async def test_pool_serves_fallbacks_while_gemini_is_down_then_refills():
+    pool = quote_agent.QuotePool()
+    with patch.object(pool, "load", AsyncMock()), \
+         patch.object(pool, "_store", AsyncMock()) as store, \
+         patch.object(quote_agent, "generate_quotes", AsyncMock(side_effect=RuntimeError("Gemini down"))), \
+         patch.object(quote_agent, "open_session"):
+        assert pool.daily("user_1") in quote_agent.FALLBACK_QUOTES
+        await drain_background_tasks()
+        store.assert_not_awaited()
+        assert pool.stats()["refill_errors"] == 1
+
+    today = datetime.utcnow().date()
+    pool._by_day = {today: QUOTES, today + timedelta(days=1): QUOTES}
+    pool._retry_at = 0
+    generate = AsyncMock(return_value=QUOTES)
+    with patch.object(pool, "load", AsyncMock()), \
+         patch.object(pool, "_store", AsyncMock()) as store, \
+         patch.object(quote_agent, "generate_quotes", generate), \
+         patch.object(quote_agent, "open_session"):
+        assert pool.daily("user_1") in QUOTES
+        await drain_background_tasks()
+
+    stored_days = [call.args[0] for call in store.await_args_list]
+    assert stored_days == [today + timedelta(days=n) for n in range(2, quote_agent.settings.QUOTE_POOL_DAYS)]
+
+@pytest.mark.asyncio
+async def test_refill_tops_up_days_with_too_few_quotes():
+    today = datetime.utcnow().date()
+    per_day, days = quote_agent.settings.QUOTE_POOL_PER_DAY, quote_agent.settings.QUOTE_POOL_DAYS
+    pool = quote_agent.QuotePool()
+    pool._by_day = {today + timedelta(days=n): QUOTES for n in range(days)}
+    pool._by_day[today] = pool._by_day[today + timedelta(days=1)] = QUOTES[:1]
+    assert pool.stats()["days_ahead"] == days - 2  # short days do not count
+
+    new = [{"quote": f"New {n}", "author": "Author", "tip": "Tip"} for n in range(per_day)]
+    generate = AsyncMock(side_effect=lambda count: [QUOTES[0], *new][:count])
+    with patch.object(pool, "load", AsyncMock()), \
+         patch.object(pool, "_store", AsyncMock()) as store, \
+         patch.object(quote_agent, "generate_quotes", generate), \
+         patch.object(quote_agent, "open_session"):
+        await pool.refill()
+
+    generate.assert_awaited_once_with(per_day - 1)  # today's quotes are already being served
+    day, quotes = store.await_args.args
+    assert day == today + timedelta(days=1) and store.await_args.kwargs == {"first_slot": 1}
+    assert QUOTES[0] not in quotes  # already stored for that day
+    assert pool._retry_at > 0  # still one short: retried later, not on every request
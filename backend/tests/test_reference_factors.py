@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.agents.reference_factors import BUNDLED_CSV, ReferenceFactors, read_csv
+from app.agents.calculator_agent import batch_calculator_agent, calculator_agent
+
+def bundled() -> ReferenceFactors:
+    index = ReferenceFactors(min_similarity=0.6)
+    index.load(read_csv(BUNDLED_CSV))
+    return index
+
+def test_exact_alias_and_misspelled_items_match_with_unit_conversion():
+    index = bundled()
+    beef = index.lookup("Beef Steaks", 500, "grams", "Food")
+    assert beef == {"co2e_kg": 49.74, "factor_used": 0.09948,
+                    "source": "poore-nemecek-2018: beef per kg (global mean, beef herd, farm to retail)"}
+    assert index.lookup("bananna", 2, "kg", "Other")["co2e_kg"] == 1.72
+    assert index.lookup("train", 10, "miles", "Transport")["co2e_kg"] == 0.5633
+    assert index.stats()["exact"] == 2 and index.stats()["fuzzy"] == 1
+
+    assert index.lookup("apple juice", 1, "l", "Food") is None       # extra word: not an apple
+    assert index.lookup("electric bike", 10, "km", "Transport") is None
+    assert index.lookup("beef", 1, "serving", "Food") is None         # no conversion to kg
+    assert index.lookup("gas", 10, "kwh", "Transport") is None        # category mismatch
+
+def test_read_csv_reports_the_offending_line(tmp_path):
+    path = tmp_path / "factors.csv"
+    path.write_text("item,category,unit,factor\nOat milk,Food,litres,0.9\noat milk,Food,l,1.0\n")
+    with pytest.raises(ValueError, match=":3: duplicate of line 2"):
+        read_csv(str(path), dataset="custom")
+
+    path.write_text("item,category,unit,factor,aliases\nOat milk,Food,litres,0.9,oat drink;Oatly\n")
+    index = ReferenceFactors()
+    index.load([*read_csv(BUNDLED_CSV), *read_csv(str(path), dataset="custom")])
+    assert index.lookup("oat drink", 500, "ml", "Food")["source"] == "custom: oat milk per l"
+
+@pytest.mark.asyncio
+async def test_calculator_answers_reference_items_without_cache_search_or_gemini():
+    search, cache, model_cls = AsyncMock(return_value=""), AsyncMock(return_value=None), MagicMock()
+    with patch("app.agents.calculator_agent.reference_factors", bundled()), \
+         patch("app.agents.calculator_agent.get_cached_factor", cache), \
+         patch("app.agents.calculator_agent.google_search_tool", search), \
+         patch("app.agents.calculator_agent.genai.GenerativeModel", model_cls):
+        single = await calculator_agent("Chicken breast", 2, "kg", "Food")
+        batch = await batch_calculator_agent([
+            {"item_name": "Bus", "quantity": 12, "unit": "km", "category": "Transport"},
+            {"item_name": "Electricity", "quantity": 100, "unit": "kWh", "category": "Energy"},
+        ])
+
+    assert single["co2e_kg"] == 19.74 and single["source"].startswith("poore-nemecek-2018: chicken")
+    assert [r["co2e_kg"] for r in batch] == [1.2, 48.0]
+    cache.assert_not_awaited()
+    search.assert_not_awaited()
+    model_cls.return_value.generate_content_async.assert_not_called()
@@ -0,0 +1,68 @@
+import httpx
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from fastapi import FastAPI, Request
+from app.core.response_cache import cached_response, response_cache
+
+app = FastAPI()
+calls = []
+versions = {}  # stands in for the user_cache_version table shared by all processes
+REQUEST_SESSION = object()  # the route's Depends(get_session) session
+
+def bump(user_id: str):
+    versions[user_id] = versions.get(user_id, 0) + 1
+
+async def read_version(user_id: str, scope: str, session) -> int:
+    assert scope == "responses" and session is REQUEST_SESSION  # read in the route's own session
+    return versions.get(user_id, 0)
+
+@app.get("/stats/{user_id}")
+async def stats(request: Request, user_id: str):
+    async def compute():
+        calls.append(user_id)
+        if user_id == "racing":
+            bump(user_id)  # a write lands while computing
+        return {"total_co2e_kg": 1.5 * len(calls)}
+    return await cached_response(request, REQUEST_SESSION, user_id, "stats", compute)
+
+@pytest_asyncio.fixture
+async def client():
+    calls.clear()
+    versions.clear()
+    response_cache.clear()
+    with patch("app.core.user_versions.read_user_version", read_version):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+@pytest.mark.asyncio
+async def test_unchanged_response_is_served_from_cache_and_revalidates_with_304(client):
+    first = await client.get("/stats/u1")
+    etag = first.headers["etag"]
+    assert first.json() == {"total_co2e_kg": 1.5}
+
+    again = await client.get("/stats/u1")
+    assert again.json() == first.json() and again.headers["etag"] == etag
+
+    revalidated = await client.get("/stats/u1", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert calls == ["u1"]
+
+@pytest.mark.asyncio
+async def test_bump_invalidates_only_that_user(client):
+    await client.get("/stats/u1")
+    etag = (await client.get("/stats/u2")).headers["etag"]
+    bump("u1")  # e.g. a write committed by another worker
+
+    changed = await client.get("/stats/u1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"total_co2e_kg": 4.5}
+    await client.get("/stats/u2")
+    assert calls == ["u1", "u2", "u1"]
+
+@pytest.mark.asyncio
+async def test_answers_computed_across_a_write_are_not_cached(client):
+    await client.get("/stats/racing")
+    await client.get("/stats/racing")
+    assert calls == ["racing", "racing"]
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
+from app.agents.rollup import apply_rollup, backfill_rollup, rollup_rows
+
+def test_records_are_summed_per_user_day_and_category():
+    morning, evening = datetime(2025, 3, 1, 8), datetime(2025, 3, 1, 21)
+    rows = rollup_rows([
+        {"user_id": "u2", "category": "Food", "co2e_kg": 1.0, "created_at": morning},
+        {"user_id": "u1", "category": "Food", "co2e_kg": 2.0, "created_at": evening},
+        {"user_id": "u1", "category": "Food", "co2e_kg": 0.5, "created_at": morning},
+        {"user_id": "u1", "category": None, "co2e_kg": 3.0, "created_at": datetime(2025, 3, 2)},
+    ])
+
+    assert [(r["user_id"], str(r["day"]), r["category"], r["co2e_kg"], r["record_count"]) for r in rows] == [
+        ("u1", "2025-03-01", "Food", 2.5, 2),
+        ("u1", "2025-03-02", "Other", 3.0, 1),  # uncategorised records roll up as "Other"
+        ("u2", "2025-03-01", "Food", 1.0, 1),
+    ]
+
+@pytest.mark.asyncio
+async def test_apply_rollup_adds_to_existing_rows():
+    session = MagicMock(execute=AsyncMock())
+    await apply_rollup(session, [
+        {"user_id": "u1", "category": "Food", "co2e_kg": 2.0, "created_at": datetime(2025, 3, 1, 8)},
+        {"user_id": "u1", "category": "Food", "co2e_kg": 0.5, "created_at": datetime(2025, 3, 1, 9)},
+    ])
+    await apply_rollup(session, [])
+
+    lock, upsert = session.execute.await_args_list
+    assert "pg_advisory_xact_lock" in str(lock.args[0]) and lock.args[1]["user_id"] == "u1"
+    statement = upsert.args[0].compile(dialect=postgresql.dialect())
+    sql = " ".join(str(statement).split())
+    assert "ON CONFLICT (user_id, day, category) DO UPDATE SET" in sql
+    assert "co2e_kg = (footprint_daily_rollup.co2e_kg + excluded.co2e_kg)" in sql
+    assert "record_count = (footprint_daily_rollup.record_count + excluded.record_count)" in sql
+    assert statement.params["co2e_kg_m0"] == 2.5 and statement.params["record_count_m0"] == 2
+
+@pytest.mark.asyncio
+async def test_full_backfill_rebuilds_one_user_per_transaction():
+    executed = []
+    session = MagicMock(commit=AsyncMock(side_effect=lambda: executed.append("COMMIT")))
+    session.scalars = AsyncMock(return_value=MagicMock(all=lambda: ["u2", "u1"]))
+
+    async def execute(statement, params=None):
+        executed.append(str(statement).split()[0])
+        return MagicMock(rowcount=3)
+    session.execute = execute
+
+    @asynccontextmanager
+    async def fake_session():
+        yield session
+
+    with patch("app.agents.rollup.open_session", fake_session):
+        assert await backfill_rollup() == 6
+
+    assert executed == ["COMMIT"] + ["SELECT", "DELETE", "INSERT", "COMMIT"] * 2
+
+class AdvisoryLocks:
+    """Sessions whose pg_advisory_xact_lock calls take a lock held until commit"""
+
+    def __init__(self):
+        self.locks: dict[str, asyncio.Lock] = {}
+        self.rebuild_paused = asyncio.Event()
+        self.resume_rebuild = asyncio.Event()
+
+    def session(self):
+        held = []
+
+        async def execute(statement, params=None):
+            if "pg_advisory_xact_lock" in str(statement):
+                lock = self.locks.setdefault(params["user_id"], asyncio.Lock())
+                await lock.acquire()
+                held.append(lock)
+            elif str(statement).startswith("INSERT INTO footprint_daily_rollup (user_id, day, category, co2e_kg, record_count) SELECT"):
+                self.rebuild_paused.set()
+                await self.resume_rebuild.wait()
+            return MagicMock(rowcount=1)
+
+        async def commit():
+            while held:
+                held.pop().release()
+
+        return MagicMock(execute=execute, commit=commit)
+
+@pytest.mark.asyncio
+async def test_rebuild_only_blocks_writes_of_the_same_user():
+    locks = AdvisoryLocks()
+
+    async def write(user_id):
+        session = locks.session()
+        await apply_rollup(session, [{"user_id": user_id, "category": "Food", "co2e_kg": 1.0}])
+        await session.commit()
+
+    @asynccontextmanager
+    async def fake_session():
+        yield locks.session()
+
+    with patch("app.agents.rollup.open_session", fake_session):
+        rebuild = asyncio.ensure_future(backfill_rollup("u1"))
+        await locks.rebuild_paused.wait()
+        await asyncio.wait_for(write("u2"), timeout=1)  # another user's write goes through
+        same_user = asyncio.ensure_future(write("u1"))
+        await asyncio.sleep(0.05)
+        assert not same_user.done()  # waits for the rebuild of its user
+        locks.resume_rebuild.set()
+        assert await rebuild == 1
+        await asyncio.wait_for(same_user, timeout=1)
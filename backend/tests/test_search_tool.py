@@ -0,0 +1,61 @@
+import asyncio
+import httpx
+import pytest
+from app.agents.tools import GoogleCustomSearchBackend, google_search_tool, set_search_backend
+
+class FakeSearchBackend:
+    def __init__(self, snippets=None, delay: float = 0.0):
+        self.snippets = snippets or ["Beef: 27 kg CO2e per kg"]
+        self.delay = delay
+        self.calls = 0
+
+    async def search(self, query: str) -> list[str]:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.snippets
+
+@pytest.fixture
+def fake_backend():
+    backend = FakeSearchBackend()
+    previous = set_search_backend(backend)
+    yield backend
+    set_search_backend(previous)
+
+@pytest.mark.asyncio
+async def test_search_results_are_cached_per_normalized_query(fake_backend):
+    first = await google_search_tool("CO2 emission factor for Beef")
+    second = await google_search_tool("co2  emission factor for beef")
+    assert first == second == "Beef: 27 kg CO2e per kg"
+    assert fake_backend.calls == 1
+
+@pytest.mark.asyncio
+async def test_searches_run_concurrently(fake_backend):
+    fake_backend.delay = 0.2
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*[google_search_tool(f"query {i}") for i in range(5)])
+    assert loop.time() - start < 0.5
+    assert fake_backend.calls == 5
+
+@pytest.mark.asyncio
+async def test_errors_return_empty_string_and_are_not_cached(fake_backend):
+    async def failing_search(query):
+        raise httpx.ConnectError("down")
+
+    fake_backend.search = failing_search
+    assert await google_search_tool("unreachable") == ""
+    fake_backend.search = FakeSearchBackend(["ok"]).search
+    assert await google_search_tool("unreachable") == "ok"
+
+@pytest.mark.asyncio
+async def test_google_backend_parses_custom_search_json():
+    def handler(request: httpx.Request):
+        assert request.url.params["q"] == "coffee"
+        return httpx.Response(200, json={"items": [{"snippet": f"s{i}"} for i in range(8)]})
+
+    backend = GoogleCustomSearchBackend("http://search.local/customsearch/v1", "key", "cx")
+    backend._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        assert await backend.search("coffee") == ["s0", "s1", "s2", "s3", "s4"]
+    finally:
+        await backend.aclose()
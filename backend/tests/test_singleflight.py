@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.core.singleflight import SingleFlight
+from app.agents.calculator_agent import calculator_agent
+
+class Upstream:
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return {"value": 42}
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    upstream = Upstream()
+    results = await asyncio.gather(*[flights.do("coffee", upstream) for _ in range(10)])
+    assert upstream.calls == 1
+    assert all(r == {"value": 42} for r in results)
+    assert flights.stats == {"calls": 10, "coalesced": 9}
+    assert flights.in_flight == 0
+
+    await flights.do("coffee", upstream)  # finished calls are not reused
+    assert upstream.calls == 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    flights = SingleFlight()
+    upstream = Upstream(error=ValueError("quota"))
+    results = await asyncio.gather(*[flights.do("k", upstream) for _ in range(3)], return_exceptions=True)
+    assert upstream.calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_keeps_the_shared_call():
+    flights = SingleFlight()
+    upstream = Upstream(delay=0.1)
+    first = asyncio.ensure_future(flights.do("k", upstream))
+    second = asyncio.ensure_future(flights.do("k", upstream))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == {"value": 42}
+    assert first.cancelled()
+    assert not upstream.cancelled
+
+@pytest.mark.asyncio
+async def test_upstream_is_cancelled_when_every_caller_leaves():
+    flights = SingleFlight()
+    upstream = Upstream(delay=1)
+    callers = [asyncio.ensure_future(flights.do("k", upstream)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert upstream.cancelled
+    assert flights.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_calculator_coalesces_across_quantities():
+    async def gemini(item_name, quantity, unit, category):
+        await asyncio.sleep(0.05)
+        return {"co2e_kg": 2.0 * quantity, "factor_used": 2.0, "source": "web"}
+
+    gemini_mock = AsyncMock(side_effect=gemini)
+    with patch("app.agents.calculator_agent.get_cached_factor", AsyncMock(return_value=None)), \
+         patch("app.agents.calculator_agent._gemini_calculate", gemini_mock):
+        results = await asyncio.gather(
+            calculator_agent("Coffee", 1, "cup", "Food"),
+            calculator_agent("coffee", 3, "cups", "Food"),
+        )
+
+    assert gemini_mock.await_count == 1
+    assert [r["co2e_kg"] for r in results] == [2.0, 6.0]
+
+@pytest.mark.asyncio
+async def test_calculator_rescales_a_zero_quantity_leader_with_its_factor():
+    async def gemini(item_name, quantity, unit, category):
+        await asyncio.sleep(0.05)
+        return {"co2e_kg": 2.0 * quantity, "factor_used": 2.0, "source": "web"}
+
+    gemini_mock = AsyncMock(side_effect=gemini)
+    with patch("app.agents.calculator_agent.get_cached_factor", AsyncMock(return_value=None)), \
+         patch("app.agents.calculator_agent._gemini_calculate", gemini_mock):
+        results = await asyncio.gather(
+            calculator_agent("Coffee", 0, "cup", "Food"),
+            calculator_agent("coffee", 3, "cups", "Food"),
+        )
+
+    assert gemini_mock.await_count == 1
+    assert [r["co2e_kg"] for r in results] == [0.0, 6.0]
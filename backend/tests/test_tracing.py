@@ -0,0 +1,66 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from app.core import observability, tracing
+from app.core.observability import ObservabilityMiddleware
+from app.core.tracing import JSONLExporter, Tracer, trace_attributes, traced
+
+@traced("lookup")
+async def lookup(item: str):
+    trace_attributes(item=item, cache_hit=item == "apple")
+    if item == "laptop":
+        raise RuntimeError("upstream down")
+    await asyncio.sleep(0)
+    return item
+
+app = FastAPI()
+app.add_middleware(ObservabilityMiddleware)
+
+@app.get("/items/{item}")
+async def item(item: str):
+    return {"item": await lookup(item)}
+
+@pytest.fixture
+def exported(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    test_tracer = Tracer(JSONLExporter(str(path)), sample_rate=0.0)
+    with patch.object(tracing, "tracer", test_tracer), patch.object(observability, "tracer", test_tracer):
+        yield test_tracer, lambda: [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_record_errors(exported):
+    tracer, spans = exported
+    with tracer.trace("request", sampled=True) as root:
+        results = await asyncio.gather(lookup("apple"), lookup("laptop"), return_exceptions=True)
+    assert results[0] == "apple" and isinstance(results[1], RuntimeError)
+
+    assert tracer.flush() == 3
+    by_name = {}
+    for span in spans():
+        by_name.setdefault(span["name"], []).append(span)
+    assert {span["trace_id"] for span in spans()} == {root.trace_id}
+    lookups = sorted(by_name["lookup"], key=lambda span: span["attributes"]["item"])
+    assert [span["parent_id"] for span in lookups] == [root.span_id, root.span_id]
+    assert lookups[0]["attributes"] == {"item": "apple", "cache_hit": True} and lookups[0]["status"] == "ok"
+    assert lookups[1]["status"] == "error" and "upstream down" in lookups[1]["error"]
+
+@pytest.mark.asyncio
+async def test_requests_follow_traceparent_and_unsampled_ones_record_nothing(exported):
+    tracer, spans = exported
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        unsampled = await client.get("/items/pear")
+        sampled = await client.get("/items/apple", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"})
+
+    assert len(unsampled.headers["x-trace-id"]) == 32
+    assert sampled.headers["x-trace-id"] == trace_id
+    tracer.flush()
+    request, = [span for span in spans() if span["name"] == "http.request"]
+    lookup_span, = [span for span in spans() if span["name"] == "lookup"]
+    assert request["attributes"] == {"method": "GET", "route": "/items/{item}", "status": 200}
+    assert request["trace_id"] == trace_id and request["parent_id"] == "00f067aa0ba902b7"  # the caller's span
+    assert lookup_span["trace_id"] == trace_id and lookup_span["parent_id"] == request["span_id"]
+    assert tracer.stats()["traces"] == 2 and tracer.stats()["sampled"] == 1
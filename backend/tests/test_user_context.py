@@ -0,0 +1,30 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.agents import memory_agent
+from app.agents.llm import estimate_tokens, prompt_context
+
+CONTEXT = {
+    "goals": [{"target": 80.0, "period": "monthly"}],
+    "preferences": {"diet": "vegetarian", "home": "apartment with gas heating", "milk": "oat milk only"},
+}
+
+@pytest.mark.asyncio
+async def test_user_context_is_cached_until_its_shared_version_changes():
+    memory_agent.user_context_cache.clear()
+    versions = {("user_1", "user_context"): 0}  # the user_cache_version table
+    load = AsyncMock(side_effect=lambda user_id: {"preferences": {}, "goals": []})
+    with patch("app.core.user_versions.read_user_version", AsyncMock(side_effect=lambda user_id, scope, session: versions[user_id, scope])), \
+         patch.object(memory_agent, "_load_user_context", load):
+        first = await memory_agent.get_user_context("user_1")
+        assert await memory_agent.get_user_context("user_1") is first
+        versions["user_1", "user_context"] += 1  # a goal written by another worker
+        assert await memory_agent.get_user_context("user_1") is not first
+    assert load.await_count == 2
+
+def test_prompt_context_prefers_relevant_preferences_within_budget():
+    text = prompt_context(CONTEXT, ["Whole milk"], budget_tokens=20)
+
+    assert estimate_tokens(text) <= 20
+    assert text.splitlines() == ["User goal: reduce to 80 kg CO2e monthly", "User preferences: milk: oat milk only"]
+    assert prompt_context(CONTEXT, ["Whole milk"], budget_tokens=1000).endswith(
+        "milk: oat milk only; diet: vegetarian; home: apartment with gas heating")